@@ -1,12 +1,51 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+# Build profiles (select with PQC_BUILD_PROFILE, see benchmark_startup.py):
+#   onefile (default) - single EXE, unpacked to a temp dir on every launch
+#   onedir            - folder build, nothing to unpack at startup
+#   lean              - onedir without UPX, minus the matplotlib backends and
+#                       pydub/streamlit paths main.py never touches
+import os
 from PyInstaller.utils.hooks import collect_all
 
+profile = os.getenv('PQC_BUILD_PROFILE', 'onefile')
+if profile not in ('onefile', 'onedir', 'lean'):
+    raise SystemExit(f"Unknown PQC_BUILD_PROFILE: {profile}")
+lean = profile == 'lean'
+onefile = profile == 'onefile'
+
 datas = [('key_registry.json', '.')]
 binaries = []
 hiddenimports = ['pqc._lib', 'pqc._lib.libkyber512_clean', 'matplotlib', 'matplotlib.backends.backend_tkagg']
 tmp_ret = collect_all('pqc')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 
+excludes = []
+if lean:
+    # Post-call graphs only need the TkAgg backend; pyplot stays, backend_bases and
+    # the Tk backend import it on some paths
+    excludes += [
+        'matplotlib.tests',
+        'matplotlib.backends.backend_qt', 'matplotlib.backends.backend_qtagg',
+        'matplotlib.backends.backend_qtcairo', 'matplotlib.backends.backend_qt5',
+        'matplotlib.backends.backend_qt5agg', 'matplotlib.backends.backend_qt5cairo',
+        'matplotlib.backends.backend_wx', 'matplotlib.backends.backend_wxagg',
+        'matplotlib.backends.backend_wxcairo', 'matplotlib.backends.backend_gtk3',
+        'matplotlib.backends.backend_gtk3agg', 'matplotlib.backends.backend_gtk3cairo',
+        'matplotlib.backends.backend_gtk4', 'matplotlib.backends.backend_gtk4agg',
+        'matplotlib.backends.backend_gtk4cairo', 'matplotlib.backends.backend_macosx',
+        'matplotlib.backends.backend_webagg', 'matplotlib.backends.backend_webagg_core',
+        'matplotlib.backends.backend_nbagg', 'matplotlib.backends.backend_pdf',
+        'matplotlib.backends.backend_pgf', 'matplotlib.backends.backend_ps',
+        'matplotlib.backends.backend_svg', 'matplotlib.backends.backend_cairo',
+        'matplotlib.backends.backend_template',
+        # GUI toolkits those backends would drag in
+        'PyQt5', 'PyQt6', 'PySide2', 'PySide6', 'wx', 'gi', 'cairo',
+        'IPython', 'tornado',
+        # File-transfer apps only (crypto_utils imports pydub lazily)
+        'pydub', 'streamlit', 'pandas', 'pyarrow', 'altair',
+    ]
+
 
 a = Analysis(
     ['main.py'],
@@ -17,29 +56,62 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     noarchive=False,
     optimize=0,
 )
+if lean:
+    # Toolbar icons, sample data and PDF/PS fonts are never used by the embedded canvas
+    unused = ('mpl-data/sample_data', 'mpl-data/images', 'mpl-data/fonts/afm', 'mpl-data/fonts/pdfcorefonts')
+    a.datas = [d for d in a.datas if not any(u in d[0].replace('\\', '/') for u in unused)]
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='PQC_Voice_Chat',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if onefile:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='PQC_Voice_Chat',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='PQC_Voice_Chat',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        # UPX-packed DLLs have to be decompressed on every load
+        upx=not lean,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=not lean,
+        upx_exclude=[],
+        name='PQC_Voice_Chat',
+    )
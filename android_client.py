@@ -16,8 +16,13 @@ import requests
 import time
 import queue
 import os
+import struct
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import crypto_utils
+import media_config
+import signalling_client
+import vad
+from media_config import MediaConfig
 
 # Use PyAudio if available (Pydroid 3 has it), else dummy for testing UI
 try:
@@ -26,15 +31,15 @@ try:
 except ImportError:
     HAS_AUDIO = False
 
-# Audio Constants (Synced with main server)
-CHUNK = 1024
+# Audio Constants (Synced with main server; frame size and rate are negotiated per call)
 FORMAT = 16 # pyaudio.paInt16
-CHANNELS = 1
-RATE = 16000
+CHANNELS = media_config.CHANNELS
 
 class UserManager:
     def __init__(self, registry_url):
         self.registry_url = registry_url.rstrip('/')
+        # Contact list, refreshed from the registry's change feed
+        self.contacts = signalling_client.UserList(self.registry_url, online_only=True)
         self.username = None
         self.public_key = None
         self.secret_key = None
@@ -66,13 +71,7 @@ class UserManager:
         except Exception as e: return False, str(e)
 
     def fetch_online_users(self):
-        try:
-            resp = requests.get(f"{self.registry_url}/list", timeout=2)
-            if resp.status_code == 200:
-                users = resp.json().get("users", {})
-                return [u for u in users.keys() if u != self.username]
-        except: pass
-        return []
+        return [u for u in self.contacts.refresh(timeout=2) if u != self.username]
 
     def initiate_call(self, target):
         try:
@@ -84,7 +83,8 @@ class UserManager:
                 "caller": self.username,
                 "callee": target,
                 "caller_listen_port": self.listening_port,
-                "session_key_ciphertext": ciphertext.hex()
+                "session_key_ciphertext": ciphertext.hex(),
+                "media_offer": media_config.build_offer()
             }
             cresp = requests.post(f"{self.registry_url}/call/initiate", json=payload)
             if cresp.status_code == 200:
@@ -93,27 +93,22 @@ class UserManager:
             return False, "Call Refused", None
         except: return False, "Network Error", None
 
-    def poll_calls(self):
-        try:
-            resp = requests.get(f"{self.registry_url}/call/pending/{self.username}", timeout=1)
-            if resp.status_code == 200: return resp.json().get("pending_calls", [])
-        except: pass
-        return []
+    def wait_calls(self, seen=()):
+        # Long-poll: returns as soon as a new call rings (falls back to polling on old servers)
+        return signalling_client.wait_pending_calls(self.registry_url, self.username, seen)
 
-    def check_status(self, call_id):
-        try:
-            resp = requests.get(f"{self.registry_url}/call/status/{call_id}", timeout=1)
-            if resp.status_code == 200: return resp.json().get("status")
-        except: pass
-        return "unknown"
+    def wait_status(self, call_id, known, wait=signalling_client.LONG_POLL_S):
+        return signalling_client.wait_call_status(self.registry_url, call_id, known, wait)
 
-    def accept_call(self, call_id, cipher_hex):
+    def accept_call(self, call_id, cipher_hex, media_offer=None):
         try:
             sk = crypto_utils.kyber_decapsulate(bytes.fromhex(cipher_hex), self.secret_key)
-            resp = requests.post(f"{self.registry_url}/call/accept", json={"call_id": call_id})
+            # No FEC decoder on this client
+            answer = media_config.select_answer(media_offer, fec_depth=0)
+            resp = requests.post(f"{self.registry_url}/call/accept", json={"call_id": call_id, "media_answer": answer})
             if resp.status_code == 200:
                 d = resp.json()
-                return True, (d['caller_ip'], d['caller_port'], sk)
+                return True, (d['caller_ip'], d['caller_port'], sk, MediaConfig.from_answer(answer))
         except: pass
         return False, None
 
@@ -124,13 +119,16 @@ class NetworkHandler:
         self.session_key = None
         self.crypt = None
         self.counter = 0
+        self.media = MediaConfig()
+        self.codec = self.media.create_codec()
+        self.comfort_noise = vad.ComfortNoiseGenerator(self.media.frames_per_packet)
 
     def start(self, callback):
         self.sock.bind(('0.0.0.0', 50005))
         def listen():
             while True:
                 try:
-                    data, addr = self.sock.recvfrom(4096)
+                    data, addr = self.sock.recvfrom(self.media.max_datagram)
                     if self.session_key:
                         raw = self.decrypt(data)
                         if raw: callback(raw, addr[0])
@@ -141,18 +139,32 @@ class NetworkHandler:
         try:
             nonce, idx_b, ct = data[:12], data[12:16], data[16:]
             idx = int.from_bytes(idx_b, 'big')
-            obf = self.crypt.decrypt(nonce, ct, associated_data=idx_b)
-            return crypto_utils.deobfuscate_audio(obf, self.session_key, idx)
+            plain = self.crypt.decrypt(nonce, ct, associated_data=idx_b)
+            if self.media.typed_packets:
+                kind, body = plain[8], plain[9:]
+            else:
+                kind, body = media_config.KIND_AUDIO, plain[8:]
+            if kind == media_config.KIND_RECEIVER_REPORT: return None  # not negotiated by this client
+            payload = crypto_utils.deobfuscate_audio(body, self.session_key, idx)
+            if kind == media_config.KIND_COMFORT_NOISE:
+                self.comfort_noise.update(payload)
+                return None
+            self.comfort_noise.reset()
+            return self.codec.decode(payload)
         except: return None
 
     def send(self, audio):
         if not self.target or not self.session_key: return
         try:
             idx = self.counter
-            obf = crypto_utils.obfuscate_audio(audio, self.session_key, idx)
+            obf = crypto_utils.obfuscate_audio(self.codec.encode(audio), self.session_key, idx)
             nonce = os.urandom(12)
             idx_b = idx.to_bytes(4, 'big')
-            ct = self.crypt.encrypt(nonce, obf, associated_data=idx_b)
+            if self.media.typed_packets:
+                header = struct.pack('!dB', time.time(), media_config.KIND_AUDIO)
+            else:
+                header = struct.pack('!d', time.time())
+            ct = self.crypt.encrypt(nonce, header + obf, associated_data=idx_b)
             self.sock.sendto(nonce + idx_b + ct, self.target)
             self.counter += 1
         except: pass
@@ -172,7 +184,12 @@ class LobbyScreen(Screen):
     def on_enter(self):
         self.update_list()
         Clock.schedule_interval(self.update_list, 3)
-        Clock.schedule_interval(self.check_calls, 2)
+        app = App.get_running_app()
+        if not getattr(app, 'watching_calls', False):
+            app.watching_calls = True
+            threading.Thread(target=self.watch_calls, daemon=True).start()
+            threading.Thread(target=signalling_client.send_heartbeats,
+                             args=(app.um.registry_url, app.um.username, lambda: app.running), daemon=True).start()
 
     def update_list(self, *args):
         app = App.get_running_app()
@@ -183,13 +200,22 @@ class LobbyScreen(Screen):
             btn.bind(on_press=lambda b, name=u: self.call_user(name))
             self.ids.container.add_widget(btn)
 
-    def check_calls(self, *args):
+    def watch_calls(self):
+        app = App.get_running_app()
+        seen = set()
+        while app.running:
+            if app.state != "idle":
+                time.sleep(1)
+                continue
+            calls = app.um.wait_calls(seen)
+            if calls and app.state == "idle":
+                seen.update(c['call_id'] for c in calls)
+                Clock.schedule_once(lambda x, call=calls[0]: self.show_incoming(call))
+
+    def show_incoming(self, call):
         app = App.get_running_app()
-        if app.state == "idle":
-            calls = app.um.poll_calls()
-            if calls:
-                app.incoming_call = calls[0]
-                app.root.current = 'incoming'
+        app.incoming_call = call
+        app.root.current = 'incoming'
 
     def call_user(self, name):
         app = App.get_running_app()
@@ -205,11 +231,16 @@ class CallingScreen(Screen):
         app = App.get_running_app()
         success, call_id, details = app.um.initiate_call(app.target_name)
         if success:
-            for _ in range(20):
-                if app.um.check_status(call_id) == 'active':
-                    Clock.schedule_once(lambda x: app.start_call(details, app.target_name))
+            deadline = time.time() + 20
+            status = 'ringing'
+            while time.time() < deadline:
+                info = app.um.wait_status(call_id, status, min(signalling_client.LONG_POLL_S, deadline - time.time()))
+                status = info.get('status', status)
+                if status == 'active':
+                    media = MediaConfig.from_answer(info.get('media_answer'))
+                    Clock.schedule_once(lambda x: app.start_call(details + (media,), app.target_name))
                     return
-                time.sleep(1)
+                if status in ('rejected', 'ended'): break
         Clock.schedule_once(lambda x: setattr(app.root, 'current', 'lobby'))
 
 class IncomingScreen(Screen):
@@ -219,7 +250,7 @@ class IncomingScreen(Screen):
     def accept(self):
         app = App.get_running_app()
         call = app.incoming_call
-        success, details = app.um.accept_call(call['call_id'], call['session_key_ciphertext'])
+        success, details = app.um.accept_call(call['call_id'], call['session_key_ciphertext'], call.get('media_offer'))
         if success: app.start_call(details, call['caller'])
 
 class ActiveScreen(Screen):
@@ -250,7 +281,10 @@ class PQCApp(App):
         return sm
 
     def start_call(self, details, name):
-        ip, port, key = details
+        ip, port, key, media = details
+        self.net.media = media
+        self.net.codec = media.create_codec()
+        self.net.comfort_noise = vad.ComfortNoiseGenerator(media.frames_per_packet)
         self.net.target = (ip, int(port))
         self.net.session_key = key
         self.net.crypt = AESGCM(key)
@@ -264,15 +298,21 @@ class PQCApp(App):
         if self.state == "active": self.audio_q.put(raw)
 
     def audio_thread(self):
+        media = self.net.media
+        frames = media.frames_per_packet
         p = pyaudio.PyAudio()
-        stream = p.open(format=pyaudio.paInt16, channels=1, rate=16000, input=True, output=True, frames_per_buffer=1024)
+        stream = p.open(format=pyaudio.paInt16, channels=CHANNELS, rate=media.rate, input=True, output=True, frames_per_buffer=frames)
         def speaker():
             while self.state == "active":
-                try: stream.write(self.audio_q.get(timeout=0.1))
+                try: chunk = self.audio_q.get(timeout=media.ptime_ms / 1000)
+                except queue.Empty:
+                    chunk = self.net.comfort_noise.generate()
+                    if not chunk: continue
+                try: stream.write(chunk)
                 except: pass
         threading.Thread(target=speaker, daemon=True).start()
         while self.state == "active":
-            try: self.net.send(stream.read(1024, exception_on_overflow=False))
+            try: self.net.send(stream.read(frames, exception_on_overflow=False))
             except: pass
         stream.stop_stream(); stream.close(); p.terminate()
 
@@ -0,0 +1,320 @@
+"""
+Callback-driven audio devices for the live call path.
+
+The device side (a PortAudio callback, or a clock thread for the null/file
+device) only touches two lock-free ring buffers: it pushes captured frames
+into one and pulls playout frames from the other. The media threads block
+on those rings instead of inside PortAudio, and every time one side finds
+the ring empty or full it is counted as an underrun or overrun.
+
+Select a device with PQC_AUDIO_DEVICE:
+    (unset)/pyaudio        - default PortAudio input and output
+    null                   - silence in, playout discarded
+    file:in.wav[,out.wav]  - loop in.wav as the microphone, record playout to out.wav
+File devices expect mono 16-bit WAVs; they run at the WAV's sample rate.
+
+A device that can't run at the negotiated call rate (a 48 kHz-only card, a
+WAV recorded at 44.1 kHz) runs at its own rate, and frames are resampled
+between the two on the media thread side of the rings, never in the callback.
+The resampler's output length varies from frame to frame (and a device frame
+of one ptime may not be a whole number of samples), so resampled audio is
+buffered on each side and cut into exact frames: read_frame() always returns
+exactly one packet, and the playout ring only ever holds whole device frames.
+"""
+
+import threading
+import time
+import wave
+
+from resampler import PolyphaseResampler
+from ring_buffer import ByteRingBuffer
+
+# PortAudio is loaded when the first call opens a device, not at startup
+pyaudio = None
+
+SAMPLE_WIDTH = 2
+# Ring capacities in frames (packets)
+CAPTURE_RING_FRAMES = 8
+PLAYOUT_RING_FRAMES = 3
+
+_pa = None
+
+
+def _host():
+    """Shared PortAudio instance; initializing PortAudio per call is slow."""
+    global _pa, pyaudio
+    if _pa is None:
+        import pyaudio
+        _pa = pyaudio.PyAudio()
+    return _pa
+
+
+def terminate():
+    global _pa
+    if _pa is not None:
+        _pa.terminate()
+        _pa = None
+
+
+class AudioBackend:
+    """Ring-buffer plumbing shared by all devices."""
+
+    def __init__(self, media, device_rate=None):
+        self.media = media
+        self._set_device_rate(device_rate or media.rate)
+        self._captured = threading.Event()
+        self._played = threading.Event()
+        self.running = False
+
+        # Counters
+        self.capture_overruns = 0   # captured frame dropped, media thread too slow
+        self.device_overflows = 0   # device reported lost input
+        self.playout_underruns = 0  # device needed audio, none queued
+        self.playout_overruns = 0   # frame dropped, device not draining
+
+    def _set_device_rate(self, rate):
+        """(Re)size the rings for a device running at `rate` Hz."""
+        self.device_rate = rate
+        # Ring frames are device-rate frames of one ptime each
+        self.device_frames = rate * self.media.ptime_ms // 1000
+        self.frame_bytes = self.device_frames * SAMPLE_WIDTH
+        self.capture_ring = ByteRingBuffer(self.frame_bytes * CAPTURE_RING_FRAMES)
+        self.playout_ring = ByteRingBuffer(self.frame_bytes * PLAYOUT_RING_FRAMES)
+        self._silence = bytes(self.frame_bytes)
+        # Resampled audio not yet making up a whole frame
+        self._capture_pending = bytearray()
+        self._playout_pending = bytearray()
+        if rate == self.media.rate:
+            self.capture_resampler = self.playout_resampler = None
+        else:
+            self.capture_resampler = PolyphaseResampler(rate, self.media.rate)
+            self.playout_resampler = PolyphaseResampler(self.media.rate, rate)
+
+    # --- device side (callback context: never blocks) ---
+
+    def _on_capture(self, data):
+        if not self.capture_ring.write(data):
+            self.capture_overruns += 1
+        self._captured.set()
+
+    def _on_playout(self, nbytes):
+        data = self.playout_ring.read(nbytes)
+        self._played.set()
+        if data is None:
+            self.playout_underruns += 1
+            # Play what's there, pad the rest with silence
+            partial = self.playout_ring.read(self.playout_ring.available()) or b""
+            return partial + bytes(nbytes - len(partial))
+        return data
+
+    # --- media thread side ---
+
+    def read_frame(self, timeout=None):
+        """Next captured packet (exactly bytes_per_packet), waiting up to `timeout` seconds; None if none arrived."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        packet = self.media.bytes_per_packet
+        pending = self._capture_pending
+        while self.running:
+            if len(pending) >= packet:
+                frame = bytes(pending[:packet])
+                del pending[:packet]
+                return frame
+            frame = self.capture_ring.read(self.frame_bytes)
+            if frame is not None:
+                if not self.capture_resampler:
+                    return frame
+                pending += self.capture_resampler.process(frame)
+                continue
+            self._captured.clear()
+            if self.capture_ring.available() >= self.frame_bytes:
+                continue
+            wait = None if deadline is None else deadline - time.monotonic()
+            if wait is not None and wait <= 0:
+                return None
+            self._captured.wait(wait)
+        return None
+
+    def write_frame(self, data, timeout=None):
+        """Queue a frame for playout, waiting for ring space; drops it on timeout."""
+        if timeout is None:
+            timeout = 2 * self.media.ptime_ms / 1000
+        if self.playout_resampler:
+            # Queue whole device frames only; the remainder waits for the next call
+            pending = self._playout_pending
+            pending += self.playout_resampler.process(data)
+            whole = len(pending) - len(pending) % self.frame_bytes
+            data = bytes(pending[:whole])
+            del pending[:whole]
+            if not data:
+                return True
+        deadline = time.monotonic() + timeout
+        while self.running:
+            if self.playout_ring.write(data):
+                return True
+            self._played.clear()
+            if self.playout_ring.free() >= len(data):
+                continue
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                break
+            self._played.wait(wait)
+        self.playout_overruns += 1
+        return False
+
+    def counters(self):
+        return {
+            "capture_overruns": self.capture_overruns,
+            "device_overflows": self.device_overflows,
+            "playout_underruns": self.playout_underruns,
+            "playout_overruns": self.playout_overruns,
+        }
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self._captured.set()
+        self._played.set()
+
+
+class PyAudioBackend(AudioBackend):
+    """PortAudio device driven by stream callbacks."""
+
+    def __init__(self, media):
+        super().__init__(media)
+        self.in_stream = None
+        self.out_stream = None
+
+    def _pick_device_rate(self, p):
+        """The call rate if the default devices take it, else the output device's native rate."""
+        try:
+            p.is_format_supported(self.media.rate,
+                                  input_device=p.get_default_input_device_info()["index"],
+                                  input_channels=1, input_format=pyaudio.paInt16,
+                                  output_device=p.get_default_output_device_info()["index"],
+                                  output_channels=1, output_format=pyaudio.paInt16)
+            return self.media.rate
+        except (ValueError, IOError):
+            return int(p.get_default_output_device_info()["defaultSampleRate"])
+
+    def _input_callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.device_overflows += 1
+        self._on_capture(in_data)
+        return (None, pyaudio.paContinue)
+
+    def _output_callback(self, in_data, frame_count, time_info, status):
+        return (self._on_playout(frame_count * SAMPLE_WIDTH), pyaudio.paContinue)
+
+    def start(self):
+        p = _host()
+        rate = self._pick_device_rate(p)
+        if rate != self.device_rate:
+            print(f"[Audio] Device runs at {rate} Hz, resampling from {self.media.rate} Hz")
+            self._set_device_rate(rate)
+        frames = self.device_frames
+        try:
+            # Separate input and output streams to prevent local hardware feedback
+            self.in_stream = p.open(format=pyaudio.paInt16, channels=1, rate=rate,
+                                    input=True, output=False, frames_per_buffer=frames,
+                                    stream_callback=self._input_callback)
+            self.out_stream = p.open(format=pyaudio.paInt16, channels=1, rate=rate,
+                                     input=False, output=True, frames_per_buffer=frames,
+                                     stream_callback=self._output_callback)
+        except Exception:
+            # Close whichever stream did open; the backend stays stopped
+            self.stop()
+            raise
+        super().start()
+
+    def stop(self):
+        super().stop()
+        for stream in (self.in_stream, self.out_stream):
+            if stream:
+                try:
+                    stream.stop_stream()
+                    stream.close()
+                except: pass
+        self.in_stream = self.out_stream = None
+
+
+class NullAudioBackend(AudioBackend):
+    """
+    Headless device paced by a clock thread.
+
+    Captures silence (or loops `source` WAV) and discards playout (or
+    appends it to `sink` WAV), one frame every ptime, through the same
+    ring-buffer path as the PortAudio device.
+    """
+
+    def __init__(self, media, source=None, sink=None):
+        self.source = None
+        self.sink = None
+        self._pos = 0
+        rate = media.rate
+        if source:
+            with wave.open(source, "rb") as w:
+                rate = w.getframerate()
+                self.source = w.readframes(w.getnframes())
+        super().__init__(media, device_rate=rate)
+        if sink:
+            self.sink = wave.open(sink, "wb")
+            self.sink.setnchannels(1)
+            self.sink.setsampwidth(SAMPLE_WIDTH)
+            self.sink.setframerate(rate)
+        self._thread = None
+
+    def _next_source_frame(self):
+        if not self.source:
+            return self._silence
+        out = bytearray()
+        while len(out) < self.frame_bytes:
+            chunk = self.source[self._pos:self._pos + self.frame_bytes - len(out)]
+            out += chunk
+            self._pos = (self._pos + len(chunk)) % len(self.source)
+        return bytes(out)
+
+    def _clock(self):
+        period = self.media.ptime_ms / 1000
+        next_tick = time.monotonic()
+        while self.running:
+            self._on_capture(self._next_source_frame())
+            played = self._on_playout(self.frame_bytes)
+            if self.sink:
+                self.sink.writeframes(played)
+            next_tick += period
+            time.sleep(max(0, next_tick - time.monotonic()))
+
+    def start(self):
+        # The clock runs while `running`, so it is set first and undone if the thread can't start
+        super().start()
+        self._thread = threading.Thread(target=self._clock, daemon=True)
+        try:
+            self._thread.start()
+        except RuntimeError:
+            self._thread = None
+            super().stop()
+            raise
+
+    def stop(self):
+        super().stop()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self.sink:
+            self.sink.close()
+            self.sink = None
+
+
+def create_backend(device, media):
+    """Build the audio device named by `device` (see module docstring)."""
+    if not device or device == "pyaudio":
+        return PyAudioBackend(media)
+    if device == "null":
+        return NullAudioBackend(media)
+    if device.startswith("file:"):
+        paths = device[len("file:"):].split(",")
+        return NullAudioBackend(media, source=paths[0] or None,
+                                sink=paths[1] if len(paths) > 1 else None)
+    raise ValueError(f"Unknown audio device: {device}")
@@ -0,0 +1,259 @@
+"""
+Audio codecs for the live call path.
+
+Frames are encoded right after capture and before obfuscation/encryption,
+and decoded after de-obfuscation on the receive side, so the crypto stages
+only ever see the compressed payload.
+
+Built-in codecs need nothing beyond NumPy:
+    pcm    - raw 16-bit PCM (what peers that don't negotiate send)
+    pcmu   - G.711 mu-law, 8 bits/sample (2:1)
+    adpcm  - IMA ADPCM, 4 bits/sample plus a 3-byte header per frame (~4:1)
+Opus is used when the optional `opuslib` binding (and libopus) is installed.
+"""
+
+import numpy as np
+
+try:
+    import opuslib
+    HAS_OPUS = True
+except Exception:
+    # opuslib raises a plain Exception when libopus itself is missing
+    HAS_OPUS = False
+
+# Negotiation preference, best compression first
+CODEC_PREFERENCE = ("opus", "adpcm", "pcmu", "pcm")
+
+OPUS_BITRATE = 16000
+
+
+class Codec:
+    """Base class: one instance per call and direction pair."""
+
+    name = None
+
+    def __init__(self, rate, frames_per_packet):
+        self.rate = rate
+        self.frames_per_packet = frames_per_packet
+
+    @staticmethod
+    def encoded_size(frames, rate):
+        """Approximate encoded payload size for one packet of `frames` samples."""
+        raise NotImplementedError
+
+    def encode(self, pcm):
+        raise NotImplementedError
+
+    def decode(self, payload):
+        raise NotImplementedError
+
+    def decode_scrambled(self, payload):
+        """Render a still-obfuscated payload as PCM (for the de-obfuscation demo toggle)."""
+        return self.decode(payload)
+
+
+class PCMCodec(Codec):
+    name = "pcm"
+
+    @staticmethod
+    def encoded_size(frames, rate):
+        return frames * 2
+
+    def encode(self, pcm):
+        return pcm
+
+    def decode(self, payload):
+        return payload
+
+
+# ==================== G.711 MU-LAW ====================
+
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+
+
+def _build_mulaw_tables():
+    # Encode table indexed by the int16 sample reinterpreted as uint16
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32)
+    sign = (samples < 0).astype(np.int32) << 7
+    mag = np.minimum(np.abs(samples), MULAW_CLIP) + MULAW_BIAS
+    exponent = np.floor(np.log2(mag)).astype(np.int32) - 7
+    mantissa = (mag >> (exponent + 3)) & 0x0F
+    encode = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    mag = (((mantissa << 3) + MULAW_BIAS) << exponent) - MULAW_BIAS
+    decode = np.where(codes & 0x80, -mag, mag).astype(np.int16)
+    return encode, decode
+
+
+_MULAW_ENCODE, _MULAW_DECODE = _build_mulaw_tables()
+
+
+def mulaw_encode(pcm):
+    """16-bit PCM bytes -> mu-law bytes (one table lookup per sample)."""
+    return _MULAW_ENCODE[np.frombuffer(pcm, dtype=np.uint16)].tobytes()
+
+
+def mulaw_decode(payload):
+    """mu-law bytes -> 16-bit PCM bytes."""
+    return _MULAW_DECODE[np.frombuffer(payload, dtype=np.uint8)].tobytes()
+
+
+class MuLawCodec(Codec):
+    name = "pcmu"
+
+    @staticmethod
+    def encoded_size(frames, rate):
+        return frames
+
+    def encode(self, pcm):
+        return mulaw_encode(pcm)
+
+    def decode(self, payload):
+        return mulaw_decode(payload)
+
+
+# ==================== IMA ADPCM ====================
+
+ADPCM_STEPS = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+)
+ADPCM_INDEX_ADJUST = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+
+
+class AdpcmCodec(Codec):
+    """
+    IMA ADPCM with per-frame state.
+
+    Each frame starts with the first sample (int16) and the step index, so a
+    lost packet never desynchronizes the decoder.
+    """
+
+    name = "adpcm"
+
+    @staticmethod
+    def encoded_size(frames, rate):
+        return 3 + frames // 2
+
+    def __init__(self, rate, frames_per_packet):
+        super().__init__(rate, frames_per_packet)
+        self.index = 0  # carried between frames so the step size stays adapted
+
+    def encode(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16).tolist()
+        if not samples:
+            return b""
+        predictor = samples[0]
+        index = self.index
+        out = bytearray(int(predictor).to_bytes(2, "little", signed=True))
+        out.append(index)
+        nibble = None
+        for sample in samples[1:]:
+            step = ADPCM_STEPS[index]
+            diff = sample - predictor
+            code = 0
+            if diff < 0:
+                code = 8
+                diff = -diff
+            vpdiff = step >> 3
+            if diff >= step:
+                code |= 4
+                diff -= step
+                vpdiff += step
+            step >>= 1
+            if diff >= step:
+                code |= 2
+                diff -= step
+                vpdiff += step
+            step >>= 1
+            if diff >= step:
+                code |= 1
+                vpdiff += step
+            predictor = predictor - vpdiff if code & 8 else predictor + vpdiff
+            predictor = max(-32768, min(32767, predictor))
+            index = max(0, min(88, index + ADPCM_INDEX_ADJUST[code]))
+            if nibble is None:
+                nibble = code
+            else:
+                out.append(nibble | (code << 4))
+                nibble = None
+        if nibble is not None:
+            out.append(nibble)
+        self.index = index
+        return bytes(out)
+
+    def decode(self, payload):
+        if len(payload) < 3:
+            return b""
+        predictor = int.from_bytes(payload[:2], "little", signed=True)
+        index = min(88, payload[2])
+        samples = [predictor]
+        for byte in payload[3:]:
+            for code in (byte & 0x0F, byte >> 4):
+                step = ADPCM_STEPS[index]
+                vpdiff = step >> 3
+                if code & 4: vpdiff += step
+                if code & 2: vpdiff += step >> 1
+                if code & 1: vpdiff += step >> 2
+                predictor = predictor - vpdiff if code & 8 else predictor + vpdiff
+                predictor = max(-32768, min(32767, predictor))
+                index = max(0, min(88, index + ADPCM_INDEX_ADJUST[code]))
+                samples.append(predictor)
+        # An odd sample count leaves one padding nibble at the end
+        if self.frames_per_packet and len(samples) > self.frames_per_packet:
+            samples = samples[:self.frames_per_packet]
+        return np.array(samples, dtype=np.int16).tobytes()
+
+
+# ==================== OPUS (optional) ====================
+
+class OpusCodec(Codec):
+    name = "opus"
+
+    @staticmethod
+    def encoded_size(frames, rate):
+        return OPUS_BITRATE * frames // rate // 8
+
+    def __init__(self, rate, frames_per_packet):
+        super().__init__(rate, frames_per_packet)
+        self.encoder = opuslib.Encoder(rate, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = OPUS_BITRATE
+        self.decoder = opuslib.Decoder(rate, 1)
+
+    def encode(self, pcm):
+        return self.encoder.encode(pcm, len(pcm) // 2)
+
+    def decode(self, payload):
+        return self.decoder.decode(payload, self.frames_per_packet)
+
+    def decode_scrambled(self, payload):
+        # Feeding scrambled bytes to the Opus decoder would corrupt its state
+        return mulaw_decode(payload)
+
+
+CODECS = {
+    "pcm": PCMCodec,
+    "pcmu": MuLawCodec,
+    "adpcm": AdpcmCodec,
+}
+if HAS_OPUS:
+    CODECS["opus"] = OpusCodec
+
+
+def available_codecs():
+    """Codec names this build supports, in order of preference."""
+    return [name for name in CODEC_PREFERENCE if name in CODECS]
+
+
+def create_codec(name, rate, frames_per_packet):
+    """Instantiate a codec by negotiated name; unknown names fall back to raw PCM."""
+    return CODECS.get(name, PCMCodec)(rate, frames_per_packet)
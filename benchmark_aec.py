@@ -0,0 +1,107 @@
+import argparse
+import wave
+
+import numpy as np
+
+import media_config
+from echo_canceller import EchoCanceller
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as w:
+        if w.getnchannels() != 1 or w.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected mono 16-bit PCM")
+        return w.getframerate(), np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+
+
+def write_wav(path, rate, pcm):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.astype(np.int16).tobytes())
+
+
+def speech_like(rate, seconds, f0, seed):
+    """Voiced, syllable-modulated test signal."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(rate * seconds)) / rate
+    pitch = f0 * (1 + 0.1 * np.sin(2 * np.pi * 0.7 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 2.5 * t + seed), 0, None)
+    return 6000 * voiced * envelope + rng.normal(0, 50, t.size)
+
+
+def synthesize(rate, seconds):
+    """Far-end signal, and a mic signal = room echo of it + near-end talk in the last third."""
+    far = speech_like(rate, seconds, 120, seed=1)
+    # Echo path: 40 ms device latency, exponentially decaying reflections, 10 dB loss
+    rng = np.random.default_rng(2)
+    taps = int(rate * 0.06)
+    rir = rng.normal(0, 1, taps) * np.exp(-np.arange(taps) / (rate * 0.01))
+    rir = np.concatenate((np.zeros(int(rate * 0.04)), 0.316 * rir / np.sqrt(np.sum(rir ** 2))))
+    echo = np.convolve(far, rir)[:far.size]
+    near = speech_like(rate, seconds, 210, seed=3)
+    near[: 2 * near.size // 3] = 0
+    mic = echo + near + rng.normal(0, 30, far.size)
+    return (np.clip(far, -32768, 32767).astype(np.int16),
+            np.clip(mic, -32768, 32767).astype(np.int16), echo)
+
+
+def run(rate, ptime, far, mic):
+    n = rate * ptime // 1000
+    aec = EchoCanceller(rate, n)
+    frames = min(far.size, mic.size) // n
+    out = bytearray()
+    for i in range(frames):
+        out += aec.process(mic[i * n:(i + 1) * n].tobytes(), far[i * n:(i + 1) * n].tobytes())
+    return aec, np.frombuffer(bytes(out), dtype=np.int16)
+
+
+def echo_reduction_db(out, echo, rate):
+    """Echo left in the output over the echo-only stretch, after a second to converge."""
+    seg = slice(rate, 2 * out.size // 3)
+    residual = out[seg].astype(np.float64)
+    return 10 * np.log10(np.mean(echo[seg] ** 2) / max(np.mean(residual ** 2), 1e-9))
+
+
+def benchmark(args):
+    if args.far and args.mic:
+        rate, far = read_wav(args.far)
+        mic_rate, mic = read_wav(args.mic)
+        if mic_rate != rate:
+            raise ValueError("far-end and mic WAVs must have the same sample rate")
+        echo = None
+    else:
+        rate = args.rate
+        far, mic, echo = synthesize(rate, args.seconds)
+
+    aec, out = run(rate, args.ptime, far, mic)
+    print(f"--- PQC Voice Chat Echo Canceller ({rate} Hz, {args.ptime} ms frames, "
+          f"{aec.partitions} partitions = {aec.partitions * args.ptime} ms tail) ---")
+    cpu = aec.cpu_report()
+    print(f"Frames processed:   {cpu['frames']}")
+    print(f"CPU per frame:      avg {cpu['avg_ms']:.3f} ms, max {cpu['max_ms']:.3f} ms "
+          f"of a {cpu['budget_ms']:.0f} ms budget ({cpu['load_percent']:.1f}% load)")
+    print(f"Filter ERLE:        {aec.erle_db:.1f} dB")
+    if echo is not None:
+        print(f"Echo reduction:     {echo_reduction_db(out, echo, rate):.1f} dB "
+              f"(filter + suppressor, echo-only segment)")
+    if args.out:
+        write_wav(args.out, rate, out)
+        print(f"Wrote {args.out}")
+    return aec, out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline echo canceller check: ERLE and CPU per frame")
+    parser.add_argument("--far", help="far-end (speaker reference) mono 16-bit WAV")
+    parser.add_argument("--mic", help="microphone recording of the same call, same rate")
+    parser.add_argument("--out", help="write the cancelled mic signal to this WAV")
+    parser.add_argument("--rate", type=int, default=media_config.DEFAULT_RATE,
+                        choices=media_config.SUPPORTED_RATES)
+    parser.add_argument("--ptime", type=int, default=media_config.DEFAULT_PTIME_MS,
+                        choices=media_config.SUPPORTED_PTIMES_MS)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    benchmark(parser.parse_args())
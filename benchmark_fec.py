@@ -0,0 +1,86 @@
+import argparse
+import random
+
+import numpy as np
+
+import audio_codec
+import fec
+import media_config
+from media_config import MediaConfig
+
+
+def gilbert_elliott(packets, loss_rate, burst_len, seed):
+    """Bursty loss pattern: mean loss `loss_rate`, mean burst length `burst_len` packets."""
+    rng = random.Random(seed)
+    p_bad_to_good = 1.0 / burst_len
+    p_good_to_bad = loss_rate * p_bad_to_good / max(1e-9, 1.0 - loss_rate)
+    bad = False
+    lost = []
+    for _ in range(packets):
+        bad = (rng.random() >= p_bad_to_good) if bad else (rng.random() < p_good_to_bad)
+        lost.append(bad)
+    return lost
+
+
+def speech_like_frames(media, count, seed):
+    rng = np.random.default_rng(seed)
+    n = media.frames_per_packet
+    t = np.arange(n * count) / media.rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    sig = 6000 * np.sin(2 * np.pi * np.cumsum(pitch) / media.rate) + rng.normal(0, 300, t.size)
+    pcm = np.clip(sig, -32768, 32767).astype(np.int16)
+    return [pcm[i * n:(i + 1) * n].tobytes() for i in range(count)]
+
+
+def simulate(media, depth, lost_pattern, frames):
+    """Run the real FEC pack/unpack over a loss pattern; returns (lost, recovered, overhead %)."""
+    codec = media.create_codec()
+    encoder = fec.RedundancyEncoder(depth, media.rate, media.frames_per_packet) if depth else None
+    primary_bytes = 0
+    total_bytes = 0
+    lost = recovered = 0
+    last_received = -1
+    for idx, pcm in enumerate(frames):
+        primary = codec.encode(pcm)
+        payload = encoder.pack(idx, pcm, primary) if encoder else primary
+        primary_bytes += len(primary) + media_config.PACKET_OVERHEAD
+        total_bytes += len(payload) + media_config.PACKET_OVERHEAD
+        if lost_pattern[idx]:
+            lost += 1
+            continue
+        gap = idx - last_received - 1
+        if gap and encoder:
+            redundant, _ = fec.unpack(payload)
+            recovered += sum(1 for d in redundant if d <= gap)
+        last_received = idx
+    overhead = (total_bytes - primary_bytes) / primary_bytes * 100
+    return lost, recovered, overhead
+
+
+def benchmark(codec, ptime, packets):
+    media = MediaConfig(ptime_ms=ptime, codec=codec)
+    frames = speech_like_frames(media, packets, seed=1)
+    print(f"--- PQC Voice Chat FEC Loss Simulation (codec: {codec}, {ptime} ms frames, "
+          f"redundancy: {fec.REDUNDANT_CODEC}) ---")
+    print(f"{'loss':>5} {'burst':>6} {'depth':>6} {'lost':>6} {'recovered':>10} "
+          f"{'residual loss':>14} {'bw overhead':>12}")
+    for loss_rate in (0.01, 0.05, 0.10, 0.20):
+        for burst in (1.0, 2.0, 4.0):
+            pattern = gilbert_elliott(packets, loss_rate, burst, seed=int(loss_rate * 1000 + burst))
+            for depth in range(fec.MAX_DEPTH + 1):
+                lost, recovered, overhead = simulate(media, depth, pattern, frames)
+                ratio = recovered / lost * 100 if lost else 0.0
+                residual = (lost - recovered) / packets * 100
+                print(f"{loss_rate * 100:>4.0f}% {burst:>6.1f} {depth:>6} {lost:>6} {ratio:>9.1f}% "
+                      f"{residual:>13.2f}% {overhead:>11.1f}%")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recovered-frame ratio vs bandwidth overhead for FEC")
+    parser.add_argument("--codec", default="pcmu", choices=audio_codec.available_codecs())
+    parser.add_argument("--ptime", type=int, default=media_config.DEFAULT_PTIME_MS,
+                        choices=media_config.SUPPORTED_PTIMES_MS)
+    parser.add_argument("--packets", type=int, default=5000)
+    args = parser.parse_args()
+    benchmark(args.codec, args.ptime, args.packets)
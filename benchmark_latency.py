@@ -0,0 +1,92 @@
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import audio_codec
+import media_config
+from media_config import MediaConfig
+from main import NetworkHandler
+
+
+def measure_transit(media, packets):
+    """Send paced packets over loopback through the real NetworkHandler path.
+
+    Returns the per-packet transit times (ms) from just before send_data()
+    until process_incoming_packet() has decrypted and de-obfuscated the frame.
+    """
+    key = os.urandom(32)
+    rx = NetworkHandler()
+    rx.configure_media(media)
+    rx.set_session_key(key)
+    sent_at = {}
+    transit = []
+    done = threading.Event()
+
+    def on_receive(data, addr):
+        clear, _ = rx.process_incoming_packet(data)
+        if clear:
+            idx = int.from_bytes(data[12:16], 'big')
+            transit.append((time.perf_counter() - sent_at[idx]) * 1000)
+            if len(transit) >= packets:
+                done.set()
+
+    rx.start_listening(0, on_receive)
+    port = rx.sock.getsockname()[1]
+
+    tx = NetworkHandler()
+    tx.configure_media(media)
+    tx.set_session_key(key)
+    tx.target_ip, tx.target_port = "127.0.0.1", port
+
+    frame = os.urandom(media.bytes_per_packet)
+    next_send = time.perf_counter()
+    for i in range(packets):
+        sent_at[i] = time.perf_counter()
+        tx.send_data(frame)
+        next_send += media.ptime_ms / 1000
+        time.sleep(max(0, next_send - time.perf_counter()))
+
+    done.wait(timeout=2)
+    rx.stop()
+    tx.stop()
+    return transit
+
+
+def benchmark(ptimes, packets, codec=media_config.LEGACY_CODEC):
+    print(f"--- PQC Voice Chat Packetization Latency (codec: {codec}) ---")
+    print("Mouth-to-ear estimate = frame fill + capture buffer + transit + playout buffer")
+    print()
+    print(f"{'ptime':>6} {'pkt/s':>6} {'payload':>8} {'overhead':>9} {'wire kbps':>10} "
+          f"{'transit avg':>12} {'transit p95':>12} {'mouth-to-ear':>13}")
+    for ptime in ptimes:
+        media = MediaConfig(ptime_ms=ptime, codec=codec)
+        transit = measure_transit(media, packets)
+        if not transit:
+            print(f"{ptime:>4} ms  no packets received")
+            continue
+        transit.sort()
+        avg = statistics.mean(transit)
+        p95 = transit[int(len(transit) * 0.95) - 1]
+        overhead = media_config.PACKET_OVERHEAD + media_config.IP_UDP_OVERHEAD
+        overhead_pct = overhead / (media.payload_bytes + overhead) * 100
+        # One frame filling, one frame in the capture buffer, one frame queued for playout
+        mouth_to_ear = 3 * ptime + avg
+        print(f"{ptime:>4} ms {media.packets_per_second:>6.0f} {media.payload_bytes:>7}B "
+              f"{overhead_pct:>8.1f}% {media.wire_kbps():>10.1f} {avg:>9.3f} ms {p95:>9.3f} ms "
+              f"{mouth_to_ear:>10.1f} ms")
+    print()
+    print(f"Playout queue limit: {media_config.JITTER_BUFFER_MS} ms of audio "
+          f"(adds up to that much under jitter)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure end-to-end latency per packetization time")
+    parser.add_argument("--ptime", type=int, nargs="+", default=list(media_config.SUPPORTED_PTIMES_MS),
+                        help="packetization times to measure (ms)")
+    parser.add_argument("--packets", type=int, default=200, help="packets sent per setting")
+    parser.add_argument("--codec", default=media_config.LEGACY_CODEC, choices=audio_codec.available_codecs(),
+                        help="audio codec between capture and encryption")
+    args = parser.parse_args()
+    benchmark(args.ptime, args.packets, args.codec)
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+import registry_store
+
+PUBLIC_KEY = "ab" * 400  # Kyber-512 public key, hex
+
+
+def record(i):
+    return {"public_key": PUBLIC_KEY, "listening_ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            "listening_port": 5000 + i % 1000, "registered_at": "2025-12-22 10:30:45"}
+
+
+def write_journal(path, users, updates=0):
+    """Journal for `users` registrations plus `updates` re-registrations, as the store writes it."""
+    with open(path, 'wb') as f:
+        for i in range(users + updates):
+            entry = ("put", f"user{i % users}", record(i))
+            f.write(json.dumps(entry, separators=(',', ':')).encode() + b"\n")
+
+
+def time_open(path, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        store = registry_store.JournalStore(path, compact_after=float("inf"))
+        times.append(time.perf_counter() - start)
+        store.close()
+    return statistics.median(times), len(store)
+
+
+def replay_benchmark(sizes, runs):
+    print(f"--- Journal replay at startup (median of {runs}) ---")
+    print(f"{'users':>8} {'journal only':>14} {'snapshot only':>14} {'journal MB':>11}")
+    results = {}
+    for users in sizes:
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "key_registry.json")
+            write_journal(path + ".journal", users)
+            journal_s, n = time_open(path, runs)
+            assert n == users
+            size = os.path.getsize(path + ".journal")
+            # Same registry after compaction: snapshot, empty journal
+            store = registry_store.JournalStore(path)
+            store.compact()
+            store.close()
+            snapshot_s, n = time_open(path, runs)
+            assert n == users
+            results[users] = {"journal_s": journal_s, "snapshot_s": snapshot_s, "journal_bytes": size}
+            print(f"{users:>8} {journal_s * 1000:>12.0f}ms {snapshot_s * 1000:>12.0f}ms {size / 1e6:>11.1f}")
+        finally:
+            shutil.rmtree(tmp)
+    return results
+
+
+def write_benchmark(threads, per_thread):
+    """Registrations/s when every write waits for its (group-committed) fsync."""
+    print(f"--- Durable registrations ({threads} threads x {per_thread}) ---")
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        store = registry_store.JournalStore(path)
+
+        def worker(t):
+            for i in range(per_thread):
+                store.put(f"user{t}_{i}", record(i))
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+        total = threads * per_thread
+        print(f"journal: {total / elapsed:8.0f} registrations/s, {store.syncs} fsyncs "
+              f"({total / max(1, store.syncs):.1f} writes per fsync)")
+        store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registry journal replay and write throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=200, help="registrations per thread")
+    args = parser.parse_args()
+    replay_benchmark(args.sizes, args.runs)
+    write_benchmark(args.threads, args.writes)
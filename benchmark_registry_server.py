@@ -0,0 +1,211 @@
+"""
+Load benchmark: the Flask registry server vs the asyncio one.
+
+Both servers are started as subprocesses on a temporary registry and driven
+by client processes over keep-alive connections, one scenario at a time:
+
+    fetch     GET /fetch/<user>            (looking up a peer's key to call it)
+    register  POST /register               (clients registering on startup)
+    pending   GET /call/pending/<user>     (lobby polls, no wait)
+    heartbeat POST /presence/heartbeat     (every online client, every 10 s)
+    list      GET /list                    (contact list refresh, full list)
+    contacts  GET /list?since=<version>    (contact list refresh, nothing changed:
+              + If-None-Match               304 with no body)
+
+Reports requests/s and median / p99 latency. --idle N first parks N
+long-polls (/call/pending?wait=30) on the server, as N connected lobbies
+would, to show what held requests cost each server.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVERS = {"flask": "key_registry_server.py", "async": "registry_server_async.py"}
+SCENARIOS = ("fetch", "register", "pending", "heartbeat", "list", "contacts")
+PUBLIC_KEY = "ab" * 592  # Kyber-512 public key as hex
+USERS = 1000
+RINGING_CALLS = 100
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(name, tmp, backend):
+    """Launch server `name` on a fresh registry in `tmp`; returns (process, port)."""
+    port = free_port()
+    env = dict(os.environ, REGISTRY_HOST="127.0.0.1", REGISTRY_PORT=str(port), REGISTRY_BACKEND=backend,
+               REGISTRY_FILE=os.path.join(tmp, f"{name}.json"), REGISTRY_DB=os.path.join(tmp, f"{name}.db"))
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, SERVERS[name])], env=env, cwd=tmp,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            if call(http.client.HTTPConnection("127.0.0.1", port, timeout=1), "GET", "/health")[0] == 200:
+                return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{name} server did not start")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def call(conn, method, path, body=None, headers=None):
+    """One request on a keep-alive connection; returns (status, parsed JSON or text)."""
+    headers = dict(headers or {})
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+    resp = conn.getresponse()
+    data = resp.read()
+    if resp.getheader("Content-Type", "").startswith("application/json"):
+        return resp.status, json.loads(data)
+    return resp.status, data.decode()
+
+
+def registration(username, port):
+    return {"username": username, "public_key": PUBLIC_KEY, "listening_ip": "10.0.0.1", "listening_port": port}
+
+
+def seed(port):
+    """USERS registered users, RINGING_CALLS of them with a call ringing."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    for i in range(USERS):
+        assert call(conn, "POST", "/register", registration(f"user{i}", 5000 + i % 1000))[0] == 201
+    for i in range(RINGING_CALLS):
+        status, _ = call(conn, "POST", "/call/initiate", {"caller": f"user{i + 1}", "callee": f"user{i}",
+                                                          "caller_listen_port": 5555,
+                                                          "session_key_ciphertext": "00" * 768})
+        assert status == 200
+    conn.close()
+
+
+def next_request(scenario, rng, worker, version):
+    """(method, path, body, headers) of the scenario's next request."""
+    if scenario == "fetch":
+        return "GET", f"/fetch/user{rng.randrange(USERS)}", None, None
+    if scenario == "register":
+        return "POST", "/register", registration(f"load{worker}_{rng.randrange(100000)}", 6000), None
+    if scenario == "heartbeat":
+        return "POST", "/presence/heartbeat", {"username": f"user{rng.randrange(USERS)}"}, None
+    if scenario == "list":
+        return "GET", "/list", None, None
+    if scenario == "contacts":
+        return "GET", f"/list?since={version}", None, {"If-None-Match": f'"{version}"'}
+    return "GET", f"/call/pending/user{rng.randrange(USERS)}", None, None
+
+
+def client(port, scenario, duration, worker, results):
+    rng = random.Random(worker)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    times = []
+    errors = 0
+    version = call(conn, "GET", "/list?limit=1")[1]["version"] if scenario == "contacts" else None
+    stop_at = time.perf_counter() + duration
+    while True:
+        start = time.perf_counter()
+        if start >= stop_at:
+            break
+        method, path, body, headers = next_request(scenario, rng, worker, version)
+        try:
+            status, _ = call(conn, method, path, body, headers)
+            if status >= 400:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        times.append(time.perf_counter() - start)
+    conn.close()
+    results.put((times, errors))
+
+
+def hold_idle(port, count):
+    """Park `count` long-polls on the server; returns their sockets (close them to release)."""
+    socks = []
+    for i in range(count):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.sendall(f"GET /call/pending/idle{i}?wait=30 HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+        socks.append(s)
+    time.sleep(0.5)
+    return socks
+
+
+def run_load(port, scenario, clients, duration):
+    """(requests/s, median ms, p99 ms, errors) of `clients` concurrent clients for `duration` seconds."""
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(port, scenario, duration, w, results))
+             for w in range(clients)]
+    for p in procs:
+        p.start()
+    times, errors = [], 0
+    for _ in procs:
+        t, e = results.get()
+        times.extend(t)
+        errors += e
+    for p in procs:
+        p.join()
+    times.sort()
+    if not times:
+        return 0.0, 0.0, 0.0, errors
+    return (len(times) / duration, times[len(times) // 2] * 1000,
+            times[max(0, int(len(times) * 0.99) - 1)] * 1000, errors)
+
+
+def benchmark(servers, scenarios, clients, duration, idle, backend):
+    print(f"--- registry servers: {clients} clients x {duration:.0f} s per scenario, "
+          f"{idle} idle long-polls, {backend} backend ---")
+    print(f"{'server':>6} {'scenario':>9} {'req/s':>9} {'median':>9} {'p99':>9} {'errors':>7}")
+    tmp = tempfile.mkdtemp()
+    results = {}
+    try:
+        for name in servers:
+            proc, port = start_server(name, tmp, backend)
+            try:
+                seed(port)
+                for scenario in scenarios:
+                    held = hold_idle(port, idle)
+                    try:
+                        rps, median, p99, errors = run_load(port, scenario, clients, duration)
+                    finally:
+                        for s in held:
+                            s.close()
+                    results[name, scenario] = rps, p99
+                    print(f"{name:>6} {scenario:>9} {rps:>9.0f} {median:>7.2f}ms {p99:>7.2f}ms {errors:>7}")
+            finally:
+                stop_server(proc)
+    finally:
+        shutil.rmtree(tmp)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Requests/s and p99 latency of the Flask and asyncio registry servers")
+    parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--idle", type=int, default=0, help="long-polls held open during each scenario")
+    parser.add_argument("--backend", choices=("json", "sqlite", "journal"), default="json")
+    args = parser.parse_args()
+    benchmark(args.servers, args.scenarios, args.clients, args.duration, args.idle, args.backend)
@@ -0,0 +1,61 @@
+import argparse
+import statistics
+import time
+
+import call_sessions
+import key_registry_server
+
+# Share of the background sessions left ringing (for other callees)
+RINGING_SHARE = 0.1
+
+
+def populate(sessions, count, callees):
+    """`count` sessions spread over `callees` users, mostly finished, some still ringing."""
+    ring_every = max(1, int(1 / RINGING_SHARE))
+    for i in range(count):
+        call_id = sessions.create({"caller": f"caller{i}", "callee": f"user{i % callees}",
+                                   "session_key_ciphertext": "00" * 768, "media_offer": None,
+                                   "initiated_at": "2025-12-22 10:30:00"})
+        if i % ring_every:
+            sessions.transition(call_id, call_sessions.ENDED)
+
+
+def time_pending(client, username, requests):
+    """Median and p99 wall time of GET /call/pending/<username>, in microseconds."""
+    times = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        resp = client.get(f"/call/pending/{username}")
+        times.append((time.perf_counter() - start) * 1e6)
+        assert resp.status_code == 200
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1]
+
+
+def benchmark(sizes, callees, requests):
+    print(f"--- /call/pending cost vs session count ({requests} requests, idle caller polling) ---")
+    print(f"{'sessions':>9} {'median':>10} {'p99':>10}")
+    service = key_registry_server.SERVICE
+    original = service.sessions
+    client = key_registry_server.app.test_client()
+    results = {}
+    try:
+        for size in sizes:
+            service.sessions = call_sessions.CallSessions()
+            populate(service.sessions, size, callees)
+            # An idle client with nothing ringing, as every lobby poll is
+            median, p99 = time_pending(client, "nobody", requests)
+            results[size] = median
+            print(f"{size:>9} {median:>8.0f}us {p99:>8.0f}us")
+    finally:
+        service.sessions = original
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the /call/pending lookup")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--callees", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+    benchmark(args.sizes, args.callees, args.requests)
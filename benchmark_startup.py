@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPEC = os.path.join(HERE, "PQC_Voice_Chat.spec")
+APP = "PQC_Voice_Chat"
+EXE_SUFFIX = ".exe" if sys.platform == "win32" else ""
+# Build profiles understood by PQC_Voice_Chat.spec
+VARIANTS = ("onefile", "onedir", "lean")
+
+
+def dist_dir(variant):
+    return os.path.join(HERE, "dist", variant)
+
+
+def executable(variant):
+    if variant == "source":
+        return [sys.executable, os.path.join(HERE, "main.py")]
+    if variant == "onefile":
+        return [os.path.join(dist_dir(variant), APP + EXE_SUFFIX)]
+    return [os.path.join(dist_dir(variant), APP, APP + EXE_SUFFIX)]
+
+
+def build(variant):
+    """Run PyInstaller for one profile into dist/<variant>."""
+    print(f"Building {variant}...")
+    env = dict(os.environ, PQC_BUILD_PROFILE=variant)
+    start = time.time()
+    subprocess.run([sys.executable, "-m", "PyInstaller", "--noconfirm", "--log-level", "WARN",
+                    "--distpath", dist_dir(variant),
+                    "--workpath", os.path.join(HERE, "build", variant), SPEC],
+                   check=True, env=env, cwd=HERE)
+    print(f"  built in {time.time() - start:.0f} s")
+
+
+def disk_size(variant):
+    if variant == "source":
+        return None
+    total = 0
+    for root, _, files in os.walk(dist_dir(variant)):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def launch(variant, timeout):
+    """Start the app once; returns (seconds to first window, peak RSS KiB)."""
+    fd, probe = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    os.remove(probe)
+    env = dict(os.environ, PQC_STARTUP_PROBE=probe)
+    start = time.time()
+    proc = subprocess.Popen(executable(variant), env=env, cwd=HERE,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        raise RuntimeError(f"{variant}: no window within {timeout} s")
+    if not os.path.exists(probe):
+        raise RuntimeError(f"{variant}: exited ({proc.returncode}) before showing a window")
+    with open(probe) as f:
+        result = json.load(f)
+    os.remove(probe)
+    return result["window_shown"] - start, result.get("peak_rss_kb")
+
+
+def benchmark(variants, runs, timeout):
+    print(f"--- PQC Voice Chat Startup Benchmark ({runs} launches per variant) ---")
+    print(f"{'variant':<9} {'size':>9} {'first':>9} {'median':>9} {'best':>9} {'peak RSS':>10}")
+    results = {}
+    for variant in variants:
+        if not os.path.exists(executable(variant)[-1]):
+            print(f"{variant:<9} not built (run with --build)")
+            continue
+        times, rss = [], []
+        for _ in range(runs):
+            ttfw, peak = launch(variant, timeout)
+            times.append(ttfw)
+            if peak:
+                rss.append(peak)
+        size = disk_size(variant)
+        results[variant] = {"first_s": times[0], "median_s": statistics.median(times),
+                            "best_s": min(times), "peak_rss_mb": max(rss) / 1024 if rss else None,
+                            "size_mb": size / 1e6 if size else None}
+        r = results[variant]
+        size_col = "-" if size is None else f"{size / 1e6:.1f} MB"
+        rss_col = "-" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.1f} MB"
+        print(f"{variant:<9} {size_col:>9} {r['first_s'] * 1000:>7.0f}ms {r['median_s'] * 1000:>7.0f}ms "
+              f"{r['best_s'] * 1000:>7.0f}ms {rss_col:>10}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-window and memory of the desktop app builds")
+    parser.add_argument("variants", nargs="*", default=list(VARIANTS),
+                        help=f"any of {', '.join(VARIANTS)}, or 'source' for python main.py")
+    parser.add_argument("--build", action="store_true", help="(re)build the variants with PyInstaller first")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    if args.build:
+        for v in args.variants:
+            if v != "source":
+                build(v)
+    results = benchmark(args.variants, args.runs, args.timeout)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
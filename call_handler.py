@@ -7,6 +7,8 @@ import threading
 import time
 from datetime import datetime
 
+import signalling_client
+
 class CallHandler:
     """Manages voice call initiation, acceptance, rejection, and termination."""
     
@@ -24,8 +26,10 @@ class CallHandler:
         self.incoming_call = None
         self.is_listening = False
         self.listen_thread = None
+        self.on_incoming = None
+        self.heartbeat_thread = None
     
-    def initiate_call(self, callee_username, caller_listen_port, session_key_ciphertext):
+    def initiate_call(self, callee_username, caller_listen_port, session_key_ciphertext, media_offer=None):
         """
         Initiate a voice call to another user.
         
@@ -33,6 +37,7 @@ class CallHandler:
             callee_username: Recipient's username (str)
             caller_listen_port: Port to listen on for audio (int)
             session_key_ciphertext: Encrypted session key from Kyber KEM (bytes)
+            media_offer: Optional media offer from media_config.build_offer() (dict)
         
         Returns:
             call_info: Dictionary with call details {call_id, callee_ip, callee_listen_port, ...}
@@ -51,7 +56,8 @@ class CallHandler:
                     "caller": self.username,
                     "callee": callee_username,
                     "caller_listen_port": caller_listen_port,
-                    "session_key_ciphertext": ct_b64
+                    "session_key_ciphertext": ct_b64,
+                    "media_offer": media_offer
                 },
                 timeout=5
             )
@@ -93,34 +99,28 @@ class CallHandler:
         
         call_id = self.active_call.get('call_id')
         start_time = time.time()
+        call_status = 'ringing'
         
         while time.time() - start_time < timeout:
-            try:
-                # Check call status
-                response = requests.get(
-                    f"{self.registry_server}/call/status/{call_id}",
-                    timeout=2
-                )
-                
-                if response.status_code == 200:
-                    status_info = response.json()
-                    call_status = status_info.get('status')
-                    
-                    if call_status == 'active':
-                        print(f"✅ Call answered!")
-                        self.active_call['call_status'] = 'active'
-                        self.active_call['answered_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        return True
-                    elif call_status == 'rejected':
-                        print(f"❌ Call rejected")
-                        self.active_call = None
-                        return False
-                
-                time.sleep(1)
+            # Long-poll: the registry answers as soon as the status changes
+            # (older registries answer at once and this falls back to 1 s polling)
+            remaining = timeout - (time.time() - start_time)
+            status_info = signalling_client.wait_call_status(
+                self.registry_server, call_id, call_status,
+                wait=min(signalling_client.LONG_POLL_S, remaining)
+            )
+            call_status = status_info.get('status', call_status)
             
-            except Exception as e:
-                print(f"⚠️ Error checking call status: {e}")
-                time.sleep(1)
+            if call_status == 'active':
+                print(f"✅ Call answered!")
+                self.active_call['call_status'] = 'active'
+                self.active_call['media_answer'] = status_info.get('media_answer')
+                self.active_call['answered_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                return True
+            elif call_status in ('rejected', 'ended'):
+                print(f"❌ Call {call_status}")
+                self.active_call = None
+                return False
         
         print(f"❌ Call timeout (no answer)")
         return False
@@ -146,17 +146,41 @@ class CallHandler:
             print(f"⚠️ Error ending call: {e}")
             self.active_call = None
     
-    def start_listening_for_calls(self):
-        """Start listening for incoming calls (in background thread)."""
+    def start_listening_for_calls(self, on_incoming=None):
+        """
+        Start listening for incoming calls (in background thread).
+        
+        Args:
+            on_incoming: Optional callback(call) for each new ringing call (dict
+                         as returned by /call/pending); the latest one is also
+                         kept in self.incoming_call
+        """
         if self.is_listening:
             return
         
+        self.on_incoming = on_incoming
         self.is_listening = True
         self.listen_thread = threading.Thread(target=self._listen_loop, daemon=True)
         self.listen_thread.start()
+        self.start_heartbeats()
         
         print(f"👂 Listening for incoming calls...")
     
+    def start_heartbeats(self):
+        """
+        Keep this user online in the registry's presence (background thread).
+        
+        The registry refuses calls to users who stopped sending heartbeats, so
+        anyone who wants to be callable needs this running. The thread lives
+        as long as the process; calling it again is a no-op.
+        """
+        if self.heartbeat_thread and self.heartbeat_thread.is_alive():
+            return
+        self.heartbeat_thread = threading.Thread(target=signalling_client.send_heartbeats,
+                                                 args=(self.registry_server, self.username, lambda: True),
+                                                 daemon=True)
+        self.heartbeat_thread.start()
+    
     def stop_listening_for_calls(self):
         """Stop listening for incoming calls."""
         self.is_listening = False
@@ -164,28 +188,30 @@ class CallHandler:
             self.listen_thread.join(timeout=2)
     
     def _listen_loop(self):
-        """Background thread: Poll for incoming calls."""
-        # Note: In a real system, would use WebSocket or server-push instead of polling
-        # For now, polling every 2 seconds is acceptable for college project
+        """Background thread: wait for incoming calls pushed by the registry (long-poll)."""
+        seen = set()
         
         while self.is_listening:
             try:
-                # Get registry and check for incoming calls
-                # This would require registry to track pending calls for each user
-                # For MVP, skip detailed implementation
-                
-                time.sleep(2)
+                calls = signalling_client.wait_pending_calls(self.registry_server, self.username, seen)
+                for call in calls:
+                    seen.add(call['call_id'])
+                    self.incoming_call = call
+                    print(f"📞 Incoming call from {call['caller']}")
+                    if self.on_incoming:
+                        self.on_incoming(call)
             
             except Exception as e:
                 print(f"⚠️ Listen loop error: {e}")
                 time.sleep(2)
     
-    def accept_call(self, call_id):
+    def accept_call(self, call_id, media_answer=None):
         """
         Accept an incoming call.
         
         Args:
             call_id: ID of the incoming call (str)
+            media_answer: Optional media answer from media_config.select_answer() (dict)
         
         Returns:
             caller_info: Dictionary with caller's IP and port, or None if failed
@@ -193,7 +219,7 @@ class CallHandler:
         try:
             response = requests.post(
                 f"{self.registry_server}/call/accept",
-                json={"call_id": call_id},
+                json={"call_id": call_id, "media_answer": media_answer},
                 timeout=5
             )
             
@@ -207,6 +233,7 @@ class CallHandler:
                 'caller_ip': call_info.get('caller_ip'),
                 'caller_port': call_info.get('caller_listen_port'),
                 'session_key_ciphertext': call_info.get('session_key_ciphertext'),
+                'media_answer': call_info.get('media_answer'),
                 'call_status': 'active',
                 'direction': 'incoming'
             }
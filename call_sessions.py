@@ -0,0 +1,289 @@
+"""
+Call signalling state for key_registry_server.py.
+
+Calls used to live in a bare dict that every request thread read and
+mutated. CallSessions keeps them behind a lock and makes each state change
+a single atomic check-and-set, so racing requests (a callee accepting while
+the caller hangs up) see one consistent outcome. Readers get copies, never
+the live record. Ringing calls are also indexed by callee, so looking up a
+user's incoming calls costs the same however many sessions exist.
+
+    ringing --accept--> active --hangup--> ended
+       |--reject--> rejected
+       '--hangup--> ended          (caller gave up)
+
+Every state has a time limit. A call nobody answers within the ringing
+timeout, or an active call nobody hangs up (clients that crash or just stop
+sending media never do), is moved to ended; ended and rejected calls are kept
+for a short retention period so both sides can still read the outcome, then
+dropped along with their Kyber ciphertexts. Deadlines sit in a min-heap, so
+expiring is O(log n) per call and finding the next due call is O(1).
+
+wait_pending() and wait_status() back the long-poll endpoints: a request
+sleeps on a condition keyed by its callee or call ID and is woken only by
+changes to that key, not by every change on the server. Servers that don't
+park a thread per request (registry_server_async.py) register a callback for
+the key with listen() instead and re-check pending_ready() / status_ready().
+"""
+
+import heapq
+import sys
+import threading
+import time
+import uuid
+
+RINGING = "ringing"
+ACTIVE = "active"
+REJECTED = "rejected"
+ENDED = "ended"
+
+# status -> statuses a call may move to from it
+TRANSITIONS = {
+    RINGING: (ACTIVE, REJECTED, ENDED),
+    ACTIVE: (ENDED,),
+    REJECTED: (ENDED,),
+    ENDED: (),
+}
+
+# Seconds a call may stay in each state (clients give up ringing after 30 s)
+RINGING_TIMEOUT = 60
+ACTIVE_TIMEOUT = 12 * 3600
+RETENTION = 60  # ended / rejected calls, as the outcome for the other side
+
+
+class InvalidTransition(ValueError):
+    """The call exists but can't move to the requested status from its current one."""
+
+    def __init__(self, call_id, current, status):
+        super().__init__(f"Call '{call_id}' is {current}, cannot become {status}")
+        self.current = current
+
+
+def _record_bytes(call):
+    """Rough memory held by one call record (the dict plus its top-level values)."""
+    return sys.getsizeof(call) + sum(sys.getsizeof(v) for v in call.values())
+
+
+class CallSessions:
+    def __init__(self, ringing_timeout=RINGING_TIMEOUT, active_timeout=ACTIVE_TIMEOUT,
+                 retention=RETENTION, clock=time.monotonic):
+        self.ttl = {RINGING: ringing_timeout, ACTIVE: active_timeout, REJECTED: retention, ENDED: retention}
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._ringing = {}  # callee -> {call_id: None}, oldest first
+        self._deadlines = {}  # call_id -> current deadline; heap entries not matching it are stale
+        self._heap = []
+        self._counts = dict.fromkeys(TRANSITIONS, 0)
+        self._bytes = 0
+        self._waiters = {}  # ("callee", name) / ("call", id) -> [Condition, waiting requests]
+        self._listeners = {}  # same keys -> [callback]
+        self.timed_out = 0  # ringing/active calls ended by their timeout
+        self.removed = 0    # finished calls dropped after retention
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __contains__(self, call_id):
+        return call_id in self._calls
+
+    def create(self, call):
+        """Store a new ringing call (a dict of its fields); returns its call ID."""
+        call_id = str(uuid.uuid4())
+        record = dict(call, status=RINGING)
+        with self._lock:
+            self._calls[call_id] = record
+            self._ringing.setdefault(call['callee'], {})[call_id] = None
+            self._counts[RINGING] += 1
+            self._bytes += _record_bytes(record)
+            self._schedule(call_id, RINGING)
+            self._notify(("callee", call['callee']))
+        return call_id
+
+    def get(self, call_id):
+        """Copy of the call's record, or None."""
+        with self._lock:
+            call = self._calls.get(call_id)
+            return dict(call) if call else None
+
+    def transition(self, call_id, status, **fields):
+        """
+        Atomically move a call to `status` and set `fields` on it.
+
+        Returns a copy of the updated record. Raises KeyError for an unknown
+        call and InvalidTransition if the move isn't allowed; ending an
+        already ended call is a no-op.
+        """
+        with self._lock:
+            call = self._calls.get(call_id)
+            if call is None:
+                raise KeyError(call_id)
+            current = call['status']
+            if status == current == ENDED:
+                return dict(call)
+            if status not in TRANSITIONS[current]:
+                raise InvalidTransition(call_id, current, status)
+            self._set_status(call_id, call, status, fields)
+            return dict(call)
+
+    def _set_status(self, call_id, call, status, fields):
+        current = call['status']
+        self._bytes -= _record_bytes(call)
+        call.update(fields)
+        call['status'] = status
+        self._bytes += _record_bytes(call)
+        self._counts[current] -= 1
+        self._counts[status] += 1
+        if current == RINGING:
+            self._unindex(call_id, call['callee'])
+        self._schedule(call_id, status)
+        self._notify(("call", call_id))
+
+    def _schedule(self, call_id, status):
+        deadline = self.clock() + self.ttl[status]
+        self._deadlines[call_id] = deadline
+        heapq.heappush(self._heap, (deadline, call_id))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            # Mostly superseded entries (e.g. active-call deadlines of calls since hung up)
+            self._heap = [(d, c) for c, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _unindex(self, call_id, callee):
+        ringing = self._ringing.get(callee)
+        if ringing is not None:
+            ringing.pop(call_id, None)
+            if not ringing:
+                del self._ringing[callee]
+
+    def pending_for(self, callee):
+        """Copies of the calls ringing for `callee`."""
+        return self.wait_pending(callee, timeout=0)
+
+    def wait_pending(self, callee, exclude=(), timeout=0):
+        """
+        Copies of the calls ringing for `callee`, waiting up to `timeout`
+        seconds for one whose ID isn't in `exclude` if there is none yet.
+        """
+        with self._lock:
+            if timeout > 0:
+                self._wait(("callee", callee), lambda: self._pending_ready(callee, exclude), timeout)
+            return [dict(self._calls[call_id], call_id=call_id) for call_id in self._ringing.get(callee, ())]
+
+    def wait_status(self, call_id, known=None, timeout=0):
+        """
+        Copy of the call's record once its status differs from `known`
+        (waiting up to `timeout` seconds), or None if there is no such call.
+        """
+        with self._lock:
+            if timeout > 0 and known:
+                self._wait(("call", call_id), lambda: self._status_ready(call_id, known), timeout)
+            call = self._calls.get(call_id)
+            return dict(call) if call else None
+
+    def pending_ready(self, callee, exclude=()):
+        """Whether wait_pending(callee, exclude) would return without waiting."""
+        with self._lock:
+            return self._pending_ready(callee, exclude)
+
+    def _pending_ready(self, callee, exclude):
+        return any(call_id not in exclude for call_id in self._ringing.get(callee, ()))
+
+    def status_ready(self, call_id, known=None):
+        """Whether wait_status(call_id, known) would return without waiting."""
+        with self._lock:
+            return self._status_ready(call_id, known)
+
+    def _status_ready(self, call_id, known):
+        return not known or call_id not in self._calls or self._calls[call_id]['status'] != known
+
+    def listen(self, key, callback):
+        """
+        Call callback() on every change to `key`: ("callee", name) for a new
+        call ringing for name, ("call", id) for a change to that call. It runs
+        with the sessions lock held, so it must only hand off (e.g. with
+        loop.call_soon_threadsafe). Returns a function that removes it.
+        """
+        with self._lock:
+            self._listeners.setdefault(key, []).append(callback)
+
+        def remove():
+            with self._lock:
+                callbacks = self._listeners.get(key)
+                if callbacks and callback in callbacks:
+                    callbacks.remove(callback)
+                    if not callbacks:
+                        del self._listeners[key]
+        return remove
+
+    def _wait(self, key, ready, timeout):
+        """Lock held: sleep on `key`'s condition until ready() or timeout."""
+        entry = self._waiters.get(key)
+        if entry is None:
+            entry = self._waiters[key] = [threading.Condition(self._lock), 0]
+        entry[1] += 1
+        try:
+            entry[0].wait_for(ready, timeout)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._waiters[key]
+
+    def _notify(self, key):
+        entry = self._waiters.get(key)
+        if entry:
+            entry[0].notify_all()
+        for callback in self._listeners.get(key, ()):
+            callback()
+
+    def expire(self, now=None):
+        """
+        Apply every deadline that has passed: time out ringing/active calls
+        (they become ended) and drop finished calls past retention. Returns
+        the number of calls affected.
+        """
+        now = self.clock() if now is None else now
+        changed = 0
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                deadline, call_id = heapq.heappop(heap)
+                if self._deadlines.get(call_id) != deadline:
+                    continue  # superseded by a later transition
+                call = self._calls[call_id]
+                if call['status'] in (RINGING, ACTIVE):
+                    self._set_status(call_id, call, ENDED,
+                                     {'ended_at': time.strftime("%Y-%m-%d %H:%M:%S"), 'end_reason': 'timeout'})
+                    self.timed_out += 1
+                else:
+                    del self._calls[call_id]
+                    del self._deadlines[call_id]
+                    self._notify(("call", call_id))
+                    self._counts[call['status']] -= 1
+                    self._bytes -= _record_bytes(call)
+                    self.removed += 1
+                changed += 1
+        return changed
+
+    def start_expirer(self, interval=1.0):
+        """Run expire() every `interval` seconds in a daemon thread."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.expire()
+                except Exception as e:
+                    print(f"Call sessions: expiry failed: {e}")
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stats(self):
+        """Session gauges: count per state, approximate memory, expiry counters."""
+        with self._lock:
+            return {"sessions": len(self._calls),
+                    **{f"sessions_{state}": n for state, n in self._counts.items()},
+                    "session_bytes": self._bytes,
+                    "expiry_queue": len(self._heap),
+                    "long_poll_waiters": (sum(n for _, n in self._waiters.values())
+                                          + sum(map(len, self._listeners.values()))),
+                    "sessions_timed_out": self.timed_out,
+                    "sessions_removed": self.removed}
@@ -2,23 +2,35 @@ import pickle
 import hashlib
 import json
 import os
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from pqc.kem import kyber512 as kemalg
-from pydub import AudioSegment
+
+# Heavy dependencies are imported on first use so importing this module (and
+# starting the apps that use it) stays fast.
+
+def _kem():
+    from pqc.kem import kyber512
+    return kyber512
+
+def _aesgcm(key):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM(key)
+
+def _audio_segment():
+    from pydub import AudioSegment
+    return AudioSegment
 
 # Generate Kyber KEM keypair (receiver does this)
 def kyber_generate_keypair():
-    pk, sk = kemalg.keypair()
+    pk, sk = _kem().keypair()
     return pk, sk
 
 # Sender: Establish PQ session (needs receiver's public key)
 def kyber_encapsulate(receiver_pk):
-    session_key, ciphertext = kemalg.encap(receiver_pk)
+    session_key, ciphertext = _kem().encap(receiver_pk)
     return session_key, ciphertext
 
 # Receiver: Derive session from ciphertext + sk
 def kyber_decapsulate(ciphertext, sk):
-    session_key = kemalg.decap(ciphertext, sk)
+    session_key = _kem().decap(ciphertext, sk)
     return session_key
 
 # Derive obfuscation key from session key using hash
@@ -49,9 +61,9 @@ def deobfuscate_audio(obfuscated_data, session_key, chunk_index):
 
 # Encrypt .wav in chunks with AES-GCM using session key + identity obfuscation
 def encrypt_audio_chunks(audio_file, session_key, chunk_ms=2000):
-    audio = AudioSegment.from_file(audio_file, format="wav")
+    audio = _audio_segment().from_file(audio_file, format="wav")
     chunks = [audio[i:i+chunk_ms] for i in range(0, len(audio), chunk_ms)]
-    aesgcm = AESGCM(session_key)
+    aesgcm = _aesgcm(session_key)
     base_nonce = b"noncebase"
     encrypted_chunks = []
     obfuscated_chunks = []  # Store obfuscated chunks for preview
@@ -68,6 +80,7 @@ def encrypt_audio_chunks(audio_file, session_key, chunk_ms=2000):
 
 def save_obfuscated_audio(obfuscated_chunks, output_file="obfuscated_audio.wav"):
     """Save the obfuscated audio (before encryption) for preview on sender side."""
+    AudioSegment = _audio_segment()
     obfuscated_audio_chunks = []
     for obfuscated_data, fr, sw, ch in obfuscated_chunks:
         chunk = AudioSegment(
@@ -81,7 +94,8 @@ def save_obfuscated_audio(obfuscated_chunks, output_file="obfuscated_audio.wav")
 
 def decrypt_and_show_obfuscated(encrypted_chunks, session_key, output_file="obfuscated_received.wav"):
     """Decrypt but keep obfuscated (for receiver to see unrecognizable audio)."""
-    aesgcm = AESGCM(session_key)
+    AudioSegment = _audio_segment()
+    aesgcm = _aesgcm(session_key)
     obfuscated_chunks = []
     for idx, (nonce, ct, fr, sw, ch) in enumerate(encrypted_chunks):
         # Only decrypt, don't de-obfuscate
@@ -95,7 +109,8 @@ def decrypt_and_show_obfuscated(encrypted_chunks, session_key, output_file="obfu
     return output_file
 
 def decrypt_audio_chunks(encrypted_chunks, session_key, output_file="decrypted_audio.wav"):
-    aesgcm = AESGCM(session_key)
+    AudioSegment = _audio_segment()
+    aesgcm = _aesgcm(session_key)
     decrypted_chunks = []
     for idx, (nonce, ct, fr, sw, ch) in enumerate(encrypted_chunks):
         # Step 1: Decrypt the ciphertext
@@ -145,7 +160,7 @@ def encrypt_metadata(metadata_dict, session_key):
     metadata_nonce = os.urandom(12)
     
     # Encrypt metadata with AES-GCM
-    aesgcm = AESGCM(metadata_key)
+    aesgcm = _aesgcm(metadata_key)
     ciphertext = aesgcm.encrypt(metadata_nonce, metadata_json, None)
     
     return metadata_nonce, ciphertext
@@ -165,7 +180,7 @@ def decrypt_metadata(metadata_nonce, ciphertext, session_key):
     metadata_key = derive_metadata_key(session_key)
     
     # Decrypt with AES-GCM
-    aesgcm = AESGCM(metadata_key)
+    aesgcm = _aesgcm(metadata_key)
     metadata_json = aesgcm.decrypt(metadata_nonce, ciphertext, None)
     
     # Deserialize from JSON
@@ -0,0 +1,144 @@
+"""
+Acoustic echo cancellation for full-duplex calls.
+
+The far-end audio we hand to the speaker is fed back in as a reference;
+an adaptive filter learns the speaker-to-microphone path (device latency,
+room reflections) and subtracts the predicted echo from each captured frame
+before it is encoded. The filter is NLMS run block-wise in the frequency
+domain (partitioned overlap-save), so a whole frame and every filter
+partition are updated with a handful of NumPy FFTs instead of a per-sample
+Python loop.
+
+A Geigel double-talk detector freezes adaptation while the local user is
+talking over the far end, and a residual echo suppressor attenuates what the
+filter leaves behind while only the far end is talking.
+"""
+
+import time
+
+import numpy as np
+
+# Echo path length the filter can model, in ms (device latency + room tail)
+TAIL_MS = 200
+# NLMS step size (0 < mu < 2); higher converges faster, misadjusts more
+STEP_SIZE = 0.5
+# Smoothing of the per-bin far-end power used to normalize the step
+POWER_SMOOTHING = 0.8
+# Double talk: near-end peak above this fraction of the recent far-end peak
+# (assumes the speaker-to-mic path loses at least ~8 dB)
+GEIGEL_THRESHOLD = 0.4
+DOUBLE_TALK_HANGOVER_MS = 100
+# Far-end peak below which there is nothing to cancel (int16 scale)
+FAR_END_ACTIVE = 300
+# Residual echo suppression while only the far end is talking
+SUPPRESSION_DB = 12
+# Added to the per-bin power so near-silent bins don't get huge steps
+REGULARIZATION = 1e8
+
+
+def _block(samples, n):
+    """int16 samples as a float block of exactly n, zero-padded or cut."""
+    block = np.zeros(n)
+    block[:min(n, samples.size)] = samples[:n]
+    return block
+
+
+class EchoCanceller:
+    """Partitioned-block frequency-domain NLMS echo canceller for 16-bit mono PCM."""
+
+    def __init__(self, rate, frames_per_packet, tail_ms=TAIL_MS, mu=STEP_SIZE):
+        self.n = frames_per_packet
+        self.ptime_ms = frames_per_packet * 1000 / rate
+        self.mu = mu
+        self.partitions = max(1, -(-rate * tail_ms // 1000) // frames_per_packet)
+        bins = self.n + 1
+        self.weights = np.zeros((self.partitions, bins), dtype=np.complex128)
+        # Far-end spectra, newest partition first
+        self.far_spectra = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self.far_prev = np.zeros(self.n)
+        self.far_peaks = np.zeros(self.partitions)
+        self.far_power = np.zeros(bins)
+        self.double_talk_frames = max(1, int(DOUBLE_TALK_HANGOVER_MS / self.ptime_ms))
+        self._hold = 0
+        self._gain = 1.0
+        self.suppression_gain = 10 ** (-SUPPRESSION_DB / 20)
+
+        # Smoothed mic/residual power while only the far end talks, for ERLE
+        self._mic_power = 0.0
+        self._err_power = 0.0
+
+        # CPU accounting
+        self.frames = 0
+        self.cpu_total = 0.0
+        self.cpu_max = 0.0
+
+    def process(self, near, far):
+        """
+        Cancel echo of `far` (the frame just sent to the speaker) from `near`
+        (the captured frame). Both are int16 PCM bytes; returns cleaned bytes,
+        as many as `near` up to frames_per_packet samples. Shorter frames (a
+        resampled device's odd frame) are zero-padded for the filter.
+        """
+        start = time.perf_counter()
+        d = _block(np.frombuffer(near, dtype=np.int16), self.n)
+        x = np.zeros(self.n) if far is None else _block(np.frombuffer(far, dtype=np.int16), self.n)
+
+        # Shift the new far-end block into the partition history (overlap-save)
+        self.far_spectra[1:] = self.far_spectra[:-1]
+        self.far_spectra[0] = np.fft.rfft(np.concatenate((self.far_prev, x)))
+        self.far_prev = x
+        self.far_peaks[1:] = self.far_peaks[:-1]
+        self.far_peaks[0] = np.abs(x).max()
+
+        echo = np.fft.irfft((self.weights * self.far_spectra).sum(axis=0))[self.n:]
+        e = d - echo
+
+        far_peak = self.far_peaks.max()
+        far_active = far_peak > FAR_END_ACTIVE
+        if far_active and np.abs(d).max() > GEIGEL_THRESHOLD * far_peak:
+            self._hold = self.double_talk_frames
+        elif self._hold:
+            self._hold -= 1
+        double_talk = self._hold > 0
+
+        if far_active and not double_talk:
+            err_spec = np.fft.rfft(np.concatenate((np.zeros(self.n), e)))
+            power = (np.abs(self.far_spectra) ** 2).sum(axis=0)
+            self.far_power = POWER_SMOOTHING * self.far_power + (1 - POWER_SMOOTHING) * power
+            grad = np.conj(self.far_spectra) * (err_spec / (self.far_power + REGULARIZATION))
+            # Gradient constraint: keep each partition a linear (not circular) filter
+            g = np.fft.irfft(grad, axis=1)
+            g[:, self.n:] = 0
+            self.weights += self.mu * np.fft.rfft(g, axis=1)
+            self._mic_power = 0.9 * self._mic_power + 0.1 * np.dot(d, d)
+            self._err_power = 0.9 * self._err_power + 0.1 * np.dot(e, e)
+
+        # Residual echo suppression, ramped across the frame to avoid clicks
+        target = self.suppression_gain if far_active and not double_talk else 1.0
+        gain = np.linspace(self._gain, target, self.n)
+        self._gain = target
+        out = np.clip(e * gain, -32768, 32767).astype(np.int16)[:len(near) // 2].tobytes()
+
+        elapsed = time.perf_counter() - start
+        self.frames += 1
+        self.cpu_total += elapsed
+        self.cpu_max = max(self.cpu_max, elapsed)
+        return out
+
+    @property
+    def erle_db(self):
+        """Echo return loss enhancement of the adaptive filter (before suppression)."""
+        if self._err_power <= 0:
+            return 0.0
+        return 10 * np.log10(max(self._mic_power, 1e-9) / self._err_power)
+
+    def cpu_report(self):
+        """Per-frame processing time against the frame's real-time budget."""
+        avg_ms = self.cpu_total / self.frames * 1000 if self.frames else 0.0
+        return {
+            "frames": self.frames,
+            "avg_ms": avg_ms,
+            "max_ms": self.cpu_max * 1000,
+            "budget_ms": self.ptime_ms,
+            "load_percent": avg_ms / self.ptime_ms * 100,
+        }
@@ -0,0 +1,61 @@
+"""
+Forward error correction for the UDP voice stream.
+
+Each audio packet can carry low-bitrate copies of the previous one or two
+frames (redundant audio in the style of RFC 2198). When a packet is lost the
+next one to arrive already holds that frame, so the receiver rebuilds it
+before playout instead of concealing it, with no extra buffering delay.
+Redundant copies are IMA ADPCM whatever the primary codec is, and they are
+obfuscated and encrypted together with the primary payload.
+
+Packet payload for KIND_AUDIO_FEC:
+    count(1) | count x [distance(1) length(2)] | redundant blocks | primary payload
+"""
+
+import collections
+import struct
+
+import audio_codec
+
+# Redundancy depths a peer can negotiate (0 = FEC off)
+MAX_DEPTH = 2
+REDUNDANT_CODEC = "adpcm"
+
+
+class RedundancyEncoder:
+    """Keeps the last few frames' redundant encodings and packs them into each packet."""
+
+    def __init__(self, depth, rate, frames_per_packet):
+        self.depth = depth
+        self.codec = audio_codec.create_codec(REDUNDANT_CODEC, rate, frames_per_packet)
+        self.history = collections.deque(maxlen=depth)
+        self.redundant_bytes = 0
+
+    def pack(self, idx, pcm, primary):
+        """Build the FEC payload for frame `idx` (primary = codec-encoded pcm)."""
+        blocks = [(idx - i, red) for i, red in self.history if 0 < idx - i <= self.depth]
+        header = bytearray([len(blocks)])
+        for distance, red in blocks:
+            header += struct.pack('!BH', distance, len(red))
+        # Encode this frame once; the next `depth` packets reuse it
+        self.history.append((idx, self.codec.encode(pcm)))
+        redundant = b"".join(red for _, red in blocks)
+        self.redundant_bytes += len(header) + len(redundant)
+        return bytes(header) + redundant + primary
+
+
+def unpack(payload):
+    """Split an FEC payload into ({distance: redundant block}, primary payload)."""
+    count = payload[0]
+    pos = 1 + 3 * count
+    redundant = {}
+    for i in range(count):
+        distance, length = struct.unpack_from('!BH', payload, 1 + 3 * i)
+        redundant[distance] = payload[pos:pos + length]
+        pos += length
+    return redundant, payload[pos:]
+
+
+def create_decoder(rate, frames_per_packet):
+    """Decoder for redundant blocks (stateless per frame, separate from the primary codec)."""
+    return audio_codec.create_codec(REDUNDANT_CODEC, rate, frames_per_packet)
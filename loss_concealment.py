@@ -0,0 +1,156 @@
+"""
+Sequence-gap loss detection and packet-loss concealment (PLC) for the receive path.
+
+SequenceTracker watches the 4-byte packet index: a jump forward means the
+frames in between were lost, an index below the highest seen means a late
+(reordered) arrival. Indexes are compared modulo 2**32, so the count carries
+on across a wrap of the field. For every lost frame PacketLossConcealer synthesizes
+audio by repeating the last pitch period of the good signal (found by
+normalized autocorrelation) and fading it out, so short losses are bridged
+and long ones decay to silence instead of clicking.
+"""
+
+import collections
+
+import numpy as np
+
+# Pitch search range
+MIN_PITCH_HZ = 50
+MAX_PITCH_HZ = 400
+# Below this normalized correlation the signal is treated as unvoiced and the
+# last frame is simply repeated
+VOICED_CORRELATION = 0.3
+# Concealed audio fades linearly to silence over this long
+FADE_MS = 60
+# Never synthesize more than this much audio for a single gap
+MAX_CONCEAL_MS = 200
+# Cross-fade length when real audio resumes after concealment
+RESUME_CROSSFADE_MS = 4
+# How many recently missing indexes are remembered for late-arrival accounting
+MISSING_WINDOW = 512
+# The packet index is a 32-bit field
+SEQ_MOD = 1 << 32
+
+
+class SequenceTracker:
+    """Loss, late-arrival and duplicate accounting keyed on the packet index."""
+
+    def __init__(self):
+        self.highest = None
+        self.received = 0
+        self.lost = 0
+        self.late = 0
+        self.duplicates = 0
+        self._missing = collections.OrderedDict()
+
+    @property
+    def expected(self):
+        return self.received + self.lost
+
+    @property
+    def loss_percent(self):
+        return self.lost / self.expected * 100 if self.expected else 0.0
+
+    def arrival(self, idx):
+        """
+        Record one authenticated packet.
+
+        Returns the number of frames missing right before it, or -1 if the
+        packet is late or a duplicate and should not be played.
+        """
+        if self.highest is None:
+            self.highest = idx
+            self.received += 1
+            return 0
+        # Unwrap to the index nearest the highest one: highest stays a running count
+        delta = (idx - self.highest) % SEQ_MOD
+        idx = self.highest + (delta - SEQ_MOD if delta >= SEQ_MOD // 2 else delta)
+        if idx > self.highest:
+            gap = idx - self.highest - 1
+            for missing in range(max(self.highest + 1, idx - MISSING_WINDOW), idx):
+                self._missing[missing] = True
+            while len(self._missing) > MISSING_WINDOW:
+                self._missing.popitem(last=False)
+            self.highest = idx
+            self.received += 1
+            self.lost += gap
+            return gap
+        if self._missing.pop(idx, None):
+            # Counted as lost and already concealed; it still arrived
+            self.lost -= 1
+            self.received += 1
+            self.late += 1
+        else:
+            self.duplicates += 1
+        return -1
+
+
+class PacketLossConcealer:
+    """Pitch-repetition concealment with fade-out, operating on 16-bit PCM frames."""
+
+    def __init__(self, rate, frames_per_packet):
+        self.rate = rate
+        self.frames_per_packet = frames_per_packet
+        self.min_lag = rate // MAX_PITCH_HZ
+        self.max_lag = rate // MIN_PITCH_HZ
+        self.history = np.zeros(2 * self.max_lag + frames_per_packet, dtype=np.float32)
+        self.fade_samples = rate * FADE_MS // 1000
+        self.max_frames = max(1, MAX_CONCEAL_MS * rate // 1000 // frames_per_packet)
+        self.crossfade = rate * RESUME_CROSSFADE_MS // 1000
+        self.frames_concealed = 0
+        self._period = None
+        self._phase = 0
+        self._concealed_samples = 0
+        self._tail = None
+
+    def _find_period(self):
+        window = self.max_lag
+        seg = self.history[-window:]
+        ref = self.history[-(window + self.max_lag):]
+        corr = np.correlate(ref, seg, mode="valid")[::-1]  # corr[lag] for lag 0..max_lag
+        energy = np.cumsum(ref * ref)
+        # Energy of ref[k:k+window] for each k, reversed to line up with lag
+        win_energy = (energy[window - 1:] - np.concatenate(([0.0], energy[:-window])))[::-1]
+        denom = np.sqrt(win_energy * float(np.dot(seg, seg))) + 1e-9
+        norm = corr / denom
+        lag = self.min_lag + int(np.argmax(norm[self.min_lag:]))
+        return lag if norm[lag] >= VOICED_CORRELATION else None
+
+    def good_frame(self, pcm):
+        """Feed a received frame; returns it, cross-faded if it follows concealment."""
+        frame = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        if self._tail is not None and frame.size:
+            n = min(self.crossfade, frame.size, self._tail.size)
+            ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            frame = frame.copy()
+            frame[:n] = frame[:n] * ramp + self._tail[:n] * (1.0 - ramp)
+            pcm = np.clip(frame, -32768, 32767).astype(np.int16).tobytes()
+        self._tail = None
+        self._period = None
+        self._concealed_samples = 0
+        self.history = np.concatenate((self.history, frame))[-self.history.size:]
+        return pcm
+
+    def conceal(self, count):
+        """Synthesize `count` missing frames (capped at MAX_CONCEAL_MS)."""
+        count = min(count, self.max_frames)
+        frames = []
+        n = self.frames_per_packet
+        for _ in range(count):
+            if self._period is None:
+                self._period = self._find_period() or n
+                self._phase = 0
+            period = min(self._period, self.history.size)
+            cycle = self.history[-period:]
+            # Extend one crossfade past the frame so resumption can blend into it
+            idx = (self._phase + np.arange(n + self.crossfade)) % period
+            out = cycle[idx]
+            start = self._concealed_samples
+            gain = 1.0 - (start + np.arange(n + self.crossfade, dtype=np.float32)) / self.fade_samples
+            out = out * np.clip(gain, 0.0, 1.0)
+            self._phase = (self._phase + n) % period
+            self._concealed_samples += n
+            self._tail = out[n:]
+            frames.append(np.clip(out[:n], -32768, 32767).astype(np.int16).tobytes())
+        self.frames_concealed += count
+        return frames
@@ -1,34 +1,37 @@
 
 import socket
 import threading
-import pyaudio
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import requests
 import json
 import time
-import queue
 import os
 import struct
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import audio_backend
 import crypto_utils
+import fec
+import media_config
+import metrics
+import receiver_report
+import signalling_client
+import tracing
+import vad
+from echo_canceller import EchoCanceller
+from loss_concealment import PacketLossConcealer, SequenceTracker
+from ring_buffer import ByteRingBuffer, FrameRingBuffer
+from timeseries import TimeSeries
+from media_config import MediaConfig
 from urllib.parse import urlparse
 
-# Matplotlib for post-call graphs
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-
-# Audio Configuration
-CHUNK = 1024
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-RATE = 16000
-
 # Constants
 REGISTRY_URL_DEFAULT = "http://127.0.0.1:5001"
+# Per-call metrics history columns
+LATENCY_COLUMNS = ("elapsed_s", "latency_ms", "jitter_ms", "rtt_ms")
+THROUGHPUT_COLUMNS = ("elapsed_s", "tx_kib_s", "rx_kib_s")
+# Echo reference buffering, in frames (capacity / alignment bound)
+AEC_REFERENCE_FRAMES = 16
+AEC_REFERENCE_BACKLOG = 4
 
 
 def get_local_ip(registry_url=None):
@@ -55,6 +58,8 @@ def get_local_ip(registry_url=None):
 class UserManager:
     def __init__(self, registry_url):
         self.registry_url = registry_url.rstrip('/')
+        # Contact list, refreshed from the registry's change feed
+        self.contacts = signalling_client.UserList(self.registry_url, online_only=True)
         self.username = None
         self.public_key = None
         self.secret_key = None
@@ -87,7 +92,8 @@ class UserManager:
         except Exception as e:
             return False, str(e)
 
-    def initiate_call(self, callee_username):
+    def initiate_call(self, callee_username, ptime_ms=media_config.DEFAULT_PTIME_MS, fec_depth=0,
+                      rate=media_config.DEFAULT_RATE):
         try:
             uname = callee_username.strip().lower()
             resp = requests.get(f"{self.registry_url}/fetch/{uname}")
@@ -100,7 +106,8 @@ class UserManager:
                 "caller": self.username,
                 "callee": uname,
                 "caller_listen_port": self.listening_port,
-                "session_key_ciphertext": ciphertext.hex()
+                "session_key_ciphertext": ciphertext.hex(),
+                "media_offer": media_config.build_offer(ptime_ms, fec_depth=fec_depth, rate=rate, reports=True)
             }
             call_resp = requests.post(f"{self.registry_url}/call/initiate", json=payload)
             if call_resp.status_code != 200:
@@ -111,38 +118,42 @@ class UserManager:
         except Exception as e:
             return False, str(e), None
 
-    def accept_call(self, call_id, ciphertext_hex):
+    def accept_call(self, call_id, ciphertext_hex, media_offer=None):
         try:
             ciphertext = bytes.fromhex(ciphertext_hex)
             session_key = crypto_utils.kyber_decapsulate(ciphertext, self.secret_key)
-            payload = {"call_id": call_id}
+            answer = media_config.select_answer(media_offer, reports=True)
+            payload = {"call_id": call_id, "media_answer": answer}
             resp = requests.post(f"{self.registry_url}/call/accept", json=payload)
             if resp.status_code == 200:
                 data = resp.json()
-                # Return peer_ip, peer_port, session_key
-                return True, (data.get('caller_ip'), data.get('caller_port'), session_key)
+                # Return peer_ip, peer_port, session_key, negotiated media
+                return True, (data.get('caller_ip'), data.get('caller_port'), session_key, MediaConfig.from_answer(answer))
             else:
                 return False, None
         except Exception as e:
             print(f"Accept error: {e}")
             return False, None
 
-    def poll_pending_calls(self):
+    def wait_pending_calls(self, seen=()):
+        """New ringing calls (not in `seen`); long-polls the registry."""
         if not self.username: return []
-        try:
-            resp = requests.get(f"{self.registry_url}/call/pending/{self.username}", timeout=1)
-            if resp.status_code == 200:
-                return resp.json().get("pending_calls", [])
-        except: pass
-        return []
+        return signalling_client.wait_pending_calls(self.registry_url, self.username, seen)
 
-    def check_call_status(self, call_id):
+    def wait_call_status(self, call_id, known, wait=signalling_client.LONG_POLL_S):
+        """Call status record once it is no longer `known`; long-polls the registry."""
+        return signalling_client.wait_call_status(self.registry_url, call_id, known, wait)
+
+    def fetch_call_status(self, call_id):
         try:
             resp = requests.get(f"{self.registry_url}/call/status/{call_id}", timeout=1)
             if resp.status_code == 200:
-                return resp.json().get("status")
+                return resp.json()
         except: pass
-        return "unknown"
+        return {}
+
+    def check_call_status(self, call_id):
+        return self.fetch_call_status(call_id).get("status", "unknown")
 
     def unregister(self):
         if self.username:
@@ -150,64 +161,82 @@ class UserManager:
             except: pass
 
     def fetch_online_users(self):
-        try:
-            resp = requests.get(f"{self.registry_url}/list", timeout=1)
-            if resp.status_code == 200:
-                users = resp.json().get("users", {})
-                return [u for u in users.keys() if u != self.username]
-        except: pass
-        return []
+        return [u for u in self.contacts.refresh(timeout=1) if u != self.username]
 
 
 class AudioHandler:
-    def __init__(self):
-        self.p = pyaudio.PyAudio()
-        self.in_stream = None
-        self.out_stream = None
+    def __init__(self, device=None):
+        # Audio device (see audio_backend); PQC_AUDIO_DEVICE=null runs headless
+        self.device = device or os.getenv('PQC_AUDIO_DEVICE')
+        self.backend = None
         self.recording = False
-
-    def start_stream(self):
-        if self.in_stream: return
+        self.media = MediaConfig()
+        # Acoustic echo cancellation on the capture path; PQC_AEC=0 turns it off
+        self.aec_enabled = os.getenv('PQC_AEC', '1') != '0'
+        self.echo_canceller = None
+        self.echo_reference = None
+        self.tracer = tracing.NULL_TRACER
+
+    def start_stream(self, media=None):
+        if self.backend: return
+        self.media = media or MediaConfig()
         try:
-            # Separate input and output streams to prevent local hardware feedback
-            self.in_stream = self.p.open(format=FORMAT, channels=CHANNELS, rate=RATE,
-                                          input=True, output=False, frames_per_buffer=CHUNK)
-            self.out_stream = self.p.open(format=FORMAT, channels=CHANNELS, rate=RATE,
-                                          input=False, output=True, frames_per_buffer=CHUNK)
+            if self.aec_enabled:
+                self.echo_canceller = EchoCanceller(self.media.rate, self.media.frames_per_packet)
+                # Frames sent to the speaker, handed from the playback thread to the send thread
+                self.echo_reference = ByteRingBuffer(self.media.bytes_per_packet * AEC_REFERENCE_FRAMES)
+            self.backend = audio_backend.create_backend(self.device, self.media)
+            self.backend.start()
             self.recording = True
         except Exception as e:
             print(f"Audio Error: {e}")
+            self.backend = None
             raise
 
     def stop_stream(self):
         self.recording = False
-        if self.in_stream:
-            try:
-                self.in_stream.stop_stream()
-                self.in_stream.close()
+        if self.backend:
+            try: self.backend.stop()
             except: pass
-            self.in_stream = None
-        if self.out_stream:
-            try:
-                self.out_stream.stop_stream()
-                self.out_stream.close()
-            except: pass
-            self.out_stream = None
+            self.backend = None
+        if self.echo_canceller and self.echo_canceller.frames:
+            cpu = self.echo_canceller.cpu_report()
+            print(f"[AEC] {cpu['avg_ms']:.2f} ms avg / {cpu['max_ms']:.2f} ms max per {cpu['budget_ms']:.0f} ms frame "
+                  f"({cpu['load_percent']:.1f}% load), ERLE {self.echo_canceller.erle_db:.1f} dB")
+        self.echo_canceller = None
 
     def record_chunk(self):
-        if self.in_stream and self.recording:
-            try: return self.in_stream.read(CHUNK, exception_on_overflow=False)
-            except: pass
+        backend = self.backend
+        if backend and self.recording:
+            t = self.tracer.clock()
+            frame = backend.read_frame(timeout=4 * self.media.ptime_ms / 1000)
+            aec, ref = self.echo_canceller, self.echo_reference
+            if frame and aec:
+                n = self.media.bytes_per_packet
+                # Keep the reference no more than a few frames behind the mic
+                backlog = ref.available() - AEC_REFERENCE_BACKLOG * n
+                if backlog > 0:
+                    ref.read(backlog)
+                frame = aec.process(frame, ref.read(n))
+            if frame: self.tracer.lap("capture", t)
+            return frame
         return None
 
     def play_chunk(self, data):
-        if self.out_stream and self.recording:
-            try: self.out_stream.write(data)
-            except: pass
+        backend = self.backend
+        if backend and self.recording:
+            t = self.tracer.clock()
+            if self.echo_reference:
+                self.echo_reference.write(data)
+            backend.write_frame(data)
+            self.tracer.lap("playout", t)
+
+    def counters(self):
+        return self.backend.counters() if self.backend else {}
 
     def terminate(self):
         self.stop_stream()
-        self.p.terminate()
+        audio_backend.terminate()
 
 
 class NetworkHandler:
@@ -220,40 +249,73 @@ class NetworkHandler:
         self.session_key = None
         self.packet_counter_send = 0
         self.crypt = None
+        self.media = MediaConfig()
+        self.codec = self.media.create_codec()
+        self.dtx = None
+        self.comfort_noise = vad.ComfortNoiseGenerator(self.media.frames_per_packet)
+        self.sequence = SequenceTracker()
+        self.plc = PacketLossConcealer(self.media.rate, self.media.frames_per_packet)
+        self.concealed_frames = []
+        self.fec_encoder = None
+        self.fec_decoder = fec.create_decoder(self.media.rate, self.media.frames_per_packet)
+        self.tracer = tracing.NULL_TRACER
 
         # Metrics
         self.pkts_sent = 0
         self.pkts_recv = 0
         self.pkts_lost = 0
+        self.pkts_late = 0
+        self.auth_failures = 0
+        self.fec_recovered = 0
         self.bytes_sent = 0
         self.bytes_recv = 0
         self.obfuscation_enabled = True
 
+        # Latency/jitter/inter-arrival histograms; latency_ms and jitter_ms are the latest values
+        self.metrics = metrics.CallMetrics()
         self.latency_ms = 0.0
         self.jitter_ms = 0.0
-        self._prev_latency = 0.0
+        # Receiver reports: clock-independent RTT and the peer's view of our stream
+        self.reports = receiver_report.ReportSession()
 
-        self.latency_history = []
-        self.throughput_history = []
+        # Once-a-second history, bounded (downsampled on long calls)
+        self.latency_history = TimeSeries(LATENCY_COLUMNS)
+        self.throughput_history = TimeSeries(THROUGHPUT_COLUMNS)
         self._call_start_time = 0
         self._last_throughput_check = 0
         self._last_bytes_sent = 0
         self._last_bytes_recv = 0
 
+    def configure_media(self, media):
+        self.media = media
+        self.codec = media.create_codec()
+        self.dtx = vad.DtxController(media.ptime_ms) if media.dtx else None
+        self.comfort_noise = vad.ComfortNoiseGenerator(media.frames_per_packet)
+        self.plc = PacketLossConcealer(media.rate, media.frames_per_packet)
+        self.fec_encoder = fec.RedundancyEncoder(media.fec_depth, media.rate, media.frames_per_packet) if media.fec_depth else None
+        self.fec_decoder = fec.create_decoder(media.rate, media.frames_per_packet)
+
     def set_session_key(self, key):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
         self.session_key = key
         self.crypt = AESGCM(key)
         self.packet_counter_send = 0
         self.pkts_sent = 0
         self.pkts_recv = 0
         self.pkts_lost = 0
+        self.pkts_late = 0
+        self.auth_failures = 0
+        self.fec_recovered = 0
+        self.sequence = SequenceTracker()
+        self.concealed_frames = []
         self.bytes_sent = 0
         self.bytes_recv = 0
+        self.metrics = metrics.CallMetrics()
         self.latency_ms = 0.0
         self.jitter_ms = 0.0
-        self._prev_latency = 0.0
-        self.latency_history = []
-        self.throughput_history = []
+        self.reports = receiver_report.ReportSession()
+        self.latency_history.clear()
+        self.throughput_history.clear()
         self._call_start_time = time.time()
         self._last_throughput_check = time.time()
         self._last_bytes_sent = 0
@@ -272,7 +334,10 @@ class NetworkHandler:
         def listen():
             while self.running:
                 try:
-                    data, addr = self.sock.recvfrom(CHUNK * 4)
+                    tracer = self.tracer
+                    t = tracer.clock()
+                    data, addr = self.sock.recvfrom(self.media.max_datagram)
+                    tracer.lap("recvfrom", t)
                     on_receive_callback(data, addr[0])
                 except Exception as e:
                     if self.running: print(f"Error receiving: {e}")
@@ -282,65 +347,174 @@ class NetworkHandler:
     def send_data(self, audio_data):
         if self.target_ip and self.target_port and self.session_key:
             try:
-                idx = self.packet_counter_send
-                # XOR Obfuscation (Identity protection)
-                obfuscated = crypto_utils.obfuscate_audio(audio_data, self.session_key, idx)
-                nonce = os.urandom(12)
-                index_bytes = idx.to_bytes(4, 'big')
-                ts = struct.pack('!d', time.time())
-                # AES-GCM Encryption (Payload protection)
-                ciphertext = self.crypt.encrypt(nonce, ts + obfuscated, associated_data=index_bytes)
-                packet = nonce + index_bytes + ciphertext
-                self.sock.sendto(packet, (self.target_ip, int(self.target_port)))
-                self.packet_counter_send += 1
-                self.pkts_sent += 1
-                self.bytes_sent += len(packet)
+                if self.media.reports and self.reports.due():
+                    self._send_report()
+                t = self.tracer.clock()
+                # Discontinuous transmission: drop silence, send a noise descriptor now and then
+                if self.dtx:
+                    decision = self.dtx.process(audio_data)
+                    if decision == vad.SUPPRESS: return
+                    if decision == vad.SID:
+                        return self._send_packet(media_config.KIND_COMFORT_NOISE, self.dtx.sid_payload())
+                # Codec (compress before the crypto stages)
+                payload = self.codec.encode(audio_data)
+                kind = media_config.KIND_AUDIO
+                if self.fec_encoder:
+                    # Piggyback low-bitrate copies of the previous frames
+                    payload = self.fec_encoder.pack(self.packet_counter_send, audio_data, payload)
+                    kind = media_config.KIND_AUDIO_FEC
+                self.tracer.lap("encode", t)
+                self._send_packet(kind, payload)
             except: pass
 
+    def _send_report(self):
+        report = self.reports.build(self.sequence, self.jitter_ms)
+        self._send_packet(media_config.KIND_RECEIVER_REPORT, report.pack(), control=True)
+
+    def _send_packet(self, kind, payload, control=False):
+        try:
+            tracer = self.tracer
+            t = tracer.clock()
+            # Control packets have their own index space so they never look like audio loss
+            idx = self.reports.next_index() if control else self.packet_counter_send
+            # XOR Obfuscation (Identity protection)
+            obfuscated = crypto_utils.obfuscate_audio(payload, self.session_key, idx)
+            t = tracer.lap("obfuscate", t)
+            nonce = os.urandom(12)
+            index_bytes = idx.to_bytes(4, 'big')
+            # Timestamp, plus the packet kind if the call negotiated typed packets
+            if self.media.typed_packets:
+                header = struct.pack('!dB', time.time(), kind)
+            else:
+                header = struct.pack('!d', time.time())
+            # AES-GCM Encryption (Payload protection)
+            ciphertext = self.crypt.encrypt(nonce, header + obfuscated, associated_data=index_bytes)
+            packet = nonce + index_bytes + ciphertext
+            t = tracer.lap("encrypt", t)
+            self.sock.sendto(packet, (self.target_ip, int(self.target_port)))
+            tracer.lap("sendto", t)
+            self.bytes_sent += len(packet)
+            if control: return
+            self.packet_counter_send += 1
+            self.pkts_sent += 1
+        except: pass
+
     def process_incoming_packet(self, data):
         if not self.session_key: return None, None
         try:
-            if len(data) < 24: return None, None
+            typed = self.media.typed_packets
+            if len(data) < (25 if typed else 24): return None, None
             nonce, index_bytes, ciphertext = data[:12], data[12:16], data[16:]
             idx = int.from_bytes(index_bytes, 'big')
 
             # Decrypt
+            tracer = self.tracer
+            t = tracer.clock()
             plaintext = self.crypt.decrypt(nonce, ciphertext, associated_data=index_bytes)
-            send_ts = struct.unpack('!d', plaintext[:8])[0]
-            obfuscated = plaintext[8:]
-
-            # Latency Metrics
-            now = time.time()
-            new_latency = (now - send_ts) * 1000
-            if new_latency < 0: new_latency = 0
-            if new_latency > 5000: new_latency = self.latency_ms
-            self.jitter_ms = abs(new_latency - self._prev_latency) * 0.1 + self.jitter_ms * 0.9
-            self._prev_latency = self.latency_ms
-            self.latency_ms = new_latency * 0.3 + self.latency_ms * 0.7
+            tracer.lap("decrypt", t)
+            if typed:
+                send_ts, kind = struct.unpack('!dB', plaintext[:9])
+                obfuscated = plaintext[9:]
+            else:
+                send_ts, kind = struct.unpack('!d', plaintext[:8])[0], media_config.KIND_AUDIO
+                obfuscated = plaintext[8:]
+
+            if idx & receiver_report.CONTROL_INDEX_FLAG:
+                self.bytes_recv += len(data)
+                if kind == media_config.KIND_RECEIVER_REPORT:
+                    self.reports.on_report(crypto_utils.deobfuscate_audio(obfuscated, self.session_key, idx))
+                return None, None
+
+            # Latency Metrics (one-way, RFC 3550 jitter, inter-arrival)
+            self.metrics.on_packet(send_ts, time.time())
+            self.latency_ms = self.metrics.last_latency_ms
+            self.jitter_ms = self.metrics.jitter_ms
 
             self.pkts_recv += 1
             self.bytes_recv += len(data)
 
-            # De-obfuscate
-            clear_audio = crypto_utils.deobfuscate_audio(obfuscated, self.session_key, idx)
-            return clear_audio, obfuscated
+            # Sequence accounting: a jump in the index is loss, an index behind it is late
+            gap = self.sequence.arrival(idx)
+            self.pkts_lost = self.sequence.lost
+            self.pkts_late = self.sequence.late
+            self.concealed_frames = []
+            if gap < 0: return None, None
+
+            if kind == media_config.KIND_COMFORT_NOISE:
+                # Peer went silent: playout fills the gap with generated noise
+                self.comfort_noise.update(crypto_utils.deobfuscate_audio(obfuscated, self.session_key, idx))
+                return None, None
+            self.comfort_noise.reset()
+
+            # De-obfuscate and decode
+            t = tracer.clock()
+            payload = crypto_utils.deobfuscate_audio(obfuscated, self.session_key, idx)
+            t = tracer.lap("deobfuscate", t)
+            redundant = {}
+            if kind == media_config.KIND_AUDIO_FEC:
+                redundant, payload = fec.unpack(payload)
+            clear_audio = self.codec.decode(payload)
+            # Rebuild (from FEC) or synthesize (PLC) the frames missing before this one
+            if gap: self.concealed_frames = self._fill_gap(gap, redundant)
+            clear_audio = self.plc.good_frame(clear_audio)
+            tracer.lap("decode", t)
+            # Scrambled audio is only rendered when the de-obfuscation toggle is off
+            scrambled = None if self.obfuscation_enabled else self.codec.decode_scrambled(obfuscated)
+            return clear_audio, scrambled
         except:
-            self.pkts_lost += 1
+            self.auth_failures += 1
             return None, None
 
+    def _fill_gap(self, gap, redundant):
+        frames = []
+        run = 0
+        for distance in range(gap, 0, -1):
+            block = redundant.get(distance)
+            if block is None:
+                run += 1
+                continue
+            if run:
+                frames += self.plc.conceal(run)
+                run = 0
+            frames.append(self.plc.good_frame(self.fec_decoder.decode(block)))
+            self.fec_recovered += 1
+        if run: frames += self.plc.conceal(run)
+        return frames
+
     def record_metrics_snapshot(self):
         now = time.time()
         elapsed = now - self._call_start_time
-        self.latency_history.append((elapsed, self.latency_ms))
+        self.latency_history.append(elapsed, self.latency_ms, self.jitter_ms, self.reports.rtt_ms)
         dt = now - self._last_throughput_check
         if dt > 0:
             tx_rate = (self.bytes_sent - self._last_bytes_sent) / dt / 1024.0
             rx_rate = (self.bytes_recv - self._last_bytes_recv) / dt / 1024.0
-            self.throughput_history.append((elapsed, tx_rate, rx_rate))
+            self.throughput_history.append(elapsed, tx_rate, rx_rate)
         self._last_throughput_check = now
         self._last_bytes_sent = self.bytes_sent
         self._last_bytes_recv = self.bytes_recv
 
+    def metrics_snapshot(self):
+        seq = self.sequence
+        counters = {
+            "packets_sent": self.pkts_sent,
+            "packets_received": self.pkts_recv,
+            "packets_lost": seq.lost,
+            "packets_reordered": seq.late,
+            "packets_duplicate": seq.duplicates,
+            "auth_failures": self.auth_failures,
+            "fec_recovered": self.fec_recovered,
+            "frames_concealed": self.plc.frames_concealed,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_recv,
+            "reports_sent": self.reports.sent,
+            "reports_received": self.reports.received,
+        }
+        gauges = {"loss_percent": seq.loss_percent, "jitter_ms": self.jitter_ms, "latency_ms": self.latency_ms,
+                  "rtt_ms": self.reports.smoothed_rtt_ms, "remote_loss_percent": self.reports.remote_loss_percent,
+                  "remote_jitter_ms": self.reports.remote_jitter_ms}
+        return metrics.snapshot({**self.metrics.histograms(), **self.reports.histograms()}, counters, gauges)
+
     def stop(self):
         self.running = False
         try: self.sock.close()
@@ -366,8 +540,22 @@ class VoiceChatApp:
         self.peer_username = ""
         self.my_ip = get_local_ip()
         self.peer_ip = ""
-        self.audio_queue = queue.Queue()
+        self.ptime_ms = media_config.DEFAULT_PTIME_MS
+        self.fec_depth = 1
+        self.media = MediaConfig()
+        self.playout_buffer = self._new_playout_buffer()
         self.playback_thread_running = False
+        self.call_id = None
+        self.tracer = tracing.NULL_TRACER
+
+        # Metrics export: PQC_METRICS_PORT serves /metrics (Prometheus) and
+        # /metrics.json live; PQC_METRICS_DIR gets a JSON summary plus the
+        # latency/throughput history (PQC_HISTORY_FORMAT=csv or npz) per call
+        self.metrics_dir = os.getenv('PQC_METRICS_DIR')
+        self.metrics_server = None
+        if os.getenv('PQC_METRICS_PORT'):
+            try: self.metrics_server = metrics.serve(int(os.getenv('PQC_METRICS_PORT')), self.metrics_snapshot)
+            except Exception as e: print(f"Metrics server failed: {e}")
 
         self.setup_login_ui()
 
@@ -426,11 +614,14 @@ class VoiceChatApp:
         tk.Entry(self.idle_frame, textvariable=self.target_user_var, font=("Arial", 14), justify="center").pack(pady=5, fill="x")
         self.call_btn = tk.Button(self.idle_frame, text="START PQC-BASED CALL", command=self.initiate_call, bg="#28a745", fg="white", font=("Arial", 11, "bold"), pady=8)
         self.call_btn.pack(pady=10, fill="x")
+        self.narrowband_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.idle_frame, text="Narrowband 8 kHz (poor connections)", variable=self.narrowband_var, bg="#f0f2f5").pack()
 
         tk.Label(self.idle_frame, text="ONLINE CONTACTS", bg="#f0f2f5", font=("Arial", 9, "bold")).pack(pady=(10,0))
         lf = tk.Frame(self.idle_frame, bg="white", bd=1, relief="solid")
         lf.pack(fill="both", expand=True, pady=5)
         self.users_listbox = tk.Listbox(lf, font=("Arial", 11), bd=0)
+        self.shown_users = None
         self.users_listbox.pack(side="left", fill="both", expand=True)
         sb = tk.Scrollbar(lf, command=self.users_listbox.yview)
         sb.pack(side="right", fill="y")
@@ -471,15 +662,35 @@ class VoiceChatApp:
     def start_polling(self):
         self.poll_active = True
         self.root.after(2000, self.poll_loop)
+        um = self.user_manager
+        threading.Thread(target=self._watch_incoming_calls, args=(um,), daemon=True).start()
+        # Stay online in the registry while logged in (also during calls)
+        threading.Thread(target=signalling_client.send_heartbeats,
+                         args=(um.registry_url, um.username, lambda: self.poll_active and self.user_manager is um),
+                         daemon=True).start()
+
+    def _watch_incoming_calls(self, um):
+        # Pushed by the registry (long-poll) as soon as a call rings; each call is shown once.
+        # Bound to the login that started it, so a re-login doesn't leave two watchers running
+        seen = set()
+        while self.poll_active and self.user_manager is um:
+            if self.is_call_active:
+                time.sleep(1)
+                continue
+            calls = um.wait_pending_calls(seen)
+            if calls and self.poll_active and self.user_manager is um and not self.is_call_active:
+                seen.update(c['call_id'] for c in calls)
+                self.root.after(0, lambda call=calls[0]: self.show_incoming_call(call))
 
     def poll_loop(self):
         if not self.poll_active: return
         if not self.is_call_active:
-            calls = self.user_manager.poll_pending_calls()
-            if calls: self.show_incoming_call(calls[0])
             users = self.user_manager.fetch_online_users()
-            self.users_listbox.delete(0, tk.END)
-            for u in users: self.users_listbox.insert(tk.END, f"  {u}")
+            # Redrawing resets the selection, so only when the list changed
+            if users != self.shown_users:
+                self.shown_users = users
+                self.users_listbox.delete(0, tk.END)
+                for u in users: self.users_listbox.insert(tk.END, f"  {u}")
         self.root.after(2000, self.poll_loop)
 
     def show_incoming_call(self, call):
@@ -498,7 +709,8 @@ class VoiceChatApp:
         threading.Thread(target=self._dial_thread, args=(target,), daemon=True).start()
 
     def _dial_thread(self, target):
-        success, cid, details = self.user_manager.initiate_call(target)
+        rate = media_config.NARROWBAND_RATE if self.narrowband_var.get() else media_config.DEFAULT_RATE
+        success, cid, details = self.user_manager.initiate_call(target, self.ptime_ms, self.fec_depth, rate)
         if success:
             self.peer_username = target
             self.peer_ip = details[0]
@@ -507,35 +719,47 @@ class VoiceChatApp:
             self.root.after(0, self.reset_ui)
 
     def _wait_for_answer(self, cid, ip, port, key):
-        for _ in range(30):
-            if self.user_manager.check_call_status(cid) == 'active':
-                self.root.after(0, lambda: self.start_session(ip, port, key, cid, self.peer_username))
+        deadline = time.time() + 30
+        status = 'ringing'
+        while time.time() < deadline:
+            info = self.user_manager.wait_call_status(cid, status, min(signalling_client.LONG_POLL_S, deadline - time.time()))
+            status = info.get('status', status)
+            if status == 'active':
+                media = MediaConfig.from_answer(info.get('media_answer'))
+                self.root.after(0, lambda: self.start_session(ip, port, key, cid, self.peer_username, media))
                 return
-            time.sleep(1)
+            if status in ('rejected', 'ended'): break
         self.root.after(0, self.reset_ui)
 
     def accept_call(self, call):
         self.incoming_frame.pack_forget()
         self.peer_username = call['caller']
-        success, details = self.user_manager.accept_call(call['call_id'], call['session_key_ciphertext'])
+        success, details = self.user_manager.accept_call(call['call_id'], call['session_key_ciphertext'], call.get('media_offer'))
         if success:
             self.peer_ip = details[0]
-            self.start_session(details[0], details[1], details[2], call['call_id'], self.peer_username)
+            self.start_session(details[0], details[1], details[2], call['call_id'], self.peer_username, details[3])
 
-    def start_session(self, ip, port, key, cid, peer):
+    def start_session(self, ip, port, key, cid, peer, media=None):
         self.is_call_active = True
+        self.call_id = cid
+        # Per-stage timing for this call (PQC_TRACE=1), shared by the pipeline threads
+        self.tracer = tracing.create()
+        self.network.tracer = self.audio.tracer = self.tracer
+        self.media = media or MediaConfig()
         self.network.target_ip, self.network.target_port = ip, port
+        self.network.configure_media(self.media)
         self.network.set_session_key(key)
-        self.audio.start_stream()
+        self.audio.start_stream(self.media)
         self.start_time = time.time()
 
         self.idle_frame.pack_forget()
         self.call_active_frame.pack(fill="both", expand=True, pady=10)
         self.peer_name_lbl.config(text=peer.upper())
+        self.kem_lbl.config(text=f"KEM: Kyber-512 | {self.media.codec.upper()} {self.media.rate // 1000} kHz {self.media.ptime_ms} ms")
         self.update_timer()
 
         self.playback_thread_running = True
-        while not self.audio_queue.empty(): self.audio_queue.get_nowait()
+        self.playout_buffer = self._new_playout_buffer()
         threading.Thread(target=self.playback_loop, daemon=True).start()
         threading.Thread(target=self.send_loop, daemon=True).start()
 
@@ -544,21 +768,46 @@ class VoiceChatApp:
         elapsed = int(time.time() - self.start_time)
         self.timer_lbl.config(text=f"{elapsed//60:02d}:{elapsed%60:02d}")
         self.network.record_metrics_snapshot()
-        self.tx_lbl.config(text=f"TX: {self.network.pkts_sent} pkts")
-        self.rx_lbl.config(text=f"RX: {self.network.pkts_recv} pkts")
-        self.latency_lbl.config(text=f"LATENCY: {self.network.latency_ms:.1f} ms")
-        self.loss_lbl.config(text=f"PKT LOSS: {self.network.pkts_lost}")
+        dtx = self.network.dtx
+        self.tx_lbl.config(text=f"TX: {self.network.pkts_sent} pkts" + (f" ({dtx.frames_suppressed} DTX)" if dtx else ""))
+        underruns = self.audio.counters().get("playout_underruns", 0)
+        self.rx_lbl.config(text=f"RX: {self.network.pkts_recv} pkts  UNDERRUNS: {underruns}")
+        lat = self.network.metrics.latency
+        self.latency_lbl.config(text=f"LATENCY p50/95/99: {lat.percentile(0.5):.0f}/{lat.percentile(0.95):.0f}/{lat.percentile(0.99):.0f} ms  JITTER: {self.network.jitter_ms:.1f} ms"
+                                + (f"  RTT: {self.network.reports.smoothed_rtt_ms:.0f} ms" if self.network.reports.rtt.count else ""))
+        self.loss_lbl.config(text=f"PKT LOSS: {self.network.pkts_lost} ({self.network.sequence.loss_percent:.1f}%)  FEC: {self.network.fec_recovered}  LATE: {self.network.pkts_late}"
+                             + (f"  PEER LOSS: {self.network.reports.remote_loss_percent:.1f}%" if self.network.reports.remote else ""))
         self.root.after(1000, self.update_timer)
 
+    def _new_playout_buffer(self):
+        # Preallocated frame ring; anything beyond the jitter depth is stale and skipped
+        depth = self.media.jitter_depth
+        return FrameRingBuffer(self.media.bytes_per_packet, 2 * depth, max_backlog=depth)
+
     def playback_loop(self):
+        ring = self.playout_buffer
         while self.playback_thread_running:
-            try: self.audio.play_chunk(self.audio_queue.get(timeout=0.1))
-            except: pass
+            frame = ring.peek(timeout=self.media.ptime_ms / 1000)
+            if frame is not None:
+                self.tracer.lap("queue", ring.stamp())
+                try: self.audio.play_chunk(frame)
+                except: pass
+                ring.consume()
+                continue
+            # Peer is in DTX silence: fill the gap with comfort noise
+            noise = self.network.comfort_noise.generate()
+            if noise:
+                try: self.audio.play_chunk(noise)
+                except: pass
 
     def send_loop(self):
         while self.is_call_active:
-            d = self.audio.record_chunk()
-            if d: self.network.send_data(d)
+            # One bad frame must not end the loop (and leave the call one-way)
+            try:
+                d = self.audio.record_chunk()
+                if d: self.network.send_data(d)
+            except Exception as e:
+                print(f"[Audio] Dropped a capture frame: {e}")
 
     def on_packet_received(self, data, sender_ip):
         # Strict Echo/Security Filter
@@ -567,12 +816,36 @@ class VoiceChatApp:
 
         clear, obf = self.network.process_incoming_packet(data)
         if clear:
-            aud = clear if self.network.obfuscation_enabled else obf
-            if self.audio_queue.qsize() > 5: self.audio_queue.get_nowait()
-            self.audio_queue.put(aud)
+            # Concealment is synthesized from clear audio, so skip it in scrambled mode
+            frames = self.network.concealed_frames if self.network.obfuscation_enabled else []
+            frames = frames + [clear if self.network.obfuscation_enabled else obf]
+            stamp = self.tracer.clock()
+            for aud in frames:
+                self.playout_buffer.write(aud, stamp)
+
+    def metrics_snapshot(self):
+        snap = self.network.metrics_snapshot()
+        snap["counters"].update(self.audio.counters())
+        snap["histograms"].update({k: h.summary() for k, h in self.tracer.histograms().items()})
+        return snap
 
     def hangup(self):
-        params = (self.peer_username, time.time()-self.start_time, list(self.network.latency_history), list(self.network.throughput_history), self.network.pkts_sent, self.network.pkts_recv, self.network.pkts_lost, self.network.bytes_sent, self.network.bytes_recv)
+        if self.tracer.enabled:
+            print(f"[Trace] Per-stage latency (ms), call {self.call_id}:\n{self.tracer.report()}")
+        if self.metrics_dir:
+            try:
+                os.makedirs(self.metrics_dir, exist_ok=True)
+                base = os.path.join(self.metrics_dir, f"call-{self.call_id}")
+                with open(f"{base}-metrics.json", "w") as f:
+                    f.write(metrics.to_json(self.metrics_snapshot()))
+                ext = os.getenv('PQC_HISTORY_FORMAT', 'csv')
+                self.network.latency_history.dump(f"{base}-latency.{ext}")
+                self.network.throughput_history.dump(f"{base}-throughput.{ext}")
+                if self.tracer.enabled:
+                    self.tracer.dump(f"{base}-trace.json")
+            except Exception as e:
+                print(f"Metrics export failed: {e}")
+        params = (self.peer_username, time.time()-self.start_time, self.network.latency_history.array(), self.network.throughput_history.array(), self.network.pkts_sent, self.network.pkts_recv, self.network.pkts_lost, self.network.bytes_sent, self.network.bytes_recv)
         self.is_call_active = False
         self.playback_thread_running = False
         self.audio.stop_stream()
@@ -580,11 +853,17 @@ class VoiceChatApp:
         self.root.after(300, lambda: self.show_post_call_graph(*params))
 
     def show_post_call_graph(self, peer, dur, lath, tph, ps, pr, pl, bs, br):
+        # Matplotlib is only needed here, so it isn't loaded until the first hangup
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
         win = tk.Toplevel(self.root)
         win.title("Call Stats")
         fig = Figure(figsize=(6, 4), dpi=100)
         ax = fig.add_subplot(2, 1, 1)
-        if lath: ax.plot([x[0] for x in lath], [x[1] for x in lath], color='blue')
+        if len(lath):
+            ax.plot(lath[:, 0], lath[:, 1], color='blue', label='one-way')
+            if lath[:, 3].any(): ax.plot(lath[:, 0], lath[:, 3], color='orange', label='RTT')
+            ax.legend(loc='upper right', fontsize='small')
         ax.set_title("Latency (ms)")
         ax2 = fig.add_subplot(2, 1, 2)
         ax2.bar(['Sent', 'Recv', 'Lost'], [ps, pr, pl], color=['blue', 'green', 'red'])
@@ -613,4 +892,9 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = VoiceChatApp(root)
     root.protocol("WM_DELETE_WINDOW", app.on_close)
+    probe = os.getenv('PQC_STARTUP_PROBE')
+    if probe:
+        # Startup benchmark: record time-to-first-window and memory, then exit
+        import startup_probe
+        root.after(0, lambda: startup_probe.report(root, probe))
     root.mainloop()
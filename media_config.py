@@ -0,0 +1,191 @@
+"""
+Call media parameters and offer/answer negotiation.
+
+The caller attaches a media offer to /call/initiate, the callee picks the
+parameters it supports and returns an answer with /call/accept, and the caller
+reads that answer back from /call/status. Both ends then build the same
+MediaConfig and size capture, packets and the playout queue from it.
+"""
+
+import math
+
+import audio_codec
+import fec
+
+# Packetization intervals we can capture/send at (ms of audio per packet)
+SUPPORTED_PTIMES_MS = (10, 20, 40, 60)
+DEFAULT_PTIME_MS = 20
+
+# Call sample rates we can run at, wideband first; 8 kHz is the narrowband mode
+# for poor links (half the bandwidth and CPU of 16 kHz)
+SUPPORTED_RATES = (16000, 8000, 48000)
+DEFAULT_RATE = 16000
+NARROWBAND_RATE = 8000
+# Codec assumed when the peer doesn't negotiate
+LEGACY_CODEC = "pcm"
+SAMPLE_WIDTH = 2  # 16-bit PCM
+CHANNELS = 1
+
+# Target playout queue depth, in ms of audio
+JITTER_BUFFER_MS = 120
+
+# Packet kinds, carried in the first encrypted byte after the timestamp. Only
+# calls that negotiated DTX, FEC or receiver reports use that byte; otherwise
+# packets keep the original layout (timestamp + audio) that peers without
+# negotiation send and expect, and every packet is KIND_AUDIO.
+KIND_AUDIO = 0
+KIND_COMFORT_NOISE = 1
+KIND_AUDIO_FEC = 2
+KIND_RECEIVER_REPORT = 3  # control packet, see receiver_report.py
+
+# nonce(12) + index(4) + AES-GCM tag(16) + send timestamp(8) + kind(1)
+PACKET_OVERHEAD = 12 + 4 + 16 + 8 + 1
+# IPv4 + UDP headers, used for on-the-wire bandwidth estimates
+IP_UDP_OVERHEAD = 20 + 8
+# Receive buffer floor so peers that don't negotiate (64 ms packets) still fit
+MIN_RECV_BUFFER = 4096
+
+
+class MediaConfig:
+    """Negotiated media parameters for one call."""
+
+    def __init__(self, ptime_ms=DEFAULT_PTIME_MS, rate=DEFAULT_RATE, codec=LEGACY_CODEC, dtx=False, fec_depth=0,
+                 reports=False):
+        if ptime_ms not in SUPPORTED_PTIMES_MS:
+            raise ValueError(f"Unsupported packetization time: {ptime_ms} ms")
+        if rate not in SUPPORTED_RATES:
+            raise ValueError(f"Unsupported sample rate: {rate} Hz")
+        if codec not in audio_codec.CODECS:
+            raise ValueError(f"Unsupported codec: {codec}")
+        self.ptime_ms = ptime_ms
+        self.rate = rate
+        self.codec = codec
+        self.dtx = dtx
+        self.fec_depth = max(0, min(fec.MAX_DEPTH, fec_depth))
+        self.reports = reports
+
+    @property
+    def typed_packets(self):
+        """Whether packets carry a kind byte after the timestamp (see KIND_*)."""
+        return bool(self.dtx or self.fec_depth or self.reports)
+
+    @property
+    def frames_per_packet(self):
+        """Audio frames captured and sent per packet."""
+        return self.rate * self.ptime_ms // 1000
+
+    @property
+    def bytes_per_packet(self):
+        """Size of one packet's PCM payload in bytes."""
+        return self.frames_per_packet * SAMPLE_WIDTH * CHANNELS
+
+    @property
+    def payload_bytes(self):
+        """Approximate encoded payload size per packet for the negotiated codec."""
+        return audio_codec.CODECS[self.codec].encoded_size(self.frames_per_packet, self.rate)
+
+    @property
+    def fec_bytes(self):
+        """Redundant audio added to each packet by FEC."""
+        if not self.fec_depth:
+            return 0
+        red = audio_codec.CODECS[fec.REDUNDANT_CODEC].encoded_size(self.frames_per_packet, self.rate)
+        return 1 + self.fec_depth * (3 + red)
+
+    def create_codec(self):
+        return audio_codec.create_codec(self.codec, self.rate, self.frames_per_packet)
+
+    @property
+    def max_datagram(self):
+        """Receive buffer size for one datagram from the peer."""
+        return max(MIN_RECV_BUFFER, (self.bytes_per_packet + PACKET_OVERHEAD) * 2)
+
+    @property
+    def jitter_depth(self):
+        """Playout queue depth in packets for JITTER_BUFFER_MS of audio."""
+        return max(2, math.ceil(JITTER_BUFFER_MS / self.ptime_ms))
+
+    @property
+    def packets_per_second(self):
+        return 1000 / self.ptime_ms
+
+    def wire_kbps(self):
+        """Estimated on-the-wire bitrate per direction in kbit/s."""
+        size = self.payload_bytes + self.fec_bytes + PACKET_OVERHEAD + IP_UDP_OVERHEAD
+        return size * 8 * self.packets_per_second / 1000
+
+    def to_answer(self):
+        return {"ptime_ms": self.ptime_ms, "rate": self.rate, "codec": self.codec,
+                "dtx": self.dtx, "fec": self.fec_depth, "reports": self.reports}
+
+    @classmethod
+    def from_answer(cls, answer):
+        """Build a config from a media answer; None means the peer did not negotiate."""
+        if not answer:
+            return cls()
+        try:
+            return cls(ptime_ms=int(answer.get("ptime_ms", DEFAULT_PTIME_MS)),
+                       rate=int(answer.get("rate", DEFAULT_RATE)),
+                       codec=answer.get("codec", LEGACY_CODEC),
+                       dtx=bool(answer.get("dtx", False)),
+                       fec_depth=int(answer.get("fec", 0)),
+                       reports=bool(answer.get("reports", False)))
+        except (TypeError, ValueError):
+            return cls()
+
+    def __repr__(self):
+        return (f"MediaConfig(ptime_ms={self.ptime_ms}, rate={self.rate}, "
+                f"codec={self.codec!r}, dtx={self.dtx}, fec_depth={self.fec_depth}, "
+                f"reports={self.reports})")
+
+
+def build_offer(ptime_ms=DEFAULT_PTIME_MS, codecs=None, dtx=True, fec_depth=0, rate=DEFAULT_RATE,
+                reports=False):
+    """
+    Build the caller's media offer.
+
+    Packetization times, sample rates and codecs are listed in order of
+    preference, starting with the requested ptime and rate and the best
+    available codec.
+    `dtx` says whether silence suppression with comfort noise is wanted and
+    `fec_depth` how many previous frames each packet should repeat (0 = off)
+    and `reports` whether this client sends and understands receiver reports.
+    """
+    ptimes = [ptime_ms] + [p for p in SUPPORTED_PTIMES_MS if p != ptime_ms]
+    rates = [rate] + [r for r in SUPPORTED_RATES if r != rate]
+    return {"ptime_ms": ptimes, "rate": rates,
+            "codec": list(codecs or audio_codec.available_codecs()), "dtx": dtx,
+            "fec": fec_depth, "reports": reports}
+
+
+def select_answer(offer, supported_ptimes=SUPPORTED_PTIMES_MS, supported_codecs=None, dtx=True,
+                  fec_depth=fec.MAX_DEPTH, supported_rates=SUPPORTED_RATES, reports=False):
+    """
+    Pick the callee's media parameters from an offer.
+
+    Returns an answer dict (see MediaConfig.to_answer). Offers from clients
+    that don't negotiate fall back to the defaults.
+    """
+    if not offer:
+        return MediaConfig().to_answer()
+    ptime = DEFAULT_PTIME_MS
+    for p in offer.get("ptime_ms", []):
+        if p in supported_ptimes:
+            ptime = p
+            break
+    rate = DEFAULT_RATE
+    for r in offer.get("rate", []):
+        if r in supported_rates:
+            rate = r
+            break
+    supported_codecs = supported_codecs or audio_codec.available_codecs()
+    codec = LEGACY_CODEC
+    for c in offer.get("codec", []):
+        if c in supported_codecs:
+            codec = c
+            break
+    dtx = dtx and bool(offer.get("dtx", False))
+    fec_depth = min(fec_depth, int(offer.get("fec", 0) or 0))
+    reports = reports and bool(offer.get("reports", False))
+    return MediaConfig(ptime_ms=ptime, rate=rate, codec=codec, dtx=dtx, fec_depth=fec_depth,
+                       reports=reports).to_answer()
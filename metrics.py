@@ -0,0 +1,191 @@
+"""
+Call quality metrics: fixed-memory histograms, counters and exporters.
+
+Histogram is HDR-style: values are bucketed on a log scale with linear
+sub-buckets, so every recorded value is kept to ~1% precision from 1 us up to
+a minute in a couple of thousand integer counters, however long the call runs.
+That gives real p50/p95/p99 figures instead of a smoothed average.
+
+CallMetrics feeds three of them from the receive path: one-way latency,
+RFC 3550 interarrival jitter and the gap between packet arrivals. A snapshot
+(histograms + counters + gauges) can be rendered as JSON or as Prometheus
+text, and serve() exposes both over HTTP while a call is running.
+"""
+
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Quantiles reported by exports
+QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+class Histogram:
+    """
+    Fixed-size log-linear histogram of non-negative values.
+
+    Values are recorded as integers of 1/`scale` units (scale=1000 with ms
+    values = microsecond resolution), with `digits` significant decimal
+    digits kept across the whole range up to `highest`.
+    """
+
+    def __init__(self, highest=60000.0, scale=1000, digits=2):
+        self.scale = scale
+        self.highest = int(highest * scale)
+        self.sub_bits = math.ceil(math.log2(2 * 10 ** digits))
+        self.sub_count = 1 << self.sub_bits
+        self.half = self.sub_count >> 1
+        max_shift = max(0, self.highest.bit_length() - self.sub_bits)
+        self.counts = [0] * (self.sub_count + max_shift * self.half)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.saturated = 0  # values above `highest`, recorded as `highest`
+
+    def _index(self, v):
+        if v < self.sub_count:
+            return v
+        shift = v.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half + (v >> shift) - self.half
+
+    def _value_at(self, idx):
+        """Midpoint of the value range covered by bucket `idx`."""
+        if idx < self.sub_count:
+            return idx
+        shift, offset = divmod(idx - self.sub_count, self.half)
+        shift += 1
+        return ((self.half + offset) << shift) + ((1 << shift) >> 1)
+
+    def record(self, value):
+        v = int(value * self.scale + 0.5)
+        if v < 0:
+            v = 0
+        elif v > self.highest:
+            v = self.highest
+            self.saturated += 1
+        self.counts[self._index(v)] += 1
+        self.count += 1
+        self.total += v
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+    def percentile(self, q):
+        """Value at quantile q (0..1), in recorded units; 0.0 if empty."""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= target:
+                    return min(max(self._value_at(idx), self.min), self.max) / self.scale
+        return self.max / self.scale
+
+    @property
+    def mean(self):
+        return self.total / self.count / self.scale if self.count else 0.0
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = self.total = self.saturated = 0
+        self.min = self.max = None
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": (self.min or 0) / self.scale,
+            "max": (self.max or 0) / self.scale,
+            **{f"p{q * 100:g}": self.percentile(q) for q in QUANTILES},
+        }
+
+
+class CallMetrics:
+    """Receive-side timing for one call (all values in ms)."""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.jitter = Histogram()
+        self.interarrival = Histogram()
+        self.jitter_ms = 0.0
+        self.last_latency_ms = 0.0
+        self._prev_transit = None
+        self._prev_arrival = None
+
+    def on_packet(self, send_ts, arrival):
+        """Account one authenticated packet sent at `send_ts` (peer clock) and received at `arrival`."""
+        transit = (arrival - send_ts) * 1000
+        self.last_latency_ms = max(0.0, transit)
+        self.latency.record(self.last_latency_ms)
+        if self._prev_transit is not None:
+            # RFC 3550 6.4.1: J += (|D(i-1,i)| - J) / 16; clock offset cancels in D
+            d = abs(transit - self._prev_transit)
+            self.jitter_ms += (d - self.jitter_ms) / 16
+            self.jitter.record(self.jitter_ms)
+        if self._prev_arrival is not None:
+            self.interarrival.record((arrival - self._prev_arrival) * 1000)
+        self._prev_transit = transit
+        self._prev_arrival = arrival
+
+    def histograms(self):
+        return {"latency_ms": self.latency, "jitter_ms": self.jitter, "interarrival_ms": self.interarrival}
+
+
+def snapshot(histograms, counters, gauges=None):
+    """Bundle metrics for export: {name: Histogram}, {name: int}, {name: float}."""
+    return {"histograms": {k: h.summary() for k, h in histograms.items()},
+            "counters": dict(counters), "gauges": dict(gauges or {})}
+
+
+def to_json(snap):
+    return json.dumps(snap, indent=2, sort_keys=True)
+
+
+def to_prometheus(snap, prefix="pqc_voice"):
+    """Prometheus text exposition; histograms become summaries with quantile labels."""
+    lines = []
+    for name, value in sorted(snap["counters"].items()):
+        lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+    for name, value in sorted(snap["gauges"].items()):
+        lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+    for name, h in sorted(snap["histograms"].items()):
+        metric = f"{prefix}_{name}"
+        lines.append(f"# TYPE {metric} summary")
+        for q in QUANTILES:
+            lines.append(f'{metric}{{quantile="{q}"}} {h[f"p{q * 100:g}"]}')
+        lines += [f"{metric}_sum {h['mean'] * h['count']}", f"{metric}_count {h['count']}"]
+    return "\n".join(lines) + "\n"
+
+
+def serve(port, get_snapshot, host="127.0.0.1"):
+    """
+    Expose get_snapshot() over HTTP in a daemon thread: /metrics (Prometheus
+    text) and /metrics.json. Returns the server (call shutdown() to stop).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, ctype = to_prometheus(get_snapshot()), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, ctype = to_json(get_snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
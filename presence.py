@@ -0,0 +1,125 @@
+"""
+Presence for key_registry_server.py: who is online right now.
+
+A registration stays in the registry until the user unregisters, so a client
+that crashed (or lost its network) kept showing up as a contact and callers
+rang it for the full ringing timeout. Clients now send a small heartbeat
+every HEARTBEAT_INTERVAL seconds; a user is online from their registration
+or heartbeat until PRESENCE_TTL seconds pass without one.
+
+Presence lives only in memory. A heartbeat touches two dicts and a timer
+wheel slot; it never writes the registry store, and listeners (the /list
+index) hear only about transitions between online and offline, not about
+every heartbeat. After a restart everyone is offline until their next
+heartbeat, at most one interval later.
+
+Expiry is a timer wheel: one slot per tick (TICK seconds) around a circle
+longer than the TTL. A heartbeat moves the user into the slot their new
+deadline falls in, O(1); every tick empties the slot whose time has come,
+so expiring costs O(users due) whatever the number online.
+"""
+
+import math
+import threading
+import time
+
+# Clients heartbeat this often; a user is offline after PRESENCE_TTL seconds without one
+HEARTBEAT_INTERVAL = 10
+PRESENCE_TTL = 30
+# Timer wheel resolution (seconds)
+TICK = 1.0
+
+
+class Presence:
+    def __init__(self, ttl=PRESENCE_TTL, tick=TICK, clock=time.monotonic, wall_clock=time.time):
+        self.ttl = ttl
+        self.tick = tick
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._lock = threading.Lock()
+        self._ttl_ticks = max(1, math.ceil(ttl / tick))
+        self._wheel = [set() for _ in range(self._ttl_ticks + 2)]
+        self._now_tick = self._tick_of(clock())  # last tick processed
+        self._due = {}        # username -> tick they expire at (online users only)
+        self._last_seen = {}  # username -> wall-clock time of the last heartbeat
+        self._listeners = []
+        self.heartbeats = 0
+        self.expired = 0
+
+    def _tick_of(self, now):
+        return int(now // self.tick)
+
+    def add_listener(self, callback):
+        """callback(username, online, last_seen) on every online/offline transition (lock held)."""
+        self._listeners.append(callback)
+
+    def _changed(self, username, online):
+        for callback in self._listeners:
+            callback(username, online, self._last_seen.get(username))
+
+    def beat(self, username):
+        """Record a heartbeat; returns True if the user just came online."""
+        with self._lock:
+            self.heartbeats += 1
+            self._last_seen[username] = self.wall_clock()
+            due = max(self._tick_of(self.clock()), self._now_tick) + self._ttl_ticks
+            old = self._due.get(username)
+            if old is not None:
+                self._wheel[old % len(self._wheel)].discard(username)
+            self._due[username] = due
+            self._wheel[due % len(self._wheel)].add(username)
+            if old is None:
+                self._changed(username, True)
+            return old is None
+
+    def drop(self, username, forget=False):
+        """Take a user offline now (they signed off); forget=True also drops their last-seen time."""
+        with self._lock:
+            due = self._due.pop(username, None)
+            if due is not None:
+                self._wheel[due % len(self._wheel)].discard(username)
+                self._last_seen[username] = self.wall_clock()
+                self._changed(username, False)
+            if forget:
+                self._last_seen.pop(username, None)
+
+    def is_online(self, username):
+        return username in self._due
+
+    def last_seen(self, username):
+        """Wall-clock time of the user's last heartbeat (or sign-off), or None."""
+        return self._last_seen.get(username)
+
+    def advance(self, now=None):
+        """Expire everyone whose deadline has passed; returns the number taken offline."""
+        target = self._tick_of(self.clock() if now is None else now)
+        expired = 0
+        with self._lock:
+            while self._now_tick < target:
+                self._now_tick += 1
+                slot = self._wheel[self._now_tick % len(self._wheel)]
+                for username in [u for u in slot if self._due[u] <= self._now_tick]:
+                    slot.discard(username)
+                    del self._due[username]
+                    self._changed(username, False)
+                    expired += 1
+            self.expired += expired
+        return expired
+
+    def start_ticker(self):
+        """Run advance() every tick in a daemon thread."""
+        def loop():
+            while True:
+                time.sleep(self.tick)
+                try:
+                    self.advance()
+                except Exception as e:
+                    print(f"Presence: expiry failed: {e}")
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {"presence_online": len(self._due),
+                    "presence_heartbeats": self.heartbeats,
+                    "presence_expired": self.expired}
@@ -0,0 +1,56 @@
+import argparse
+import collections
+import os
+import subprocess
+import sys
+
+
+def import_profile(module):
+    """Import `module` in a fresh interpreter under -X importtime; returns [(package, self_us, cumulative_us)]."""
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else f"import {module} failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile(module, repeat, top):
+    runs = [import_profile(module) for _ in range(repeat)]
+    # Best of N per import, to take disk cache / scheduler noise out
+    best = {}
+    for rows in runs:
+        for name, self_us, cumulative_us in rows:
+            prev = best.get(name)
+            if prev is None or cumulative_us < prev[1]:
+                best[name] = (self_us, cumulative_us)
+    total = best[module][1]
+
+    by_package = collections.Counter()
+    for name, (self_us, _) in best.items():
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"--- PQC Voice Chat Import Profile: import {module} (best of {repeat}) ---")
+    print(f"Total import time: {total / 1000:.1f} ms, {len(best)} modules")
+    print(f"\nTop {top} top-level packages by self time:")
+    for package, us in by_package.most_common(top):
+        print(f"  {package:<28} {us / 1000:>8.1f} ms  {us / total * 100:>5.1f}%")
+    print(f"\nTop {top} imports by cumulative time:")
+    for name, (_, cumulative_us) in sorted(best.items(), key=lambda kv: -kv[1][1])[1:top + 1]:
+        print(f"  {name:<40} {cumulative_us / 1000:>8.1f} ms")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile (python -X importtime) of a module's cold start")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    profile(args.module, args.repeat, args.top)
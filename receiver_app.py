@@ -227,6 +227,8 @@ if st.session_state['registered_username']:
             st.session_state['registered_username'],
             KEY_REGISTRY_URL
         )
+        # Calls are only put through to users who are online
+        st.session_state['call_handler'].start_heartbeats()
     
     # Display current status
     if not st.session_state['voice_call_active']:
@@ -0,0 +1,149 @@
+"""
+Encrypted RTCP-style receiver reports.
+
+The one-way latency in CallMetrics compares the peer's wall clock with ours,
+so it is off by however far apart the two clocks are. Receiver reports fix
+that the way RTCP does (RFC 3550 6.4): about once a second each end sends a
+small control packet on the media socket, sealed like audio, carrying
+
+    sent_at           sender's monotonic clock when the report left
+    highest_seq       highest audio packet index received from the peer
+    cumulative_lost   audio packets lost so far
+    fraction_lost     share lost since the previous report, in 1/256
+    jitter_ms         RFC 3550 interarrival jitter
+    echo_ts           sent_at of the last report received from the peer (0 = none yet)
+    echo_delay        seconds between receiving that report and sending this one
+
+When a report comes back, RTT = now - echo_ts - echo_delay: both timestamps
+are from the receiver's own clock and the delay is an interval on the
+peer's, so no clock synchronisation is needed. The peer's loss and jitter
+figures tell each end how its own outgoing stream is doing, which is what an
+adaptive bitrate or packetization policy needs.
+
+Reports use their own packet index space (CONTROL_INDEX_FLAG set) so a lost
+or reordered report never shows up as a gap in the audio sequence.
+"""
+
+import struct
+import time
+
+from metrics import Histogram
+
+REPORT_INTERVAL_S = 1.0
+# Top bit of the packet index marks control packets
+CONTROL_INDEX_FLAG = 0x80000000
+
+_REPORT = struct.Struct('!dIIBfdd')
+
+
+class ReceiverReport:
+    """One receiver report as sent on the wire."""
+
+    __slots__ = ("sent_at", "highest_seq", "cumulative_lost", "fraction_lost",
+                 "jitter_ms", "echo_ts", "echo_delay")
+
+    def __init__(self, sent_at, highest_seq, cumulative_lost, fraction_lost, jitter_ms,
+                 echo_ts=0.0, echo_delay=0.0):
+        self.sent_at = sent_at
+        self.highest_seq = highest_seq
+        self.cumulative_lost = cumulative_lost
+        self.fraction_lost = fraction_lost
+        self.jitter_ms = jitter_ms
+        self.echo_ts = echo_ts
+        self.echo_delay = echo_delay
+
+    @property
+    def loss_percent(self):
+        """Loss since the previous report, in percent."""
+        return self.fraction_lost * 100 / 256
+
+    def pack(self):
+        return _REPORT.pack(self.sent_at, self.highest_seq & 0x7fffffff,
+                            min(self.cumulative_lost, 0xffffffff), self.fraction_lost,
+                            self.jitter_ms, self.echo_ts, self.echo_delay)
+
+    @classmethod
+    def unpack(cls, payload):
+        return cls(*_REPORT.unpack(payload[:_REPORT.size]))
+
+    def __repr__(self):
+        return (f"ReceiverReport(highest_seq={self.highest_seq}, lost={self.cumulative_lost}, "
+                f"fraction_lost={self.fraction_lost}/256, jitter_ms={self.jitter_ms:.1f})")
+
+
+class ReportSession:
+    """
+    Report state for one call: when to send, what to echo, and the RTT and
+    peer-observed loss/jitter derived from the reports that come back.
+    """
+
+    def __init__(self, interval=REPORT_INTERVAL_S, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.rtt = Histogram(highest=10000.0)
+        self.rtt_ms = 0.0           # latest sample
+        self.smoothed_rtt_ms = 0.0  # RFC 6298 SRTT
+        self.remote = None          # latest report from the peer
+        self.sent = 0
+        self.received = 0
+        self._next_due = 0.0
+        self._peer_sent_at = 0.0
+        self._peer_arrival = 0.0
+        self._prior_expected = 0
+        self._prior_received = 0
+
+    def due(self, now=None):
+        return (self.clock() if now is None else now) >= self._next_due
+
+    def next_index(self):
+        """Packet index for the next report (never collides with audio indexes)."""
+        return CONTROL_INDEX_FLAG | (self.sent & 0x7fffffff)
+
+    def build(self, sequence, jitter_ms, now=None):
+        """Report on the audio received so far (a SequenceTracker) and schedule the next one."""
+        now = self.clock() if now is None else now
+        # RFC 3550 A.3: fraction lost over the interval since the last report
+        expected = sequence.expected - self._prior_expected
+        lost = expected - (sequence.received - self._prior_received)
+        fraction = (lost << 8) // expected if expected > 0 and lost > 0 else 0
+        self._prior_expected = sequence.expected
+        self._prior_received = sequence.received
+        echo_delay = now - self._peer_arrival if self._peer_sent_at else 0.0
+        report = ReceiverReport(now, sequence.highest or 0, sequence.lost, min(fraction, 255),
+                                jitter_ms, self._peer_sent_at, echo_delay)
+        self.sent += 1
+        self._next_due = now + self.interval
+        return report
+
+    def on_report(self, payload, now=None):
+        """Account a report from the peer; returns it, or None if stale."""
+        now = self.clock() if now is None else now
+        report = ReceiverReport.unpack(payload)
+        if report.sent_at <= self._peer_sent_at:
+            return None  # reordered or replayed, already superseded
+        self._peer_sent_at = report.sent_at
+        self._peer_arrival = now
+        self.remote = report
+        self.received += 1
+        if report.echo_ts:
+            rtt = (now - report.echo_ts - report.echo_delay) * 1000
+            if rtt >= 0:
+                self.rtt_ms = rtt
+                self.rtt.record(rtt)
+                if self.smoothed_rtt_ms:
+                    self.smoothed_rtt_ms += (rtt - self.smoothed_rtt_ms) / 8
+                else:
+                    self.smoothed_rtt_ms = rtt
+        return report
+
+    @property
+    def remote_loss_percent(self):
+        """Loss of our outgoing audio as last reported by the peer."""
+        return self.remote.loss_percent if self.remote else 0.0
+
+    @property
+    def remote_jitter_ms(self):
+        return self.remote.jitter_ms if self.remote else 0.0
+
+    def histograms(self):
+        return {"rtt_ms": self.rtt} if self.rtt.count else {}
@@ -0,0 +1,320 @@
+"""
+PQC Audio - Key Registry Server on asyncio
+Runs on localhost:5001, same endpoints and JSON as key_registry_server.py
+
+The Flask server runs on a development server with a thread per request, so
+every connection (and every held long-poll) costs a thread and throughput is
+bounded by thread switching. This one serves the same RegistryService
+(registry_service.py) from a single asyncio event loop with a small HTTP/1.1
+parser: keep-alive connections, Content-Length bodies, size limits.
+
+- Reads from in-memory stores (json, journal) and call session changes run
+  inline on the loop; they only take short locks.
+- Anything that may wait on the disk (store writes, the journal's fsync,
+  SQLite) runs in a thread pool so the loop never blocks on I/O.
+- Long-polls (?wait=) hold no thread: the request subscribes to its callee
+  or call ID with CallSessions.listen() and is resumed by the loop when that
+  key changes.
+
+Configuration: REGISTRY_HOST, REGISTRY_PORT, REGISTRY_WORKERS (thread pool
+size) and the storage / call settings listed in registry_service.py.
+"""
+
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import registry_service
+
+# Request head (request line + headers) and body limits
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 75
+# Threads for handlers that may block on the disk
+WORKERS = int(os.getenv('REGISTRY_WORKERS', 16))
+
+REASONS = {200: "OK", 201: "Created", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+           500: "Internal Server Error", 501: "Not Implemented"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_json(body):
+    """Response body as Flask's jsonify writes it (compact, sorted keys, newline)."""
+    return (json.dumps(body, separators=(",", ":"), sort_keys=True) + "\n").encode()
+
+
+class AsyncRegistryServer:
+    def __init__(self, service, workers=WORKERS):
+        self.service = service
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="registry")
+        self.connections = set()  # tasks serving open connections
+        self.requests = 0
+        # (method, path pattern, handler(request, *path params)) in the Flask server's URL scheme
+        self.routes = [
+            ("POST", r"/register", self.register),
+            ("GET", r"/fetch/([^/]+)", self.read(self.service.fetch)),
+            ("GET", r"/list", self.list_users),
+            ("DELETE", r"/unregister/([^/]+)", self.unregister),
+            ("POST", r"/presence/heartbeat", self.json_body(self.service.heartbeat)),
+            ("GET", r"/users/([^/]+)", self.read(self.service.user_info)),
+            ("GET", r"/health", self.read(self.service.health)),
+            ("GET", r"/stats", self.read(self.service.stats)),
+            ("GET", r"/metrics", self.metrics),
+            ("GET", r"/", self.read(self.service.info)),
+            ("POST", r"/call/initiate", self.initiate_call),
+            ("POST", r"/call/accept", self.json_body(self.service.accept_call)),
+            ("POST", r"/call/reject", self.json_body(self.service.reject_call)),
+            ("POST", r"/call/hangup", self.json_body(self.service.hangup_call)),
+            ("GET", r"/call/status/([^/]+)", self.call_status),
+            ("GET", r"/call/pending/([^/]+)", self.pending_calls),
+        ]
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in self.routes]
+
+    # ==================== HANDLERS ====================
+
+    async def blocking(self, fn, *args):
+        """Run fn in the thread pool (it may wait on the disk)."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def store_read(self, fn, *args):
+        """Run a handler that reads the store: inline if the store is in memory."""
+        if self.service.store.memory_reads:
+            return fn(*args)
+        return await self.blocking(fn, *args)
+
+    def read(self, fn):
+        async def handler(request, *params):
+            return await self.store_read(fn, *map(unquote, params))
+        return handler
+
+    def json_body(self, fn):
+        async def handler(request):
+            return fn(request.json())
+        return handler
+
+    async def list_users(self, request):
+        # Served from the in-memory user index whatever the store
+        return self.service.list_users(request.arg('cursor'), request.arg('limit'), request.arg('since'),
+                                       request.headers.get('if-none-match'), request.arg('online'))
+
+    async def register(self, request):
+        return await self.blocking(self.service.register, request.json(), request.remote_addr)
+
+    async def unregister(self, request, username):
+        return await self.blocking(self.service.unregister, unquote(username))
+
+    async def metrics(self, request):
+        return self.service.prometheus(), 200
+
+    async def initiate_call(self, request):
+        return await self.store_read(self.service.initiate_call, request.json(), request.remote_addr)
+
+    async def call_status(self, request, call_id):
+        call_id = unquote(call_id)
+        known = request.arg('status')
+        wait = registry_service.parse_wait(request.arg('wait'))
+        sessions = self.service.sessions
+        if wait > 0 and known:
+            await self.wait_for(("call", call_id), lambda: sessions.status_ready(call_id, known), wait)
+        return self.service.call_status(call_id, known)
+
+    async def pending_calls(self, request, username):
+        username = unquote(username)
+        exclude = registry_service.parse_exclude(request.arg('exclude'))
+        wait = registry_service.parse_wait(request.arg('wait'))
+        callee = username.strip().lower()
+        sessions = self.service.sessions
+        if wait > 0:
+            await self.wait_for(("callee", callee), lambda: sessions.pending_ready(callee, exclude), wait)
+        return self.service.pending_calls(username, exclude)
+
+    async def wait_for(self, key, ready, timeout):
+        """Suspend until ready() or `timeout` seconds, re-checking whenever `key` changes."""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        remove = self.service.sessions.listen(key, lambda: loop.call_soon_threadsafe(changed.set))
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                # Cleared before checking, so a change after the check still wakes us
+                changed.clear()
+                left = deadline - loop.time()
+                if ready() or left <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), left)
+                except asyncio.TimeoutError:
+                    return
+        finally:
+            remove()
+
+    async def dispatch(self, request):
+        methods = []
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match:
+                if method == request.method:
+                    return await handler(request, *match.groups())
+                methods.append(method)
+        if methods:
+            return {"status": "error", "message": f"Method {request.method} not allowed"}, 405
+        return {"status": "error", "message": f"Not found: {request.path}"}, 404
+
+    # ==================== HTTP ====================
+
+    async def handle_connection(self, reader, writer):
+        self.connections.add(asyncio.current_task())
+        peer = writer.get_extra_info("peername")
+        remote_addr = peer[0] if peer else ""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(Request.read(reader, remote_addr), KEEPALIVE_TIMEOUT)
+                except HttpError as e:
+                    writer.write(response(e.status, {"status": "error", "message": str(e)}, keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                self.requests += 1
+                try:
+                    body, status, *headers = await self.dispatch(request)
+                except Exception as e:
+                    body, status, headers = {"status": "error", "message": f"Request failed: {str(e)}"}, 500, ()
+                writer.write(response(status, body, request.keep_alive, *headers))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def close_connections(self):
+        """Drop every open connection (keep-alive or long-polling)."""
+        tasks = list(self.connections)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def start(self, host, port):
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES,
+                                          backlog=1024)
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body, remote_addr):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = parse_qs(parts.query)
+        self.headers = headers
+        self.body = body
+        self.remote_addr = remote_addr
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            self.keep_alive = connection != "close"
+        else:
+            self.keep_alive = connection == "keep-alive"
+
+    def arg(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def json(self):
+        """The JSON body, or None if there is none / it doesn't parse (as Flask's get_json(silent=True))."""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+    @classmethod
+    async def read(cls, reader, remote_addr):
+        """Next request on the connection, or None once the client has closed it."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(431, "Request head too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if "transfer-encoding" in headers:
+            raise HttpError(501, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return cls(method, target, version, headers, body, remote_addr)
+
+
+def response(status, body, keep_alive, headers=None):
+    if body is None:
+        payload, content_type = b"", None
+    elif isinstance(body, str):
+        payload, content_type = body.encode(), "text/plain; version=0.0.4"
+    else:
+        payload, content_type = encode_json(body), "application/json"
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    if content_type:
+        head.append(f"Content-Type: {content_type}")
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    head += [f"Content-Length: {len(payload)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + payload
+
+
+async def serve(service, host, port, ready=None):
+    """Serve until cancelled; ready(server) is called once it is listening."""
+    registry = AsyncRegistryServer(service)
+    server = await registry.start(host, port)
+    if ready:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await registry.close_connections()
+        registry.executor.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    REGISTRY_HOST = os.getenv('REGISTRY_HOST', '0.0.0.0')
+    REGISTRY_PORT = int(os.getenv('REGISTRY_PORT', 5001))
+
+    print("=" * 60)
+    print("      PQC KEY REGISTRY SERVER (ASYNC) IS RUNNING")
+    print("=" * 60)
+    print(f" PORT: {REGISTRY_PORT}")
+    print(f" STATUS: Online and Listening...")
+    print("=" * 60)
+    print()
+
+    try:
+        asyncio.run(serve(registry_service.service_from_env(), REGISTRY_HOST, REGISTRY_PORT))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,448 @@
+"""
+Key registry and call signalling logic shared by the registry servers.
+
+key_registry_server.py (Flask, thread per request) and
+registry_server_async.py (asyncio) are thin HTTP front ends over one
+RegistryService: each endpoint is a method that takes the path parameters
+and JSON body and returns (response dict, HTTP status[, headers]), so both
+servers answer with exactly the same JSON. A None body means no body
+(304). Long-poll waiting is left to the front ends: the threaded server
+passes `wait` through and blocks in CallSessions, the async server awaits a
+CallSessions listener and then calls in with wait=0.
+
+Configuration (environment):
+    REGISTRY_FILE             key registry file (default key_registry.json)
+    REGISTRY_BACKEND          "json" (in memory, written back to REGISTRY_FILE),
+                              "sqlite", or "journal" (in memory, snapshot +
+                              append-only journal next to REGISTRY_FILE)
+    REGISTRY_DB               SQLite database for the sqlite backend
+                              (REGISTRY_FILE is migrated into it once)
+    REGISTRY_FLUSH_INTERVAL   seconds between write-behind flushes of the
+                              json backend (0 = write through)
+    CALL_RINGING_TIMEOUT, CALL_ACTIVE_TIMEOUT, CALL_RETENTION
+                              call session lifetimes, see call_sessions.py
+    PRESENCE_TTL              seconds without a heartbeat before a user is
+                              offline, see presence.py
+"""
+
+import functools
+import os
+from datetime import datetime
+
+import call_sessions
+import metrics
+import presence
+import registry_store
+import user_index
+
+# Longest a long-poll request (?wait=) is held open
+MAX_WAIT = 30.0
+
+ENDPOINTS = {
+    "registration": {
+        "POST /register": "Register a public key with username",
+        "GET /fetch/<username>": "Fetch public key by username",
+        "GET /list?cursor=&limit=&since=&online=": "List registered users (paged, changes since a version, online only)",
+        "GET /users/<username>": "Get full user info",
+        "DELETE /unregister/<username>": "Unregister a user",
+        "POST /presence/heartbeat": "Keep a user online"
+    },
+    "voice_calls": {
+        "POST /call/initiate": "Initiate a voice call",
+        "POST /call/accept": "Accept an incoming call",
+        "POST /call/reject": "Reject an incoming call",
+        "POST /call/hangup": "End an active call",
+        "GET /call/status/<call_id>?wait=&status=": "Get call status (long-poll for a change)",
+        "GET /call/pending/<username>?wait=&exclude=": "Get pending calls for user (long-poll for a new one)"
+    },
+    "system": {
+        "GET /health": "Health check",
+        "GET /stats": "User and call session gauges",
+        "GET /metrics": "The same gauges for Prometheus",
+        "GET /": "This info page"
+    }
+}
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S") if seconds else None
+
+
+def _error(message, status):
+    return {"status": "error", "message": message}, status
+
+
+def _fails_as(what):
+    """Turn an unexpected exception in an endpoint into a 500 '<what> failed: ...' response."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except Exception as e:
+                return _error(f"{what} failed: {str(e)}", 500)
+        return wrapper
+    return decorate
+
+
+def parse_wait(value):
+    """A ?wait= query value as seconds, clamped to [0, MAX_WAIT]."""
+    try:
+        return min(MAX_WAIT, max(0.0, float(value or 0)))
+    except ValueError:
+        return 0.0
+
+
+def parse_int(value):
+    """An integer query value; None if absent, ValueError if malformed."""
+    return int(value) if value not in (None, '') else None
+
+
+def parse_exclude(value):
+    """A ?exclude=<id>,<id> query value as a set of call IDs."""
+    return set(filter(None, (value or '').split(',')))
+
+
+def service_from_env():
+    """RegistryService with the store and session lifetimes configured by the environment."""
+    json_path = os.getenv('REGISTRY_FILE', "key_registry.json")
+    store = registry_store.create_store(
+        os.getenv('REGISTRY_BACKEND', 'json'), json_path, os.getenv('REGISTRY_DB', "key_registry.db"),
+        float(os.getenv('REGISTRY_FLUSH_INTERVAL', registry_store.DEFAULT_FLUSH_INTERVAL)))
+    sessions = call_sessions.CallSessions(
+        ringing_timeout=float(os.getenv('CALL_RINGING_TIMEOUT', call_sessions.RINGING_TIMEOUT)),
+        active_timeout=float(os.getenv('CALL_ACTIVE_TIMEOUT', call_sessions.ACTIVE_TIMEOUT)),
+        retention=float(os.getenv('CALL_RETENTION', call_sessions.RETENTION)))
+    sessions.start_expirer()
+    users_online = presence.Presence(ttl=float(os.getenv('PRESENCE_TTL', presence.PRESENCE_TTL)))
+    users_online.start_ticker()
+    return RegistryService(store, sessions, users_online)
+
+
+class RegistryService:
+    def __init__(self, store, sessions, users_online=None):
+        self.store = store
+        self.sessions = sessions
+        # /list entries in username order, kept in step with the store
+        self.users = user_index.UserIndex(store.items())
+        # Who is online (memory only); transitions show up in /list
+        self.presence = users_online or presence.Presence()
+        self.presence.add_listener(
+            lambda username, online, last_seen: self.users.set_online(username, online, _timestamp(last_seen)))
+        # Serializes changes to the same username across request threads
+        self.user_locks = registry_store.StripedLocks()
+
+    # ==================== REGISTRATION ====================
+
+    @_fails_as("Registration")
+    def register(self, data, remote_addr):
+        username = data.get('username', '').strip().lower()
+        public_key = data.get('public_key', '').strip()
+        # Use the client-provided IP if it's a real LAN IP.
+        # Only fall back to remote_addr if client sends 'internal' or '127.x'
+        client_ip = data.get('listening_ip', 'internal').strip()
+        if client_ip and client_ip != 'internal' and not client_ip.startswith('127.'):
+            listening_ip = client_ip
+        else:
+            listening_ip = remote_addr
+        listening_port = data.get('listening_port', 0)
+
+        # Validation
+        if not username or len(username) < 2:
+            return _error("Username must be at least 2 characters", 400)
+        if not public_key or len(public_key) < 100:  # Kyber public key is ~1184 hex chars
+            return _error("Invalid public key format", 400)
+        if not listening_ip:
+            return _error("Listening IP address is required", 400)
+        if listening_port <= 0 or listening_port > 65535:
+            return _error("Valid listening port (1-65535) is required", 400)
+
+        record = {
+            "public_key": public_key,
+            "listening_ip": listening_ip,
+            "listening_port": listening_port,
+            "registered_at": _now()
+        }
+        with self.user_locks.lock(username):
+            self.store.put(username, record)
+            self.users.put(username, record)
+            self.presence.beat(username)
+
+        return {
+            "status": "success",
+            "message": f"User {username} registered and listening on {listening_ip}:{listening_port}",
+            "username": username,
+            "listening_address": f"{listening_ip}:{listening_port}",
+            "timestamp": record["registered_at"]
+        }, 201
+
+    @_fails_as("Fetch")
+    def fetch(self, username):
+        username = username.strip().lower()
+        user_data = self.store.get(username)
+        if user_data is None:
+            return _error(f"User '{username}' not found in registry", 404)
+        return {
+            "status": "success",
+            "username": username,
+            "public_key": user_data["public_key"],
+            "listening_ip": user_data.get("listening_ip", "unknown"),
+            "listening_port": user_data.get("listening_port", 0),
+            "listening_address": f"{user_data.get('listening_ip', 'unknown')}:{user_data.get('listening_port', 0)}",
+            "registered_at": user_data.get("registered_at", "unknown"),
+            **self._presence_of(username)
+        }, 200
+
+    def _presence_of(self, username):
+        return {"online": self.presence.is_online(username),
+                "last_seen": _timestamp(self.presence.last_seen(username))}
+
+    @_fails_as("Heartbeat")
+    def heartbeat(self, data):
+        username = data.get('username', '').strip().lower()
+        with self.user_locks.lock(username):
+            if username not in self.users:
+                return _error(f"User '{username}' not registered", 404)
+            self.presence.beat(username)
+        return {
+            "status": "success",
+            "username": username,
+            "online": True,
+            "interval": presence.HEARTBEAT_INTERVAL,
+            "ttl": self.presence.ttl
+        }, 200
+
+    @_fails_as("List")
+    def list_users(self, cursor=None, limit=None, since=None, if_none_match=None, online=None):
+        try:
+            limit, since = parse_int(limit), parse_int(since)
+        except ValueError:
+            return _error("limit and since must be integers", 400)
+        if limit is not None and limit <= 0:
+            return _error("limit must be positive", 400)
+        online_only = (online or '').lower() in ('1', 'true', 'yes')
+        if if_none_match is not None and if_none_match == self.users.etag(cursor, limit, online_only):
+            return None, 304, {"ETag": if_none_match}
+        if since is not None:
+            version, changes = self.users.changes_since(since, online_only)
+            if changes is not None:
+                return {
+                    "status": "success",
+                    "version": version,
+                    "total_users": self.users.count(online_only),
+                    "changes": changes
+                }, 200, {"ETag": self.users.etag(cursor, limit, online_only, version)}
+        version, users, next_cursor = self.users.page(cursor, limit, online_only)
+        body = {
+            "status": "success",
+            "version": version,
+            "total_users": self.users.count(online_only),
+            "users": users
+        }
+        if cursor is not None or limit is not None:
+            body["next_cursor"] = next_cursor
+        if since is not None:
+            # Too old for the change log (or from before a restart): start over from this list
+            body["reset"] = True
+        return body, 200, {"ETag": self.users.etag(cursor, limit, online_only, version)}
+
+    @_fails_as("Unregister")
+    def unregister(self, username):
+        username = username.strip().lower()
+        with self.user_locks.lock(username):
+            removed = self.store.delete(username)
+            self.presence.drop(username, forget=True)
+            self.users.remove(username)
+        if not removed:
+            return _error(f"User '{username}' not found", 404)
+        return {
+            "status": "success",
+            "message": f"Public key unregistered for {username}"
+        }, 200
+
+    @_fails_as("Failed to fetch user info")
+    def user_info(self, username):
+        username = username.strip().lower()
+        user = self.store.get(username)
+        if user is None:
+            return _error(f"User '{username}' not found", 404)
+        return {
+            "status": "success",
+            "username": username,
+            "public_key": user['public_key'],
+            "listening_ip": user['listening_ip'],
+            "listening_port": user['listening_port'],
+            "registered_at": user.get('registered_at'),
+            **self._presence_of(username)
+        }, 200
+
+    # ==================== SYSTEM ====================
+
+    def health(self):
+        return {
+            "status": "healthy",
+            "service": "PQC Key Registry Server",
+            "version": "1.0",
+            "timestamp": _now()
+        }, 200
+
+    def gauges(self):
+        """Gauges for /stats and /metrics."""
+        return {"registered_users": len(self.store), **self.presence.stats(), **self.sessions.stats()}
+
+    def stats(self):
+        return {"status": "success", **self.gauges()}, 200
+
+    def prometheus(self):
+        """The gauges in Prometheus text format."""
+        return metrics.to_prometheus(metrics.snapshot({}, {}, self.gauges()), prefix="pqc_registry")
+
+    def info(self):
+        return {
+            "service": "PQC Audio - Local Key Registry Server",
+            "version": "2.0",
+            "endpoints": ENDPOINTS,
+            "docs": {
+                "register": "POST /register with JSON: {username, public_key, listening_ip, listening_port}",
+                "call_initiate": "POST /call/initiate with JSON: {caller, callee, caller_listen_port, session_key_ciphertext, media_offer?}",
+                "call_accept": "POST /call/accept with JSON: {call_id, media_answer?}",
+                "call_pending": "GET /call/pending/<username> - Get all ringing calls for user"
+            }
+        }, 200
+
+    # ==================== CALL SIGNALING ====================
+
+    @_fails_as("Call initiation")
+    def initiate_call(self, data, remote_addr):
+        caller = data.get('caller', '').strip().lower()
+        callee = data.get('callee', '').strip().lower()
+        caller_listen_port = data.get('caller_listen_port')
+        session_key_ciphertext = data.get('session_key_ciphertext')
+        media_offer = data.get('media_offer')
+
+        if not all([caller, callee, caller_listen_port, session_key_ciphertext]):
+            return _error("Missing required fields: caller, callee, caller_listen_port, session_key_ciphertext", 400)
+
+        # Validate callee exists and registered
+        callee_info = self.store.get(callee)
+        if callee_info is None:
+            return _error(f"Callee '{callee}' not registered", 404)
+        # Don't ring a client that stopped heartbeating (crashed, lost its network)
+        if not self.presence.is_online(callee):
+            return {"status": "error", "message": f"Callee '{callee}' is offline",
+                    **self._presence_of(callee)}, 409
+
+        # Store call session (ringing)
+        call_id = self.sessions.create({
+            'caller': caller,
+            'callee': callee,
+            'caller_ip': (self.store.get(caller) or {}).get('listening_ip', remote_addr),
+            'caller_port': caller_listen_port,
+            'callee_ip': callee_info['listening_ip'],
+            'callee_port': callee_info['listening_port'],
+            'session_key_ciphertext': session_key_ciphertext,
+            'media_offer': media_offer,
+            'media_answer': None,
+            'initiated_at': _now(),
+            'answered_at': None
+        })
+
+        return {
+            "status": "success",
+            "call_id": call_id,
+            "message": f"Call initiated from {caller} to {callee}",
+            "callee_ip": callee_info['listening_ip'],
+            "callee_port": callee_info['listening_port'],
+            "timestamp": _now()
+        }, 200
+
+    def _transition(self, call_id, status, **fields):
+        """(updated call, None) or (None, error response)."""
+        try:
+            return self.sessions.transition(call_id, status, **fields), None
+        except KeyError:
+            return None, _error(f"Call '{call_id}' not found", 404)
+        except call_sessions.InvalidTransition as e:
+            return None, ({"status": "error", "message": str(e), "call_status": e.current}, 409)
+
+    @_fails_as("Call acceptance")
+    def accept_call(self, data):
+        call, error = self._transition(data.get('call_id', ''), call_sessions.ACTIVE,
+                                       answered_at=_now(), media_answer=data.get('media_answer'))
+        if error:
+            return error
+        return {
+            "status": "success",
+            "message": "Call accepted",
+            "caller_ip": call['caller_ip'],
+            "caller_port": call['caller_port'],
+            "callee_ip": call['callee_ip'],
+            "callee_port": call['callee_port'],
+            "session_key_ciphertext": call['session_key_ciphertext'],
+            "media_answer": call['media_answer'],
+            "timestamp": _now()
+        }, 200
+
+    @_fails_as("Call rejection")
+    def reject_call(self, data):
+        _, error = self._transition(data.get('call_id', ''), call_sessions.REJECTED)
+        if error:
+            return error
+        return {
+            "status": "success",
+            "message": "Call rejected",
+            "timestamp": _now()
+        }, 200
+
+    @_fails_as("Call hangup")
+    def hangup_call(self, data):
+        # Kept for CALL_RETENTION seconds so the other side can read the outcome
+        _, error = self._transition(data.get('call_id', ''), call_sessions.ENDED, ended_at=_now())
+        if error:
+            return error
+        return {
+            "status": "success",
+            "message": "Call ended",
+            "duration": "call duration calculation",
+            "timestamp": _now()
+        }, 200
+
+    @_fails_as("Status check")
+    def call_status(self, call_id, known=None, wait=0):
+        call = self.sessions.wait_status(call_id, known, wait)
+        if call is None:
+            return _error(f"Call '{call_id}' not found", 404)
+        return {
+            "call_id": call_id,
+            "status": call['status'],
+            "caller": call['caller'],
+            "callee": call['callee'],
+            "initiated_at": call['initiated_at'],
+            "answered_at": call['answered_at'],
+            "caller_ip": call['caller_ip'],
+            "caller_port": call['caller_port'],
+            "callee_ip": call['callee_ip'],
+            "callee_port": call['callee_port'],
+            "media_answer": call.get('media_answer')
+        }, 200
+
+    @_fails_as("Failed to fetch pending calls")
+    def pending_calls(self, username, exclude=(), wait=0):
+        username = username.strip().lower()
+        pending = [{
+            'call_id': call_info['call_id'],
+            'caller': call_info['caller'],
+            'status': call_info['status'],
+            'initiated_at': call_info['initiated_at'],
+            'session_key_ciphertext': call_info['session_key_ciphertext'],
+            'media_offer': call_info.get('media_offer')
+        } for call_info in self.sessions.wait_pending(username, exclude, wait)]
+        return {
+            "status": "success",
+            "username": username,
+            "pending_calls": pending
+        }, 200
@@ -0,0 +1,515 @@
+"""
+Key registry storage for key_registry_server.py.
+
+All backends map username -> registration record (public_key, listening_ip,
+listening_port, registered_at) behind the RegistryStore interface; pick one
+with create_store():
+
+    json    The registry is held in memory as the source of truth, so lookups
+            are plain dict reads and request handlers never touch the disk.
+            Changes only mark the store dirty; a background thread writes the
+            whole registry back to the JSON file at most once per flush
+            interval, through a temp file and an atomic rename so a crash
+            mid-write never leaves a truncated registry behind. A flush
+            interval of 0 writes through on every change.
+    sqlite  One row per user in a SQLite database in WAL mode, keyed on
+            username and indexed on listening address. Registering or looking
+            up a user (by name or by address) touches one row, so the cost
+            doesn't grow with the registry. An existing JSON
+            registry is migrated on first open.
+    journal In memory, made durable by an append-only change journal: each
+            change is one appended line, and writers wait for a shared fsync
+            that covers every change made in the same few milliseconds (group
+            commit), so a write costs O(1) and survives a crash once it
+            returns. At startup the JSON snapshot is loaded and the journal
+            replayed on top of it; a torn last line from a crash is dropped.
+            Once the journal grows past compact_after entries it is rotated
+            and folded into a new snapshot in the background.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds
+# Journal: how long the syncer gathers writes before one fsync covers them all
+DEFAULT_SYNC_WINDOW = 0.002  # seconds
+# Journal entries before the journal is folded into a new snapshot
+DEFAULT_COMPACT_AFTER = 10000
+BACKENDS = ("json", "sqlite", "journal")
+
+
+class RegistryStore:
+    """Base class: username -> registration record (a dict; treat it as read-only)."""
+
+    # get()/items()/len() are served from memory and never wait on the disk
+    memory_reads = False
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def get(self, username):
+        raise NotImplementedError
+
+    def items(self):
+        """All (username, record) pairs."""
+        raise NotImplementedError
+
+    def find_by_address(self, listening_ip, listening_port):
+        """Usernames registered at this listening address, in username order."""
+        return sorted(username for username, record in self.items()
+                      if record.get("listening_ip") == listening_ip and record.get("listening_port") == listening_port)
+
+    def put(self, username, record):
+        raise NotImplementedError
+
+    def delete(self, username):
+        """Remove `username`; returns False if it wasn't registered."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Make changes durable now."""
+
+    def close(self):
+        self.flush()
+
+
+class StripedLocks:
+    """
+    Fixed pool of locks picked by hashing a key: changes to the same username
+    are serialized, different usernames almost never contend, and memory
+    doesn't grow with the number of users.
+    """
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def lock(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+
+def _write_snapshot(path, data):
+    """Atomically replace `path` with `data` as JSON (temp file, fsync, rename)."""
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class JsonFileStore(RegistryStore):
+    """username -> registration record, persisted write-behind to a JSON file."""
+
+    memory_reads = True
+
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self._data = self._load()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._closed = False
+        self._wake = threading.Event()
+        if flush_interval > 0:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self.close)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Registry: could not load {self.path}: {e}")
+            return {}
+
+    def __contains__(self, username):
+        return username in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, username):
+        """Registration record for `username`, or None. Treat it as read-only."""
+        return self._data.get(username)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def put(self, username, record):
+        with self._lock:
+            self._data[username] = record
+            self._dirty = True
+        self._changed()
+
+    def delete(self, username):
+        with self._lock:
+            if self._data.pop(username, None) is None:
+                return False
+            self._dirty = True
+        self._changed()
+        return True
+
+    def _changed(self):
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """Write the registry to disk now if anything changed since the last flush."""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                snapshot = dict(self._data)
+                self._dirty = False
+            try:
+                _write_snapshot(self.path, snapshot)
+                self.flushes += 1
+            except Exception as e:
+                print(f"Registry: flush to {self.path} failed: {e}")
+                with self._lock:
+                    self._dirty = True
+                return False
+            return True
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write any pending changes."""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+
+# Statements are module constants so sqlite3's per-connection statement cache
+# reuses the compiled (prepared) form on every call
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS users (
+           username TEXT PRIMARY KEY,
+           public_key TEXT NOT NULL,
+           listening_ip TEXT,
+           listening_port INTEGER,
+           registered_at TEXT
+       ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS users_address ON users (listening_ip, listening_port)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID",
+)
+_COLUMNS = ("public_key", "listening_ip", "listening_port", "registered_at")
+_SELECT_USER = "SELECT public_key, listening_ip, listening_port, registered_at FROM users WHERE username = ?"
+_SELECT_ALL = "SELECT username, public_key, listening_ip, listening_port, registered_at FROM users ORDER BY username"
+_SELECT_ADDRESS = "SELECT username FROM users WHERE listening_ip = ? AND listening_port = ? ORDER BY username"
+_COUNT = "SELECT COUNT(*) FROM users"
+_UPSERT = ("INSERT INTO users (username, public_key, listening_ip, listening_port, registered_at) "
+           "VALUES (?, ?, ?, ?, ?) ON CONFLICT (username) DO UPDATE SET "
+           "public_key = excluded.public_key, listening_ip = excluded.listening_ip, "
+           "listening_port = excluded.listening_port, registered_at = excluded.registered_at")
+_DELETE = "DELETE FROM users WHERE username = ?"
+_GET_META = "SELECT value FROM meta WHERE key = ?"
+_SET_META = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+# meta key recording that the JSON registry has been dealt with (value: the users imported)
+_JSON_MIGRATED = "json_migrated"
+
+
+class SqliteStore(RegistryStore):
+    """
+    username -> registration record in a SQLite database.
+
+    Each thread gets its own connection; WAL mode lets readers run alongside
+    the single writer. If the database is empty and `json_path` names an
+    existing JSON registry, its users are imported on first open. The JSON
+    file is left as it is; the meta table records that the migration ran, so
+    it never runs again (even once every user has unregistered).
+    """
+
+    def __init__(self, path, json_path=None):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        db = self._db()
+        for statement in _SCHEMA:
+            db.execute(statement)
+        if json_path and not db.execute(_GET_META, (_JSON_MIGRATED,)).fetchone():
+            if os.path.exists(json_path) and not db.execute(_COUNT).fetchone()[0]:
+                self._migrate(json_path)
+            else:
+                # Nothing to import, or a database that already has users: from now on it is the registry
+                db.execute(_SET_META, (_JSON_MIGRATED, "0"))
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: durable across application crashes, fsync at checkpoints
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            with self._lock:
+                self._connections.append(db)
+        return db
+
+    def _migrate(self, json_path):
+        with open(json_path, 'r') as f:
+            registry = json.load(f)
+        db = self._db()
+        db.execute("BEGIN")
+        try:
+            db.executemany(_UPSERT, ((u, r.get("public_key", ""), r.get("listening_ip"),
+                                      r.get("listening_port"), r.get("registered_at"))
+                                     for u, r in registry.items()))
+            db.execute(_SET_META, (_JSON_MIGRATED, str(len(registry))))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        print(f"Registry: migrated {len(registry)} users from {json_path} to {self.path}")
+
+    def __len__(self):
+        return self._db().execute(_COUNT).fetchone()[0]
+
+    def get(self, username):
+        row = self._db().execute(_SELECT_USER, (username,)).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def items(self):
+        return [(row[0], dict(zip(_COLUMNS, row[1:]))) for row in self._db().execute(_SELECT_ALL)]
+
+    def find_by_address(self, listening_ip, listening_port):
+        # Served from the users_address index
+        return [row[0] for row in self._db().execute(_SELECT_ADDRESS, (listening_ip, listening_port))]
+
+    def put(self, username, record):
+        self._db().execute(_UPSERT, (username, record["public_key"], record.get("listening_ip"),
+                                     record.get("listening_port"), record.get("registered_at")))
+
+    def delete(self, username):
+        return self._db().execute(_DELETE, (username,)).rowcount > 0
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            try:
+                db.close()
+            except Exception:
+                pass
+
+
+class JournalStore(RegistryStore):
+    """
+    username -> registration record, kept in memory and persisted as a JSON
+    snapshot (`path`) plus an append-only journal of changes since it
+    (<path>.journal, one JSON line per put/delete).
+    """
+
+    memory_reads = True
+
+    def __init__(self, path, sync_window=DEFAULT_SYNC_WINDOW, compact_after=DEFAULT_COMPACT_AFTER):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.rotated_path = path + ".journal.old"
+        self.sync_window = sync_window
+        self.compact_after = compact_after
+        self.syncs = 0
+        self.compactions = 0
+        self._data = {}
+        self._lock = threading.Lock()       # in-memory data and journal appends
+        self._sync_lock = threading.Lock()  # fsync vs journal rotation
+        self._synced = threading.Condition()
+        self._appended = 0                  # sequence number of the last appended entry
+        self._durable = 0                   # ...and of the last one known to be on disk
+        self._closed = False
+        self._compacting = False
+        self._wake = threading.Event()
+        self.replayed = self._replay()
+        self._entries = self.replayed
+        self._journal = open(self.journal_path, 'ab')
+        if os.path.exists(self.rotated_path):
+            # A compaction was interrupted; finish it before taking writes
+            self.compact()
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+        atexit.register(self.close)
+
+    def _replay(self):
+        if os.path.exists(self.path):
+            # Snapshots are only ever replaced atomically, so a parse error is real damage
+            with open(self.path, 'r') as f:
+                self._data = json.load(f)
+        count = 0
+        for path in (self.rotated_path, self.journal_path):
+            if os.path.exists(path):
+                count += self._replay_file(path)
+        return count
+
+    def _replay_file(self, path):
+        good = count = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    print(f"Registry: dropping torn journal tail in {path} at byte {good}")
+                    break
+                if entry[0] == "put":
+                    self._data[entry[1]] = entry[2]
+                elif entry[0] == "del":
+                    self._data.pop(entry[1], None)
+                good += len(line)
+                count += 1
+        if good < os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(good)
+        return count
+
+    def __contains__(self, username):
+        return username in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, username):
+        return self._data.get(username)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def put(self, username, record):
+        with self._lock:
+            self._data[username] = record
+            seq = self._append(("put", username, record))
+        self._wait_durable(seq)
+
+    def delete(self, username):
+        with self._lock:
+            if self._data.pop(username, None) is None:
+                return False
+            seq = self._append(("del", username))
+        self._wait_durable(seq)
+        return True
+
+    def _append(self, entry):
+        self._journal.write(json.dumps(entry, separators=(',', ':')).encode() + b"\n")
+        self._appended += 1
+        self._entries += 1
+        self._wake.set()
+        return self._appended
+
+    def _wait_durable(self, seq):
+        with self._synced:
+            while self._durable < seq and not self._closed:
+                self._synced.wait(1.0)
+
+    def _sync_loop(self):
+        while not self._closed:
+            self._wake.wait()
+            if self._closed:
+                break
+            # Let concurrent writers join this batch
+            time.sleep(self.sync_window)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Registry: journal sync failed: {e}")
+                # Writers are still waiting on it: retry shortly
+                time.sleep(1.0)
+                self._wake.set()
+                continue
+            if self._entries >= self.compact_after and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self.compact, daemon=True).start()
+
+    def flush(self):
+        """fsync the journal; wakes every writer whose change it covers."""
+        with self._sync_lock:
+            with self._lock:
+                seq = self._appended
+                self._journal.flush()
+            if seq > self._durable:
+                os.fsync(self._journal.fileno())
+                self.syncs += 1
+        self._mark_durable(seq)
+
+    def _mark_durable(self, seq):
+        with self._synced:
+            self._durable = max(self._durable, seq)
+            self._synced.notify_all()
+
+    def compact(self):
+        """Fold the journal into a new snapshot; writes continue meanwhile."""
+        try:
+            with self._sync_lock:
+                with self._lock:
+                    self._journal.flush()
+                    os.fsync(self._journal.fileno())
+                    self._journal.close()
+                    if os.path.exists(self.rotated_path):
+                        # Leftover from an interrupted compaction: it is older than the
+                        # current journal, so put it first
+                        with open(self.rotated_path, 'ab') as old, open(self.journal_path, 'rb') as cur:
+                            old.write(cur.read())
+                            old.flush()
+                            os.fsync(old.fileno())
+                        os.remove(self.journal_path)
+                    else:
+                        os.replace(self.journal_path, self.rotated_path)
+                    self._journal = open(self.journal_path, 'ab')
+                    snapshot = dict(self._data)
+                    seq = self._appended
+                    self._entries = 0
+            self._mark_durable(seq)
+            # Snapshot + rotated journal both describe this state; the rotated
+            # journal can only go once the snapshot is safely on disk
+            _write_snapshot(self.path, snapshot)
+            os.remove(self.rotated_path)
+            self.compactions += 1
+        except Exception as e:
+            print(f"Registry: journal compaction failed: {e}")
+        finally:
+            self._compacting = False
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._wake.set()
+        with self._synced:
+            self._synced.notify_all()
+        with self._sync_lock, self._lock:
+            self._journal.close()
+
+
+def create_store(backend, json_path, db_path=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """Open the registry store named by `backend` (see module docstring)."""
+    if not backend or backend == "json":
+        return JsonFileStore(json_path, flush_interval)
+    if backend == "sqlite":
+        return SqliteStore(db_path or os.path.splitext(json_path)[0] + ".db", json_path=json_path)
+    if backend == "journal":
+        return JournalStore(json_path)
+    raise ValueError(f"Unknown registry backend: {backend}")
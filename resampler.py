@@ -0,0 +1,73 @@
+"""
+Streaming polyphase resampler for 16-bit mono PCM.
+
+Converts between the negotiated call rate and whatever rate the audio device
+runs at (e.g. 16 kHz calls on a 48 kHz-only sound card, or an 8 kHz
+narrowband call). The rate ratio is reduced to L/M; a windowed-sinc low-pass
+is split into L polyphase branches and every output sample of a frame is
+computed at once with NumPy. Filter history and output phase carry over from
+one frame to the next, so frame boundaries don't click.
+"""
+
+import math
+
+import numpy as np
+
+# Filter taps per polyphase branch; more = sharper cutoff, more CPU
+TAPS_PER_PHASE = 16
+# Pass band edge as a fraction of the lower Nyquist frequency
+CUTOFF = 0.9
+KAISER_BETA = 8.0
+
+
+class PolyphaseResampler:
+    def __init__(self, in_rate, out_rate, taps_per_phase=TAPS_PER_PHASE):
+        g = math.gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = out_rate // g    # L
+        self.down = in_rate // g   # M
+        self.taps = taps_per_phase
+
+        # Low-pass at the upsampled rate, cutting at the lower of the two Nyquists
+        n = self.up * taps_per_phase
+        fc = CUTOFF * 0.5 * min(1.0, self.up / self.down) / self.up
+        t = np.arange(n) - (n - 1) / 2.0
+        h = 2 * fc * np.sinc(2 * fc * t) * np.kaiser(n, KAISER_BETA)
+        h *= self.up / h.sum()
+        # branches[p, j] = h[p + j*L], reversed along j to line up with input order
+        self.branches = h.reshape(taps_per_phase, self.up).T[:, ::-1].astype(np.float32)
+
+        self.history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        # Position of the next output sample, in 1/L input samples past the
+        # start of the next block
+        self._t = 0
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def process(self, pcm):
+        """Resample one block of 16-bit PCM bytes; returns resampled bytes."""
+        if self.passthrough:
+            return bytes(pcm)
+        x = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        n_in = x.size
+        if n_in == 0:
+            return b""
+        buf = np.concatenate((self.history, x))
+
+        ts = np.arange(self._t, n_in * self.up, self.down)
+        if ts.size:
+            n = ts // self.up    # newest input sample for each output
+            p = ts % self.up     # polyphase branch for each output
+            # Window of TAPS_PER_PHASE inputs ending at n (buf is offset by the history)
+            idx = n[:, None] + np.arange(self.taps)[None, :]
+            y = np.einsum("ij,ij->i", buf[idx], self.branches[p])
+            self._t = int(ts[-1]) + self.down - n_in * self.up
+        else:
+            y = np.zeros(0, dtype=np.float32)
+            self._t -= n_in * self.up
+
+        self.history = buf[-(self.taps - 1):]
+        return np.clip(np.round(y), -32768, 32767).astype(np.int16).tobytes()
@@ -0,0 +1,155 @@
+"""
+Single-producer/single-consumer ring buffers for the audio path.
+
+The producer only ever advances the write counter and the consumer only the
+read counter, so under the GIL neither side needs a lock. That lets a
+PortAudio callback hand audio to (or take it from) the media threads without
+ever waiting on them.
+"""
+
+import threading
+
+
+class ByteRingBuffer:
+    """Fixed-capacity SPSC ring of raw bytes, preallocated once."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        # Monotonic byte counters; position in the buffer is counter % capacity
+        self._written = 0
+        self._read = 0
+
+    def available(self):
+        """Bytes ready to be read."""
+        return self._written - self._read
+
+    def free(self):
+        """Bytes that can be written without overrunning the reader."""
+        return self.capacity - (self._written - self._read)
+
+    def write(self, data):
+        """
+        Append `data` (producer side).
+
+        All-or-nothing: returns False, writing nothing, if it doesn't fit.
+        """
+        n = len(data)
+        if n > self.free():
+            return False
+        pos = self._written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._view[pos:pos + first] = data[:first]
+        if first < n:
+            self._view[:n - first] = data[first:]
+        self._written += n
+        return True
+
+    def read(self, n):
+        """Remove and return exactly `n` bytes (consumer side), or None if fewer are buffered."""
+        if self.available() < n:
+            return None
+        pos = self._read % self.capacity
+        first = min(n, self.capacity - pos)
+        out = bytes(self._view[pos:pos + first])
+        if first < n:
+            out += bytes(self._view[:n - first])
+        self._read += n
+        return out
+
+    def clear(self):
+        """Discard everything buffered (consumer side)."""
+        self._read = self._written
+
+
+class FrameRingBuffer:
+    """
+    Fixed-capacity SPSC ring of PCM frames in one preallocated buffer.
+
+    The producer copies each frame straight into its slot; the consumer gets
+    a memoryview of the slot from peek() and releases it with consume(), so
+    no per-frame objects are allocated in between.
+
+    Policies:
+      - overrun: when all slots are full, write() drops the new frame
+        (counted in `overruns`);
+      - latency cap: when more than `max_backlog` frames are waiting, peek()
+        skips the oldest ones (counted in `dropped`).
+    """
+
+    def __init__(self, frame_bytes, capacity, max_backlog=None):
+        self.frame_bytes = frame_bytes
+        self.capacity = capacity
+        self.max_backlog = max_backlog or capacity
+        self._buf = bytearray(frame_bytes * capacity)
+        self._view = memoryview(self._buf)
+        self._lengths = [0] * capacity
+        # Optional per-slot write time (e.g. for queueing-delay tracing)
+        self._stamps = [0.0] * capacity
+        self._written = 0
+        self._read = 0
+        # Wake-up hint for a waiting consumer; the counters are the real state
+        self._readable = threading.Event()
+        self.overruns = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._written - self._read
+
+    def write(self, data, stamp=0.0):
+        """
+        Copy a frame into the ring (producer side).
+
+        Data longer than one slot is split across consecutive slots. Returns
+        False if the ring filled up before all of it was written. `stamp` is
+        kept with the frame and readable through stamp() while it is queued.
+        """
+        view = memoryview(data)
+        for offset in range(0, len(view), self.frame_bytes):
+            if self._written - self._read >= self.capacity:
+                self.overruns += 1
+                return False
+            chunk = view[offset:offset + self.frame_bytes]
+            slot = self._written % self.capacity
+            start = slot * self.frame_bytes
+            self._view[start:start + len(chunk)] = chunk
+            self._lengths[slot] = len(chunk)
+            self._stamps[slot] = stamp
+            self._written += 1
+            self._readable.set()
+        return True
+
+    def peek(self, timeout=None):
+        """
+        View of the oldest frame (consumer side), waiting up to `timeout`.
+
+        The view stays valid until consume() is called. Returns None if no
+        frame arrived in time.
+        """
+        backlog = self._written - self._read
+        if backlog > self.max_backlog:
+            self.dropped += backlog - self.max_backlog
+            self._read += backlog - self.max_backlog
+        if self._written == self._read:
+            self._readable.clear()
+            if self._written == self._read:
+                self._readable.wait(timeout)
+            if self._written == self._read:
+                return None
+        slot = self._read % self.capacity
+        start = slot * self.frame_bytes
+        return self._view[start:start + self._lengths[slot]]
+
+    def stamp(self):
+        """Stamp written with the frame returned by peek()."""
+        return self._stamps[self._read % self.capacity]
+
+    def consume(self):
+        """Release the frame returned by peek()."""
+        if self._read < self._written:
+            self._read += 1
+
+    def clear(self):
+        """Discard all queued frames (consumer side)."""
+        self._read = self._written
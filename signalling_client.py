@@ -0,0 +1,139 @@
+"""
+Client side of the registry's call push channel (long-poll).
+
+Clients used to find incoming calls by polling /call/pending every 2 s and
+wait for an answer by polling /call/status every second, so ringing and
+answering lagged by up to that much. Both endpoints now take ?wait=<s>: the
+server holds the request until something changes (a new call rings, the call
+changes state) or the wait runs out, so events arrive as soon as they happen
+with one open request per client instead of a steady stream of polls.
+
+Servers without push answer at once; the helpers then pace the loop to the
+old polling intervals, so callers work unchanged against either server.
+
+UserList keeps the contact list the same way: after one full /list it asks
+only for changes since its version (?since=), with If-None-Match so an
+unchanged list costs a 304 and no body.
+
+send_heartbeats() keeps the user online in the registry's presence; without
+it the user drops out of online contact lists and can't be called.
+"""
+
+import time
+
+import requests
+
+# How long the server may hold a request (the server caps it at 30 s)
+LONG_POLL_S = 25
+# Fallback polling intervals when the server answers immediately
+PENDING_POLL_S = 2.0
+STATUS_POLL_S = 1.0
+# Presence heartbeat interval, unless the registry asks for another
+HEARTBEAT_S = 10
+
+
+def _pace(start, interval):
+    left = interval - (time.time() - start)
+    if left > 0:
+        time.sleep(left)
+
+
+def wait_pending_calls(registry_url, username, seen=(), wait=LONG_POLL_S):
+    """
+    Calls ringing for `username` that aren't in `seen` (call IDs already
+    handled). Blocks up to `wait` seconds for one to arrive; returns [] if
+    none did or the registry couldn't be reached.
+    """
+    start = time.time()
+    calls = []
+    try:
+        resp = requests.get(f"{registry_url}/call/pending/{username}",
+                            params={"wait": wait, "exclude": ",".join(seen)}, timeout=wait + 5)
+        if resp.status_code == 200:
+            calls = [c for c in resp.json().get("pending_calls", []) if c.get("call_id") not in seen]
+    except requests.RequestException:
+        pass
+    if not calls:
+        _pace(start, PENDING_POLL_S)
+    return calls
+
+
+def wait_call_status(registry_url, call_id, known=None, wait=LONG_POLL_S):
+    """
+    Status record of a call once its status differs from `known` (or after
+    `wait` seconds); {} if the registry couldn't be reached or the call is gone.
+    """
+    start = time.time()
+    info = {}
+    try:
+        resp = requests.get(f"{registry_url}/call/status/{call_id}",
+                            params={"wait": wait, "status": known or ""}, timeout=wait + 5)
+        if resp.status_code == 200:
+            info = resp.json()
+    except requests.RequestException:
+        pass
+    if info.get("status") in (None, known):
+        _pace(start, STATUS_POLL_S)
+    return info
+
+
+def send_heartbeat(registry_url, username):
+    """Tell the registry `username` is still online; returns seconds until the next heartbeat."""
+    try:
+        resp = requests.post(f"{registry_url}/presence/heartbeat", json={"username": username}, timeout=5)
+        if resp.status_code == 200:
+            return float(resp.json().get("interval", HEARTBEAT_S))
+    except (requests.RequestException, ValueError):
+        pass
+    return HEARTBEAT_S
+
+
+def send_heartbeats(registry_url, username, active):
+    """Heartbeat loop for a daemon thread; runs while active() is true."""
+    while active():
+        interval = send_heartbeat(registry_url, username)
+        deadline = time.time() + interval
+        while active() and time.time() < deadline:
+            time.sleep(min(1.0, interval))
+
+
+class UserList:
+    """Local copy of the registry's user list, refreshed with deltas."""
+
+    def __init__(self, registry_url, online_only=False):
+        self.registry_url = registry_url
+        self.online_only = online_only
+        self.users = {}  # username -> /list entry
+        self.version = None
+        self.etag = None
+        self.names = []
+
+    def refresh(self, timeout=2):
+        """Registered usernames in order; fetches only what changed since the last refresh."""
+        params, headers = {}, {}
+        if self.online_only:
+            params["online"] = 1
+        if self.version is not None:
+            params["since"] = self.version
+            headers["If-None-Match"] = self.etag
+        try:
+            resp = requests.get(f"{self.registry_url}/list", params=params, headers=headers, timeout=timeout)
+            if resp.status_code == 200:
+                self._apply(resp.json(), resp.headers.get("ETag"))
+        except (requests.RequestException, ValueError):
+            pass
+        return self.names
+
+    def _apply(self, data, etag):
+        if "changes" in data:
+            for entry in data["changes"]:
+                if entry.get("removed"):
+                    self.users.pop(entry["username"], None)
+                else:
+                    self.users[entry["username"]] = entry
+        else:
+            self.users = {entry["username"]: entry for entry in data.get("users", [])}
+        # Servers without versions send the full list every time
+        self.version = data.get("version")
+        self.etag = etag
+        self.names = sorted(self.users)
@@ -0,0 +1,53 @@
+"""
+Startup probe for benchmark_startup.py.
+
+When PQC_STARTUP_PROBE names a file, main.py calls report() once the login
+window has been drawn: it writes the wall-clock time and the process's peak
+resident memory there as JSON and closes the app. Measuring from inside the
+app means a one-file build's unpacking parent process isn't counted as the
+app's memory.
+"""
+
+import json
+import sys
+import time
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB (None if unavailable)."""
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux KiB
+        return rss // 1024 if sys.platform == "darwin" else rss
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize // 1024
+    except Exception:
+        pass
+    return None
+
+
+def report(root, path):
+    """Record that the first window is on screen, then shut the app down."""
+    root.update_idletasks()
+    root.update()
+    with open(path, "w") as f:
+        json.dump({"window_shown": time.time(), "peak_rss_kb": peak_rss_kb(),
+                   "modules": len(sys.modules)}, f)
+    root.destroy()
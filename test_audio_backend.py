@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Headless audio devices: null and file devices, ring counters, exact frame sizes through resampling"""
+
+import os
+import shutil
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+import audio_backend
+from media_config import MediaConfig
+
+
+def write_wav(path, rate, seconds, hz=440):
+    t = np.arange(int(rate * seconds)) / rate
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((8000 * np.sin(2 * np.pi * hz * t)).astype(np.int16).tobytes())
+
+
+def test_device_selection():
+    media = MediaConfig()
+    assert isinstance(audio_backend.create_backend("null", media), audio_backend.NullAudioBackend)
+    assert isinstance(audio_backend.create_backend(None, media), audio_backend.PyAudioBackend)
+    try:
+        audio_backend.create_backend("alsa:hw0", media)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+def test_null_device_counts_overruns_and_underruns():
+    media = MediaConfig()
+    backend = audio_backend.create_backend("null", media)
+    assert backend.device_rate == media.rate and not backend.capture_resampler
+    backend.start()
+    try:
+        # Nobody reads or writes: captured frames pile up past the ring, playout runs dry
+        time.sleep(15 * media.ptime_ms / 1000)
+        counters = backend.counters()
+        assert counters["capture_overruns"] > 0 and counters["playout_underruns"] > 0
+        assert counters["playout_overruns"] == 0
+        assert backend.read_frame(timeout=1) == bytes(media.bytes_per_packet)
+        # Playout faster than the device drains it: the ring fills and frames are dropped
+        results = [backend.write_frame(bytes(media.bytes_per_packet), timeout=0) for _ in range(10)]
+        assert not all(results) and backend.playout_overruns == results.count(False)
+    finally:
+        backend.stop()
+    assert not backend.running and backend.read_frame(timeout=0.1) is None
+
+
+def test_file_device_loops_input_and_records_playout():
+    tmp = tempfile.mkdtemp()
+    try:
+        media = MediaConfig()
+        source, sink = os.path.join(tmp, "in.wav"), os.path.join(tmp, "out.wav")
+        write_wav(source, media.rate, 0.1)
+        with wave.open(source, "rb") as w:
+            pcm = w.readframes(w.getnframes())
+        backend = audio_backend.create_backend(f"file:{source},{sink}", media)
+        backend.start()
+        try:
+            captured = b""
+            for _ in range(10):
+                frame = backend.read_frame(timeout=1)
+                captured += frame
+                # Loopback: play back what was captured
+                backend.write_frame(frame)
+        finally:
+            backend.stop()
+        # The microphone is in.wav, looped (100 ms = 5 frames)
+        assert captured == pcm * 2
+        with wave.open(sink, "rb") as w:
+            assert (w.getnchannels(), w.getsampwidth(), w.getframerate()) == (1, 2, media.rate)
+            played = w.readframes(w.getnframes())
+        # Everything the device played went to out.wav: silence until playout began, then the loop
+        assert len(played) % media.bytes_per_packet == 0 and len(played) >= len(captured)
+        start = played.index(pcm[:media.bytes_per_packet])
+        assert not any(played[:start])
+        assert played[start:start + len(pcm)] == pcm
+        assert backend.playout_underruns > 0 and backend.capture_overruns == 0
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_resampled_frames_are_exactly_one_packet():
+    tmp = tempfile.mkdtemp()
+    try:
+        for device_rate, ptime in ((22050, 10), (11025, 20)):
+            media = MediaConfig(ptime_ms=ptime)
+            source = os.path.join(tmp, f"in{device_rate}.wav")
+            write_wav(source, device_rate, 0.5)
+            backend = audio_backend.create_backend(f"file:{source}", media)
+            assert backend.device_rate == device_rate and backend.capture_resampler
+            backend.start()
+            try:
+                for _ in range(30):
+                    frame = backend.read_frame(timeout=1)
+                    assert len(frame) == media.bytes_per_packet, (device_rate, ptime, len(frame))
+                    # Playout is resampled the other way: the ring only ever holds whole device frames
+                    backend.write_frame(frame)
+                    assert backend.playout_ring.available() % backend.frame_bytes == 0
+            finally:
+                backend.stop()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    test_device_selection()
+    test_null_device_counts_overruns_and_underruns()
+    test_file_device_loops_input_and_records_playout()
+    test_resampled_frames_are_exactly_one_packet()
+    print("OK")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Built-in codecs: round-trip quality, payload size per ptime, and the optional Opus fallback"""
+
+import numpy as np
+
+import audio_codec
+import media_config
+from media_config import SUPPORTED_PTIMES_MS, SUPPORTED_RATES
+
+# Minimum round-trip SNR on a voice-like signal, in dB
+MIN_SNR_DB = {"pcm": float("inf"), "pcmu": 30, "adpcm": 20}
+
+
+def voice(rate, frames, seed=0):
+    t = np.arange(frames) / rate
+    rng = np.random.default_rng(seed)
+    signal = sum(a * np.sin(2 * np.pi * f * t + rng.uniform(0, 6)) for a, f in ((6000, 180), (3000, 720), (1000, 2400)))
+    return np.clip(signal * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)), -32768, 32767).astype(np.int16)
+
+
+def snr_db(clean, decoded):
+    a = clean.astype(np.float64)
+    b = np.frombuffer(decoded, dtype=np.int16).astype(np.float64)
+    noise = np.sum((a - b) ** 2)
+    return float("inf") if noise == 0 else 10 * np.log10(np.sum(a ** 2) / noise)
+
+
+def test_round_trip_quality():
+    for name in ("pcm", "pcmu", "adpcm"):
+        for rate in SUPPORTED_RATES:
+            n = rate * 20 // 1000
+            codec = audio_codec.create_codec(name, rate, n)
+            pcm = voice(rate, 50 * n)
+            decoded = b"".join(codec.decode(codec.encode(pcm[i:i + n].tobytes())) for i in range(0, pcm.size, n))
+            assert len(decoded) == pcm.nbytes
+            assert snr_db(pcm, decoded) >= MIN_SNR_DB[name], (name, rate, snr_db(pcm, decoded))
+
+
+def test_mulaw_is_exact_on_its_own_levels():
+    # Every mu-law code decodes to a level that encodes back to the same code
+    codes = bytes(range(256))
+    levels = audio_codec.mulaw_decode(codes)
+    assert audio_codec.mulaw_decode(audio_codec.mulaw_encode(levels)) == levels
+
+
+def test_adpcm_frames_decode_independently():
+    codec = audio_codec.create_codec("adpcm", 16000, 320)
+    pcm = voice(16000, 960)
+    payloads = [codec.encode(pcm[i:i + 320].tobytes()) for i in range(0, 960, 320)]
+    # A fresh decoder (as after a lost packet) decodes the last frame alone as well as the first did
+    fresh = audio_codec.create_codec("adpcm", 16000, 320)
+    assert fresh.decode(payloads[2]) == codec.decode(payloads[2])
+    assert snr_db(pcm[640:], fresh.decode(payloads[2])) >= MIN_SNR_DB["adpcm"]
+
+
+def test_encoded_size_per_ptime():
+    for name in ("pcm", "pcmu", "adpcm"):
+        cls = audio_codec.CODECS[name]
+        for rate in SUPPORTED_RATES:
+            for ptime in SUPPORTED_PTIMES_MS:
+                n = rate * ptime // 1000
+                payload = audio_codec.create_codec(name, rate, n).encode(voice(rate, n).tobytes())
+                assert len(payload) == cls.encoded_size(n, rate), (name, rate, ptime)
+                media = media_config.MediaConfig(ptime_ms=ptime, rate=rate, codec=name)
+                assert media.payload_bytes == len(payload)
+    # Compression ratios the negotiation relies on
+    assert audio_codec.MuLawCodec.encoded_size(320, 16000) == 320
+    assert audio_codec.AdpcmCodec.encoded_size(320, 16000) == 163
+
+
+def test_opus_is_optional():
+    assert audio_codec.available_codecs()[-1] == "pcm"
+    assert ("opus" in audio_codec.available_codecs()) == audio_codec.HAS_OPUS
+    # A peer offering Opus to a build without it gets the next codec both support
+    answer = media_config.select_answer({"codec": ["opus", "adpcm", "pcm"]}, supported_codecs=["adpcm", "pcmu", "pcm"])
+    assert answer["codec"] == "adpcm"
+    assert media_config.select_answer({"codec": ["opus"]}, supported_codecs=["adpcm", "pcm"])["codec"] == "pcm"
+    # Names this build can't instantiate fall back to raw PCM
+    assert isinstance(audio_codec.create_codec("speex", 16000, 320), audio_codec.PCMCodec)
+    expected = audio_codec.OpusCodec if audio_codec.HAS_OPUS else audio_codec.PCMCodec
+    assert type(audio_codec.create_codec("opus", 16000, 320)) is expected
+
+
+if __name__ == "__main__":
+    test_round_trip_quality()
+    test_mulaw_is_exact_on_its_own_levels()
+    test_adpcm_frames_decode_independently()
+    test_encoded_size_per_ptime()
+    test_opus_is_optional()
+    print("OK")
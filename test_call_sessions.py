@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Call session lifetimes and the per-callee ringing index"""
+
+import call_sessions
+from benchmark_signalling import populate
+
+
+class CountingDict(dict):
+    """Session table that counts lookups and refuses to be scanned."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+    def _scan(self, *args):
+        raise AssertionError("scanned the whole session table")
+
+    __iter__ = keys = values = items = _scan
+
+
+def test_pending_reads_only_ringing_sessions():
+    sessions = call_sessions.CallSessions()
+    populate(sessions, 10000, callees=1000)
+    sessions._calls = CountingDict(sessions._calls)
+    # An idle lobby poll touches no session at all ...
+    assert sessions.pending_for("nobody") == []
+    assert not sessions.pending_ready("nobody")
+    assert sessions._calls.lookups == 0
+    # ... and a callee's poll only the calls ringing for them, whatever else is stored
+    pending = sessions.pending_for("user0")
+    assert len(pending) == 10 and all(call["status"] == call_sessions.RINGING for call in pending)
+    assert sessions._calls.lookups == 10
+
+
+def test_sessions_expire():
+    now = [0.0]
+    sessions = call_sessions.CallSessions(ringing_timeout=60, active_timeout=3600, retention=60,
+                                          clock=lambda: now[0])
+    populate(sessions, 1000, callees=10)
+    assert sessions.stats()["sessions_ended"] == 900
+    now[0] = 61
+    sessions.expire()
+    # Finished calls are gone; unanswered ones are now ended (and visible as such) ...
+    stats = sessions.stats()
+    assert stats["sessions"] == 100 and stats["sessions_ended"] == 100 and stats["sessions_timed_out"] == 100
+    assert all(not sessions.pending_for(f"user{i}") for i in range(10))
+    # ... until their own retention runs out
+    now[0] = 122
+    sessions.expire()
+    assert len(sessions) == 0 and sessions.stats()["session_bytes"] == 0
+
+
+if __name__ == "__main__":
+    test_pending_reads_only_ringing_sessions()
+    test_sessions_expire()
+    print("OK")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Echo canceller: echo reduction and CPU per frame on a synthetic call"""
+
+from benchmark_aec import echo_reduction_db, run, synthesize
+from echo_canceller import EchoCanceller
+
+
+def test_echo_canceller():
+    far, mic, echo = synthesize(16000, 10)
+    aec, out = run(16000, 20, far, mic)
+    assert echo_reduction_db(out, echo, 16000) > 20
+    assert aec.cpu_report()["avg_ms"] < 20
+
+
+def test_short_frames_pass_through():
+    # A 11025 Hz device resampled to 16 kHz delivers 320- and 319-sample frames
+    far, mic, _ = synthesize(16000, 1)
+    aec = EchoCanceller(16000, 320)
+    pos = 0
+    for i in range(40):
+        n = 320 - i % 2
+        out = aec.process(mic[pos:pos + n].tobytes(), far[pos:pos + n].tobytes())
+        assert len(out) == 2 * n
+        pos += n
+    assert aec.frames == 40
+    assert len(aec.process(mic[:320].tobytes(), None)) == 640
+
+
+if __name__ == "__main__":
+    test_echo_canceller()
+    test_short_frames_pass_through()
+    print("OK")
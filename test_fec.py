@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Redundant audio (FEC): payload layout, and lost frames rebuilt from the next packet"""
+
+import socket
+
+import numpy as np
+
+import fec
+from main import NetworkHandler
+from media_config import MediaConfig
+
+RATE = 16000
+FRAMES = 320  # 20 ms
+KEY = bytes(range(32))
+
+
+def speech(frames):
+    t = np.arange(frames * FRAMES) / RATE
+    pcm = (6000 * np.sin(2 * np.pi * 180 * t) + 2000 * np.sin(2 * np.pi * 530 * t)).astype(np.int16)
+    return [pcm[i * FRAMES:(i + 1) * FRAMES].tobytes() for i in range(frames)]
+
+
+def snr_db(clean, decoded):
+    a = np.frombuffer(clean, dtype=np.int16).astype(np.float64)
+    b = np.frombuffer(decoded, dtype=np.int16).astype(np.float64)
+    return 10 * np.log10(np.sum(a ** 2) / max(np.sum((a - b) ** 2), 1e-9))
+
+
+def test_payload_carries_previous_frames():
+    frames = speech(4)
+    encoder = fec.RedundancyEncoder(2, RATE, FRAMES)
+    decoder = fec.create_decoder(RATE, FRAMES)
+    payloads = [encoder.pack(i, frame, b"primary%d" % i) for i, frame in enumerate(frames)]
+    # The first packet has nothing to repeat yet
+    assert fec.unpack(payloads[0]) == ({}, b"primary0")
+    redundant, primary = fec.unpack(payloads[1])
+    assert primary == b"primary1" and list(redundant) == [1]
+    # From then on, the previous `depth` frames ride along
+    redundant, primary = fec.unpack(payloads[3])
+    assert primary == b"primary3" and sorted(redundant) == [1, 2]
+    assert snr_db(frames[2], decoder.decode(redundant[1])) > 15
+    assert snr_db(frames[1], decoder.decode(redundant[2])) > 15
+    assert encoder.redundant_bytes == sum(len(p) - len(b"primaryN") for p in payloads)
+
+
+def test_index_gaps_drop_stale_copies():
+    encoder = fec.RedundancyEncoder(1, RATE, FRAMES)
+    frames = speech(2)
+    encoder.pack(0, frames[0], b"")
+    # Frame 5 follows a sender-side gap: frame 0 is too old to repeat
+    assert fec.unpack(encoder.pack(5, frames[1], b"")) == ({}, b"")
+
+
+def test_lost_frame_is_rebuilt_from_the_next_packet():
+    media = MediaConfig(rate=RATE, fec_depth=1)
+    frames = speech(3)
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink.settimeout(2)
+    tx, rx = NetworkHandler(), NetworkHandler()
+    for net in (tx, rx):
+        net.configure_media(media)
+        net.set_session_key(KEY)
+    tx.target_ip, tx.target_port = sink.getsockname()
+    try:
+        packets = []
+        for frame in frames:
+            tx.send_data(frame)
+            packets.append(sink.recvfrom(65536)[0])
+        assert rx.process_incoming_packet(packets[0])[0] == frames[0]
+        # packets[1] is lost; packets[2] carries a copy of its frame
+        clear, _ = rx.process_incoming_packet(packets[2])
+        assert clear == frames[2]
+        assert rx.fec_recovered == 1 and rx.sequence.lost == 1
+        assert len(rx.concealed_frames) == 1 and snr_db(frames[1], rx.concealed_frames[0]) > 15
+    finally:
+        sink.close()
+        tx.sock.close()
+        rx.sock.close()
+
+
+if __name__ == "__main__":
+    test_payload_carries_previous_frames()
+    test_index_gaps_drop_stale_copies()
+    test_lost_frame_is_rebuilt_from_the_next_packet()
+    print("OK")
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""Cold start: importing main must not pull in the heavy libraries"""
+
+from profile_imports import import_profile
+
+
+def test_main_import_is_lean():
+    modules = {name for name, _, _ in import_profile("main")}
+    for heavy in ("matplotlib", "pyaudio", "pqc.kem.kyber512", "pydub", "cryptography.hazmat.primitives.ciphers.aead"):
+        assert heavy not in modules, f"{heavy} imported before first use"
+
+
+if __name__ == "__main__":
+    test_main_import_is_lean()
+    print("OK")
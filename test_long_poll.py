@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Long-polled /call/pending and /call/status on the threaded and the asyncio registry servers"""
+
+import threading
+import time
+
+import requests
+
+import signalling_client
+from test_registry_concurrency import serving, start_async_server, start_server
+
+USERS = ("alice", "bob")
+
+
+def initiate(url):
+    resp = requests.post(f"{url}/call/initiate", json={"caller": "alice", "callee": "bob", "caller_listen_port": 5555,
+                                                       "session_key_ciphertext": "00"}, timeout=10)
+    assert resp.status_code == 200, resp.text
+    return resp.json()["call_id"]
+
+
+def in_background(target):
+    """Runs target() in a thread; returns a function that joins it and returns the result and when it returned."""
+    got = {}
+
+    def run():
+        got["result"] = target()
+        got["at"] = time.time()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+
+    def join():
+        thread.join(15)
+        return got["result"], got["at"]
+
+    return join
+
+
+def check_ring_wakes_the_callee(url):
+    start = time.time()
+    join = in_background(lambda: signalling_client.wait_pending_calls(url, "bob", wait=10))
+    time.sleep(0.5)
+    call_id = initiate(url)
+    initiated = time.time()
+    calls, rang_at = join()
+    assert [c["call_id"] for c in calls] == [call_id]
+    assert rang_at - start >= 0.4 and rang_at - initiated < 0.3
+    # Already-seen calls don't wake the callee again
+    start = time.time()
+    assert signalling_client.wait_pending_calls(url, "bob", seen={call_id}, wait=1) == []
+    assert time.time() - start >= 0.9
+
+
+def check_answer_wakes_the_caller(url):
+    call_id = initiate(url)
+    join = in_background(lambda: signalling_client.wait_call_status(url, call_id, "ringing", wait=10))
+    time.sleep(0.5)
+    requests.post(f"{url}/call/accept", json={"call_id": call_id}, timeout=10)
+    accepted = time.time()
+    status, answered_at = join()
+    assert status["status"] == "active" and answered_at - accepted < 0.3
+    # Status the caller already knows about keeps it waiting until the wait runs out
+    start = time.time()
+    assert signalling_client.wait_call_status(url, call_id, "active", wait=1)["status"] == "active"
+    assert time.time() - start >= 0.9
+
+
+def test_threaded_server_pushes_rings():
+    with serving(start_server, users=USERS) as url:
+        check_ring_wakes_the_callee(url)
+
+
+def test_threaded_server_pushes_answers():
+    with serving(start_server, users=USERS) as url:
+        check_answer_wakes_the_caller(url)
+
+
+def test_async_server_pushes_rings():
+    with serving(start_async_server, users=USERS) as url:
+        check_ring_wakes_the_callee(url)
+
+
+def test_async_server_pushes_answers():
+    with serving(start_async_server, users=USERS) as url:
+        check_answer_wakes_the_caller(url)
+
+
+if __name__ == "__main__":
+    test_threaded_server_pushes_rings()
+    test_threaded_server_pushes_answers()
+    test_async_server_pushes_rings()
+    test_async_server_pushes_answers()
+    print("OK")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Sequence-gap loss accounting and packet-loss concealment"""
+
+import numpy as np
+
+from loss_concealment import MAX_CONCEAL_MS, PacketLossConcealer, SequenceTracker
+
+RATE = 16000
+FRAMES = 320  # 20 ms
+
+
+def test_gaps_count_as_loss():
+    seq = SequenceTracker()
+    assert [seq.arrival(i) for i in (10, 11, 14, 15)] == [0, 0, 2, 0]
+    assert (seq.received, seq.lost, seq.expected) == (4, 2, 6)
+    assert round(seq.loss_percent, 1) == 33.3
+
+
+def test_reordered_packet_is_late_not_lost():
+    seq = SequenceTracker()
+    for i in (0, 1, 3, 4):
+        seq.arrival(i)
+    assert seq.lost == 1
+    # The missing packet turns up after its successors: not played, no longer lost
+    assert seq.arrival(2) == -1
+    assert (seq.received, seq.lost, seq.late, seq.duplicates) == (5, 0, 1, 0)
+
+
+def test_duplicates_are_dropped():
+    seq = SequenceTracker()
+    for i in (0, 1, 3):
+        seq.arrival(i)
+    assert seq.arrival(3) == -1 and seq.arrival(1) == -1
+    assert seq.arrival(2) == -1
+    # A second copy of the late packet is a duplicate too
+    assert seq.arrival(2) == -1
+    assert (seq.received, seq.lost, seq.late, seq.duplicates) == (4, 0, 1, 3)
+
+
+def test_index_wraps_around():
+    seq = SequenceTracker()
+    assert seq.arrival(0xFFFFFFFE) == 0
+    assert seq.arrival(0xFFFFFFFF) == 0
+    # 0 was lost across the wrap, 1 follows on
+    assert seq.arrival(1) == 1
+    assert seq.arrival(0) == -1
+    assert seq.arrival(0xFFFFFFFF) == -1
+    assert seq.arrival(2) == 0
+    assert (seq.received, seq.lost, seq.late, seq.duplicates) == (5, 0, 1, 1)
+
+
+def tone(frames, hz=200):
+    t = np.arange(frames * FRAMES) / RATE
+    pcm = (8000 * np.sin(2 * np.pi * hz * t)).astype(np.int16)
+    return [pcm[i * FRAMES:(i + 1) * FRAMES].tobytes() for i in range(frames)]
+
+
+def test_concealment_continues_the_pitch_and_fades_out():
+    plc = PacketLossConcealer(RATE, FRAMES)
+    good = tone(11)
+    for frame in good[:10]:
+        assert plc.good_frame(frame) == frame
+    concealed = plc.conceal(4)
+    assert len(concealed) == 4 and all(len(f) == 2 * FRAMES for f in concealed)
+    # The first concealed frame tracks the voice it replaces ...
+    first = np.frombuffer(concealed[0], dtype=np.int16).astype(np.float64)
+    lost = np.frombuffer(good[10], dtype=np.int16).astype(np.float64)
+    assert np.corrcoef(first, lost)[0, 1] > 0.9
+    # ... and the fade takes it to silence within FADE_MS
+    energy = [np.abs(np.frombuffer(f, dtype=np.int16)).mean() for f in concealed]
+    assert energy[0] > energy[1] > energy[2] > energy[3] == 0
+    assert plc.frames_concealed == 4
+
+
+def test_concealment_is_capped():
+    plc = PacketLossConcealer(RATE, FRAMES)
+    for frame in tone(10):
+        plc.good_frame(frame)
+    assert len(plc.conceal(1000)) == MAX_CONCEAL_MS * RATE // 1000 // FRAMES
+
+
+def test_resumption_is_cross_faded():
+    plc = PacketLossConcealer(RATE, FRAMES)
+    frames = tone(12)
+    for frame in frames[:10]:
+        plc.good_frame(frame)
+    plc.conceal(1)
+    resumed = plc.good_frame(frames[11])
+    assert len(resumed) == len(frames[11]) and resumed != frames[11]
+    # Only the first few milliseconds are blended
+    assert resumed[2 * RATE * 4 // 1000:] == frames[11][2 * RATE * 4 // 1000:]
+    # Without concealment in between, frames pass through untouched
+    assert plc.good_frame(frames[10]) == frames[10]
+
+
+if __name__ == "__main__":
+    test_gaps_count_as_loss()
+    test_reordered_packet_is_late_not_lost()
+    test_duplicates_are_dropped()
+    test_index_wraps_around()
+    test_concealment_continues_the_pitch_and_fades_out()
+    test_concealment_is_capped()
+    test_resumption_is_cross_faded()
+    print("OK")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Call metrics: histogram percentiles, RFC 3550 jitter and the exporters"""
+
+import json
+import math
+import random
+import urllib.error
+import urllib.request
+
+import metrics
+
+
+def exact_percentile(values, q):
+    """Nearest-rank percentile, as Histogram.percentile defines it."""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def test_percentiles_within_one_percent():
+    rng = random.Random(1)
+    distributions = {
+        "uniform": [rng.uniform(0, 200) for _ in range(20000)],
+        "lognormal": [rng.lognormvariate(3, 1.2) for _ in range(20000)],
+        "bimodal": [rng.gauss(20, 2) if rng.random() < 0.9 else rng.gauss(400, 30) for _ in range(20000)],
+    }
+    for name, values in distributions.items():
+        h = metrics.Histogram()
+        for v in values:
+            h.record(v)
+        for q in (0.5, 0.95, 0.99):
+            expected = exact_percentile(values, q)
+            # ~1% relative, plus the 1 us recording resolution
+            assert abs(h.percentile(q) - expected) <= 0.01 * expected + 0.001, (name, q, h.percentile(q), expected)
+        assert h.count == len(values)
+        assert abs(h.mean - sum(values) / len(values)) < 0.001
+
+
+def test_histogram_edges():
+    h = metrics.Histogram(highest=100.0)
+    assert h.percentile(0.5) == 0.0 and h.mean == 0.0
+    for v in (-5, 0, 3, 250):
+        h.record(v)
+    # Negative values clamp to 0, values past `highest` saturate at it
+    assert h.summary()["min"] == 0.0 and h.summary()["max"] == 100.0 and h.saturated == 1
+    assert h.percentile(1.0) == 100.0 and h.percentile(0.0) == 0.0
+    h.reset()
+    assert h.count == 0 and h.percentile(0.99) == 0.0 and h.min is None
+
+
+def test_rfc3550_jitter():
+    steady = metrics.CallMetrics()
+    for i in range(50):
+        # Peer clock 5 s ahead: transit is negative but constant, so no jitter
+        steady.on_packet(100.0 + i * 0.02 + 5, 100.0 + i * 0.02 + 0.030)
+    assert abs(steady.jitter_ms) < 1e-6 and steady.last_latency_ms == 0.0
+    assert steady.interarrival.count == 49 and abs(steady.interarrival.percentile(0.5) - 20) < 0.2
+
+    jittery = metrics.CallMetrics()
+    # Transit alternates 30 / 40 ms: |D| = 10 ms for every packet after the first
+    for i in range(40):
+        jittery.on_packet(i * 0.02, i * 0.02 + (0.030 if i % 2 else 0.040))
+    expected = 10 * (1 - (15 / 16) ** 39)
+    assert abs(jittery.jitter_ms - expected) < 1e-6
+    assert jittery.jitter.count == 39 and jittery.latency.count == 40
+    assert abs(jittery.latency.percentile(0.99) - 40) < 0.5
+
+
+def sample_snapshot():
+    h = metrics.Histogram()
+    for v in range(1, 101):
+        h.record(v)
+    return metrics.snapshot({"latency_ms": h}, {"packets_lost": 3}, {"jitter_ms": 1.5})
+
+
+def test_exporters():
+    snap = sample_snapshot()
+    assert json.loads(metrics.to_json(snap)) == snap
+    text = metrics.to_prometheus(snap)
+    lines = text.splitlines()
+    assert "# TYPE pqc_voice_packets_lost_total counter" in lines and "pqc_voice_packets_lost_total 3" in lines
+    assert "pqc_voice_jitter_ms 1.5" in lines
+    assert "# TYPE pqc_voice_latency_ms summary" in lines
+    median = next(line for line in lines if line.startswith('pqc_voice_latency_ms{quantile="0.5"} '))
+    assert abs(float(median.split()[1]) - 50) <= 0.5
+    assert sum(line.startswith("pqc_voice_latency_ms{quantile=") for line in lines) == len(metrics.QUANTILES)
+    assert "pqc_voice_latency_ms_count 100" in lines and "pqc_voice_latency_ms_sum 5050.0" in lines
+
+    server = metrics.serve(0, sample_snapshot)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as resp:
+            assert resp.read().decode() == text and resp.headers["Content-Type"].startswith("text/plain")
+        with urllib.request.urlopen(f"{url}/metrics.json", timeout=5) as resp:
+            assert json.load(resp) == snap
+        try:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+            assert False, "expected 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_percentiles_within_one_percent()
+    test_histogram_edges()
+    test_rfc3550_jitter()
+    test_exporters()
+    print("OK")
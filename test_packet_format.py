@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Voice packet layout: typed packets only when negotiated, the original layout otherwise"""
+
+import os
+import socket
+import struct
+import time
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+import crypto_utils
+import media_config
+from main import NetworkHandler
+from media_config import MediaConfig
+
+KEY = bytes(range(32))
+
+
+def handler(media, target=None):
+    net = NetworkHandler()
+    net.configure_media(media)
+    net.set_session_key(KEY)
+    if target:
+        net.target_ip, net.target_port = target
+    return net
+
+
+def capture(media, frame):
+    """send_data(frame) with `media`; returns the datagram that went out."""
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink.settimeout(2)
+    tx = handler(media, sink.getsockname())
+    try:
+        tx.send_data(frame)
+        return sink.recvfrom(65536)[0]
+    finally:
+        sink.close()
+        tx.sock.close()
+
+
+def legacy_packet(frame, idx):
+    """A packet as a peer without media negotiation builds it: timestamp + obfuscated PCM."""
+    nonce = os.urandom(12)
+    index_bytes = idx.to_bytes(4, 'big')
+    plaintext = struct.pack('!d', time.time()) + crypto_utils.obfuscate_audio(frame, KEY, idx)
+    return nonce + index_bytes + AESGCM(KEY).encrypt(nonce, plaintext, associated_data=index_bytes)
+
+
+def test_unnegotiated_call_keeps_original_layout():
+    media = MediaConfig()
+    assert not media.typed_packets
+    frame = os.urandom(media.bytes_per_packet)
+    packet = capture(media, frame)
+    plaintext = AESGCM(KEY).decrypt(packet[:12], packet[16:], associated_data=packet[12:16])
+    # No kind byte: the audio starts right after the timestamp
+    assert crypto_utils.deobfuscate_audio(plaintext[8:], KEY, 0) == frame
+
+    rx = handler(media)
+    clear, _ = rx.process_incoming_packet(legacy_packet(frame, 0))
+    assert clear == frame and rx.auth_failures == 0
+    rx.sock.close()
+
+
+def test_negotiated_call_carries_packet_kind():
+    media = MediaConfig(dtx=True)
+    assert media.typed_packets
+    loud = (b"\xff\x7f\x01\x80" * media.frames_per_packet)[:media.bytes_per_packet]
+    packet = capture(media, loud)
+    plaintext = AESGCM(KEY).decrypt(packet[:12], packet[16:], associated_data=packet[12:16])
+    assert plaintext[8] == media_config.KIND_AUDIO
+
+    rx = handler(media)
+    clear, _ = rx.process_incoming_packet(packet)
+    assert clear == loud and rx.auth_failures == 0
+    rx.sock.close()
+
+
+if __name__ == "__main__":
+    test_unnegotiated_call_keeps_original_layout()
+    test_negotiated_call_carries_packet_kind()
+    print("OK")
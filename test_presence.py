@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Presence: timer-wheel expiry, listeners, and online status through the registry"""
+
+import os
+import shutil
+import tempfile
+
+import key_registry_server
+import presence
+import registry_service
+import registry_store
+from test_registry_concurrency import PUBLIC_KEY
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_heartbeats_push_back_the_deadline():
+    clock = FakeClock()
+    users = presence.Presence(ttl=30, clock=clock, wall_clock=lambda: 1700000000.0 + clock.now)
+    changes = []
+    users.add_listener(lambda username, online, last_seen: changes.append((username, online, last_seen)))
+    assert users.beat("alice") and users.beat("bob")
+    assert not users.beat("alice")
+    clock.now = 20
+    users.beat("alice")
+    assert users.advance() == 0
+    clock.now = 29.9
+    assert users.advance() == 0 and users.is_online("bob")
+    clock.now = 30
+    assert users.advance() == 1
+    assert users.is_online("alice") and not users.is_online("bob")
+    assert users.last_seen("bob") == 1700000000.0
+    clock.now = 50
+    assert users.advance() == 1 and not users.is_online("alice")
+    # Only transitions reach listeners, never the heartbeats in between
+    assert changes == [("alice", True, 1700000000.0), ("bob", True, 1700000000.0),
+                       ("bob", False, 1700000000.0), ("alice", False, 1700000020.0)]
+    assert users.stats() == {"presence_online": 0, "presence_heartbeats": 4, "presence_expired": 2}
+
+
+def test_ttl_longer_than_the_wheel_turns():
+    """A deadline many ticks ahead survives the wheel coming round, and a late advance catches up."""
+    clock = FakeClock()
+    users = presence.Presence(ttl=5, tick=1.0, clock=clock)
+    users.beat("alice")
+    for second in range(1, 100):
+        clock.now = second
+        users.beat("alice")
+        if second == 50:
+            users.beat("bob")
+        users.advance()
+    assert users.is_online("alice") and not users.is_online("bob")
+    clock.now = 1000
+    assert users.advance() == 1 and users.stats()["presence_online"] == 0
+
+
+def test_drop_takes_a_user_offline_now():
+    clock = FakeClock()
+    users = presence.Presence(ttl=30, clock=clock, wall_clock=lambda: 1700000000.0 + clock.now)
+    users.beat("alice")
+    clock.now = 5
+    users.drop("alice")
+    assert not users.is_online("alice") and users.last_seen("alice") == 1700000005.0
+    clock.now = 40
+    assert users.advance() == 0
+    users.drop("alice", forget=True)
+    assert users.last_seen("alice") is None
+
+
+def test_registry_presence():
+    """Users who stop heartbeating go offline on time, and heartbeats never touch the store."""
+    tmp = tempfile.mkdtemp()
+    original = key_registry_server.SERVICE
+    clock = FakeClock()
+    try:
+        store = registry_store.create_store("journal", os.path.join(tmp, "key_registry.json"))
+        users_online = presence.Presence(ttl=30, clock=clock)
+        key_registry_server.SERVICE = registry_service.RegistryService(store, original.sessions, users_online)
+        client = key_registry_server.app.test_client()
+        for name in ("alice", "bob", "carol"):
+            client.post("/register", json={"username": name, "public_key": PUBLIC_KEY,
+                                           "listening_ip": "10.0.0.1", "listening_port": 5000})
+        version = client.get("/list?online=1").json["version"]
+        journal = os.path.getsize(store.journal_path)
+        for second in range(1, 61):
+            clock.now = second
+            client.post("/presence/heartbeat", json={"username": "alice"})
+            if second <= 20:
+                client.post("/presence/heartbeat", json={"username": "bob"})
+            users_online.advance()
+        assert os.path.getsize(store.journal_path) == journal
+        # carol went quiet at 0 s, bob at 20 s: both offline 30 s later, alice still online
+        listed = client.get("/list?online=1").json
+        assert [u["username"] for u in listed["users"]] == ["alice"] and listed["total_users"] == 1
+        delta = client.get(f"/list?online=1&since={version}").json["changes"]
+        assert delta == [{"username": "bob", "removed": True}, {"username": "carol", "removed": True}]
+        bob = client.get("/users/bob").json
+        assert bob["online"] is False and bob["last_seen"]
+        assert client.get("/list").json["total_users"] == 3
+        resp = client.post("/call/initiate", json={"caller": "alice", "callee": "bob", "caller_listen_port": 5555,
+                                                   "session_key_ciphertext": "00"})
+        assert resp.status_code == 409 and resp.json["online"] is False
+        assert client.post("/presence/heartbeat", json={"username": "bob"}).status_code == 200
+        assert client.get("/users/bob").json["online"] is True
+        assert client.post("/presence/heartbeat", json={"username": "nobody"}).status_code == 404
+        stats = client.get("/stats").json
+        assert stats["presence_online"] == 2 and stats["presence_expired"] == 2
+        store.close()
+    finally:
+        key_registry_server.SERVICE = original
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    test_heartbeats_push_back_the_deadline()
+    test_ttl_longer_than_the_wheel_turns()
+    test_drop_takes_a_user_offline_now()
+    test_registry_presence()
+    print("OK")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Receiver reports: wire format, control packet indexes, and RTT from echoed timestamps"""
+
+import socket
+
+from loss_concealment import SequenceTracker
+from main import NetworkHandler
+from media_config import MediaConfig
+from receiver_report import CONTROL_INDEX_FLAG, ReceiverReport, ReportSession
+
+KEY = bytes(range(32))
+
+
+def test_pack_round_trip():
+    report = ReceiverReport(1234.5, 0x80000005, 17, 64, 3.25, 1200.25, 0.125)
+    back = ReceiverReport.unpack(report.pack() + b"trailing")
+    assert (back.sent_at, back.cumulative_lost, back.fraction_lost, back.jitter_ms, back.echo_ts, back.echo_delay) \
+        == (1234.5, 17, 64, 3.25, 1200.25, 0.125)
+    # The sequence number is sent as 31 bits
+    assert back.highest_seq == 5
+    assert back.loss_percent == 25.0
+
+
+def test_control_indexes_never_look_like_audio():
+    session = ReportSession(clock=lambda: 0.0)
+    seq = SequenceTracker()
+    seq.arrival(0)
+    indexes = []
+    for _ in range(3):
+        indexes.append(session.next_index())
+        session.build(seq, 0.0)
+    assert indexes == [CONTROL_INDEX_FLAG, CONTROL_INDEX_FLAG | 1, CONTROL_INDEX_FLAG | 2]
+
+
+def test_fraction_lost_per_interval():
+    session = ReportSession(interval=1.0)
+    seq = SequenceTracker()
+    for i in range(100):
+        if i % 4:
+            seq.arrival(i)
+    first = session.build(seq, 2.0, now=10.0)
+    # Counting from the first packet received (index 1): 24 of 99 went missing
+    assert first.cumulative_lost == 24 and seq.expected == 99 and first.fraction_lost == (24 << 8) // 99
+    assert not session.due(now=10.5) and session.due(now=11.0)
+    for i in range(100, 200):
+        seq.arrival(i)
+    assert session.build(seq, 2.0, now=11.0).fraction_lost == 0
+
+
+def test_rtt_ignores_clock_offset():
+    # A's clock is 1000 s ahead of B's; 25 ms each way; B holds A's report 300 ms before replying
+    a, b = ReportSession(clock=lambda: 0.0), ReportSession(clock=lambda: 0.0)
+    seq = SequenceTracker()
+    seq.arrival(0)
+    from_a = a.build(seq, 0.0, now=1000.000).pack()
+    assert b.on_report(from_a, now=0.025).echo_ts == 0.0
+    from_b = b.build(seq, 0.0, now=0.325)
+    assert abs(from_b.echo_delay - 0.300) < 1e-9
+    a.on_report(from_b.pack(), now=1000.350)
+    assert abs(a.rtt_ms - 50.0) < 1e-6 and abs(a.smoothed_rtt_ms - 50.0) < 1e-6
+    # The next exchange takes 130 ms round trip: SRTT moves an eighth of the way
+    b.on_report(a.build(seq, 0.0, now=1001.0).pack(), now=1.065)
+    a.on_report(b.build(seq, 0.0, now=1.065).pack(), now=1001.130)
+    assert abs(a.rtt_ms - 130.0) < 1e-6 and abs(a.smoothed_rtt_ms - 60.0) < 1e-6
+    assert a.rtt.count == 2 and a.received == 2
+    # A replayed or reordered report is ignored
+    assert a.on_report(from_b.pack(), now=1002.0) is None and a.received == 2
+
+
+def test_reports_travel_outside_the_audio_sequence():
+    media = MediaConfig(reports=True)
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink.settimeout(2)
+    tx, rx = NetworkHandler(), NetworkHandler()
+    for net in (tx, rx):
+        net.configure_media(media)
+        net.set_session_key(KEY)
+    tx.target_ip, tx.target_port = sink.getsockname()
+    try:
+        tx._send_report()
+        packet = sink.recvfrom(65536)[0]
+        assert int.from_bytes(packet[12:16], 'big') & CONTROL_INDEX_FLAG
+        assert rx.process_incoming_packet(packet) == (None, None)
+        assert rx.reports.received == 1 and rx.sequence.received == 0 and rx.auth_failures == 0
+    finally:
+        sink.close()
+        tx.sock.close()
+        rx.sock.close()
+
+
+if __name__ == "__main__":
+    test_pack_round_trip()
+    test_control_indexes_never_look_like_audio()
+    test_fraction_lost_per_interval()
+    test_rtt_ignores_clock_offset()
+    test_reports_travel_outside_the_audio_sequence()
+    print("OK")
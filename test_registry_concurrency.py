@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Concurrent registration / signalling stress test against the threaded and the asyncio registry servers"""
+
+import asyncio
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import call_sessions
+import key_registry_server
+import registry_server_async
+import registry_service
+import registry_store
+
+THREADS = 32
+USERS_PER_THREAD = 25
+CALLS = 100
+PUBLIC_KEY = "ab" * 400
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_server():
+    """Flask app on a threaded server; returns (stop, url)."""
+    server = make_server("127.0.0.1", 0, key_registry_server.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown, f"http://127.0.0.1:{server.server_port}"
+
+
+def start_async_server():
+    """registry_server_async on the same service, in its own event loop thread; returns (stop, url)."""
+    loop = asyncio.new_event_loop()
+    listening = threading.Event()
+    ports = []
+
+    def ready(server):
+        ports.append(server.sockets[0].getsockname()[1])
+        listening.set()
+
+    task = loop.create_task(registry_server_async.serve(key_registry_server.SERVICE, "127.0.0.1", 0, ready))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert listening.wait(10)
+
+    def stop():
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(10)
+        loop.close()
+
+    return stop, f"http://127.0.0.1:{ports[0]}"
+
+
+@contextlib.contextmanager
+def serving(start=start_server, backend="journal", users=()):
+    """A fresh registry service in a temp dir behind the server `start` starts; yields its url."""
+    tmp = tempfile.mkdtemp()
+    original = key_registry_server.SERVICE
+    try:
+        store = registry_store.create_store(backend, os.path.join(tmp, "key_registry.json"),
+                                            os.path.join(tmp, "r.db"), flush_interval=0.05)
+        key_registry_server.SERVICE = registry_service.RegistryService(store, call_sessions.CallSessions())
+        stop, url = start()
+        try:
+            for i, username in enumerate(users):
+                register(requests, url, username, 5000 + i)
+            yield url
+        finally:
+            stop()
+            store.close()
+    finally:
+        key_registry_server.SERVICE = original
+        shutil.rmtree(tmp)
+
+
+def run_threads(target, count):
+    errors = []
+
+    def wrapped(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapped, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors[:3]
+
+
+def register(session, url, username, port):
+    resp = session.post(f"{url}/register", json={"username": username, "public_key": PUBLIC_KEY,
+                                                  "listening_ip": "10.0.0.1", "listening_port": port}, timeout=10)
+    assert resp.status_code == 201, resp.text
+
+
+def stress_registrations(url):
+    def worker(t):
+        session = requests.Session()
+        for i in range(USERS_PER_THREAD):
+            register(session, url, f"user{t}_{i}", 5000 + i)
+            # Everyone also fights over the same name
+            register(session, url, "contested", 6000 + t)
+
+    run_threads(worker, THREADS)
+    users = requests.get(f"{url}/list", timeout=10).json()["users"]
+    names = {u["username"] for u in users}
+    expected = {f"user{t}_{i}" for t in range(THREADS) for i in range(USERS_PER_THREAD)} | {"contested"}
+    assert names == expected, f"lost {len(expected - names)} registrations"
+    return expected
+
+
+def stress_calls(url):
+    """Callee accepts while the caller hangs up: every call ends in exactly one consistent state."""
+    call_ids = []
+    lock = threading.Lock()
+
+    def initiate(i):
+        resp = requests.post(f"{url}/call/initiate", json={"caller": f"user{i % THREADS}_0", "callee": "contested",
+                                                           "caller_listen_port": 5555,
+                                                           "session_key_ciphertext": "00"}, timeout=10)
+        assert resp.status_code == 200, resp.text
+        with lock:
+            call_ids.append(resp.json()["call_id"])
+
+    run_threads(initiate, CALLS)
+    assert len(set(call_ids)) == CALLS
+    pending = requests.get(f"{url}/call/pending/contested", timeout=10).json()["pending_calls"]
+    assert len(pending) == CALLS
+
+    outcomes = {}
+
+    def race(i):
+        call_id = call_ids[i // 2]
+        if i % 2:
+            code = requests.post(f"{url}/call/accept", json={"call_id": call_id}, timeout=10).status_code
+            with lock:
+                outcomes.setdefault(call_id, {})["accept"] = code
+        else:
+            code = requests.post(f"{url}/call/hangup", json={"call_id": call_id}, timeout=10).status_code
+            assert code == 200
+
+    run_threads(race, 2 * CALLS)
+    for call_id in call_ids:
+        status = requests.get(f"{url}/call/status/{call_id}", timeout=10).json()
+        assert status["status"] == "ended"
+        # Accepted before the hangup (200, answered) or refused after it (409, never answered)
+        accepted = outcomes[call_id]["accept"] == 200
+        assert outcomes[call_id]["accept"] in (200, 409)
+        assert (status["answered_at"] is not None) == accepted
+    assert requests.get(f"{url}/call/pending/contested", timeout=10).json()["pending_calls"] == []
+
+
+def check_backend(backend, start=start_server):
+    tmp = tempfile.mkdtemp()
+    original = key_registry_server.SERVICE
+    try:
+        json_path = os.path.join(tmp, "key_registry.json")
+        store = registry_store.create_store(backend, json_path, os.path.join(tmp, "r.db"), flush_interval=0.05)
+        key_registry_server.SERVICE = registry_service.RegistryService(store, original.sessions)
+        stop, url = start()
+        try:
+            expected = stress_registrations(url)
+            stress_calls(url)
+        finally:
+            stop()
+        store.close()
+        # Everything acknowledged must also have reached disk
+        reopened = registry_store.create_store(backend, json_path, os.path.join(tmp, "r.db"))
+        assert {u for u, _ in reopened.items()} == expected
+        reopened.close()
+    finally:
+        key_registry_server.SERVICE = original
+        shutil.rmtree(tmp)
+
+
+def test_json_backend_concurrency():
+    check_backend("json")
+
+
+def test_sqlite_backend_concurrency():
+    check_backend("sqlite")
+
+
+def test_journal_backend_concurrency():
+    check_backend("journal")
+
+
+def test_async_server_concurrency():
+    check_backend("journal", start_async_server)
+    check_backend("sqlite", start_async_server)
+
+
+if __name__ == "__main__":
+    for backend in registry_store.BACKENDS:
+        print(f"[{backend}] {THREADS} threads x {USERS_PER_THREAD} registrations, {CALLS} racing calls...")
+        check_backend(backend)
+        print(f"[{backend}] OK")
+    for backend in registry_store.BACKENDS:
+        print(f"[{backend}, async server] {THREADS} threads x {USERS_PER_THREAD} registrations, {CALLS} racing calls...")
+        check_backend(backend, start_async_server)
+        print(f"[{backend}, async server] OK")
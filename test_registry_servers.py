@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""The Flask and the asyncio registry servers answer every endpoint alike"""
+
+import http.client
+import json
+import shutil
+import tempfile
+
+from benchmark_registry_server import SERVERS, call, registration, start_server, stop_server
+
+VOLATILE = {"timestamp", "registered_at", "initiated_at", "answered_at", "ended_at", "last_seen",
+            "call_id", "version"}
+
+
+def normalize(body):
+    """Response body with per-run values (timestamps, call IDs) blanked."""
+    if isinstance(body, dict):
+        return {k: "*" if k in VOLATILE else normalize(v) for k, v in body.items()}
+    if isinstance(body, list):
+        return [normalize(v) for v in body]
+    return body
+
+
+def api_walkthrough(port):
+    """(method, path, status, normalized body) for one pass over every endpoint."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    steps = []
+
+    def step(method, path, body=None):
+        status, resp = call(conn, method, path, body)
+        seen = (method, path, status, normalize(resp))
+        if call_id:
+            seen = json.loads(json.dumps(seen).replace(call_id, "<call>"))
+        steps.append(seen)
+        return resp
+
+    call_id = None
+    step("POST", "/register", registration("alice", 5000))
+    step("POST", "/register", dict(registration("bob", 5001), listening_ip="internal"))
+    step("POST", "/register", registration("x", 5002))
+    step("POST", "/register", dict(registration("carol", 5003), listening_port=0))
+    step("POST", "/register", None)
+    step("GET", "/fetch/Alice")
+    step("GET", "/fetch/nobody")
+    step("GET", "/list")
+    step("POST", "/presence/heartbeat", {"username": "alice"})
+    step("POST", "/presence/heartbeat", {"username": "nobody"})
+    step("GET", "/list?online=1&limit=1")
+    step("GET", "/users/bob")
+    step("GET", "/users/nobody")
+    call_id = step("POST", "/call/initiate", {"caller": "alice", "callee": "bob", "caller_listen_port": 5555,
+                                              "session_key_ciphertext": "00" * 768,
+                                              "media_offer": {"ptime_ms": [20, 10]}})["call_id"]
+    step("POST", "/call/initiate", {"caller": "alice", "callee": "nobody", "caller_listen_port": 5555,
+                                    "session_key_ciphertext": "00"})
+    step("POST", "/call/initiate", {"caller": "alice"})
+    step("GET", "/call/pending/bob")
+    step("GET", f"/call/pending/bob?wait=1&exclude={call_id}")
+    step("GET", f"/call/status/{call_id}")
+    step("POST", "/call/accept", {"call_id": call_id, "media_answer": {"ptime_ms": 20}})
+    step("POST", "/call/accept", {"call_id": call_id})
+    step("POST", "/call/reject", {"call_id": call_id})
+    step("POST", "/call/accept", {"call_id": "nope"})
+    step("GET", f"/call/status/{call_id}?wait=1&status=active")
+    step("POST", "/call/hangup", {"call_id": call_id})
+    step("POST", "/call/hangup", {"call_id": call_id})
+    step("GET", f"/call/status/{call_id}")
+    step("GET", "/call/status/nope")
+    step("DELETE", "/unregister/bob")
+    step("DELETE", "/unregister/bob")
+    step("GET", "/health")
+    step("GET", "/stats")
+    step("GET", "/metrics")
+    step("GET", "/")
+    conn.close()
+    return steps
+
+
+def test_servers_answer_alike():
+    tmp = tempfile.mkdtemp()
+    walks = {}
+    try:
+        for name in SERVERS:
+            proc, port = start_server(name, tmp, "json")
+            try:
+                walks[name] = api_walkthrough(port)
+            finally:
+                stop_server(proc)
+    finally:
+        shutil.rmtree(tmp)
+    for flask_step, async_step in zip(walks["flask"], walks["async"]):
+        assert flask_step == async_step, (flask_step, async_step)
+    assert len(walks["flask"]) == len(walks["async"])
+
+
+if __name__ == "__main__":
+    test_servers_answer_alike()
+    print("OK")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Registry stores: JSON write-behind, journal replay and compaction, SQLite migration and address index"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import registry_store
+from benchmark_registry import record, write_journal
+
+
+def append(path, *entries):
+    """Journal lines as JournalStore appends them."""
+    with open(path, 'ab') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(',', ':')).encode() + b"\n")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_json_writes_coalesce_until_close():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        store = registry_store.JsonFileStore(path, flush_interval=3600)
+        for i in range(100):
+            store.put(f"user{i % 10}", record(i))
+        store.delete("user9")
+        # Nothing written yet: the changes wait for the flusher
+        assert store.flushes == 0 and not os.path.exists(path)
+        store.close()
+        assert store.flushes == 1
+        assert load(path) == {f"user{i}": record(90 + i) for i in range(9)}
+        # Reopened, the store reads back what it wrote; nothing left to flush
+        store = registry_store.JsonFileStore(path, flush_interval=3600)
+        assert len(store) == 9 and store.flush() is False
+        store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_json_flushes_on_the_interval():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        store = registry_store.JsonFileStore(path, flush_interval=0.05)
+        try:
+            for i in range(200):
+                store.put(f"user{i}", record(i))
+            deadline = time.time() + 5
+            while (not os.path.exists(path) or len(load(path)) < 200) and time.time() < deadline:
+                time.sleep(0.01)
+            assert len(load(path)) == 200
+            # 200 changes, a handful of file writes
+            assert 1 <= store.flushes < 20
+        finally:
+            store.close()
+        # Write-through: every change is on disk when it returns
+        store = registry_store.JsonFileStore(path, flush_interval=0)
+        flushes = store.flushes
+        store.delete("user0")
+        assert store.flushes == flushes + 1 and "user0" not in load(path)
+        store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_json_failed_write_leaves_the_old_file():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        store = registry_store.JsonFileStore(path, flush_interval=3600)
+        store.put("alice", record(1))
+        assert store.flush() is True
+        before = load(path)
+        # A record that can't be serialized fails the write part-way through the temp file
+        store.put("broken", dict(record(2), public_key=object()))
+        assert store.flush() is False
+        assert load(path) == before
+        # Still dirty: once the record is fixed the next flush writes everything
+        store.put("broken", record(2))
+        assert store.flush() is True
+        assert sorted(load(path)) == ["alice", "broken"]
+        store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_journal_survives_torn_write():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        store = registry_store.JournalStore(path, compact_after=5)
+        for i in range(12):
+            store.put(f"user{i}", record(i))
+        store.delete("user3")
+        deadline = time.time() + 5
+        while store.compactions == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        store.close()
+        assert store.compactions >= 1
+        # Crash mid-append: half a line at the end of the journal
+        with open(path + ".journal", 'ab') as f:
+            f.write(b'["put","ghost",{"public_key"')
+        store = registry_store.JournalStore(path)
+        assert len(store) == 11 and "user3" not in store and "ghost" not in store
+        assert store.get("user11")["listening_port"] == 5011
+        store.put("late", record(99))
+        store.close()
+        assert "late" in registry_store.JournalStore(path)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_journal_replays_over_snapshot():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        with open(path, 'w') as f:
+            json.dump({"old": record(0), "moved": record(1)}, f)
+        write_journal(path + ".journal", users=3, updates=2)
+        append(path + ".journal", ["del", "old"], ["put", "moved", record(7)], ["del", "nobody"])
+        store = registry_store.JournalStore(path, compact_after=float("inf"))
+        try:
+            assert store.replayed == 8
+            assert sorted(name for name, _ in store.items()) == ["moved", "user0", "user1", "user2"]
+            # Later lines win: re-registrations and moves replace the earlier record
+            assert store.get("user0") == record(3) and store.get("user1") == record(4)
+            assert store.get("moved")["listening_port"] == 5007
+        finally:
+            store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_compaction_folds_journal_into_snapshot():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        store = registry_store.JournalStore(path, compact_after=float("inf"))
+        for i in range(20):
+            store.put(f"user{i % 10}", record(i))
+        store.delete("user9")
+        store.compact()
+        store.put("after", record(42))
+        store.close()
+        assert store.compactions == 1 and not os.path.exists(path + ".journal.old")
+        with open(path) as f:
+            snapshot = json.load(f)
+        assert len(snapshot) == 9 and snapshot["user0"] == record(10) and "user9" not in snapshot
+        # Only the change made after the compaction is left to replay
+        store = registry_store.JournalStore(path, compact_after=float("inf"))
+        try:
+            assert store.replayed == 1 and len(store) == 10 and store.get("after") == record(42)
+        finally:
+            store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_interrupted_compaction_is_finished_on_open():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        # Crash after the journal was rotated but before the new snapshot was written
+        append(path + ".journal.old", ["put", "alice", record(1)], ["put", "bob", record(2)])
+        append(path + ".journal", ["del", "alice"], ["put", "carol", record(3)])
+        store = registry_store.JournalStore(path, compact_after=float("inf"))
+        try:
+            assert sorted(name for name, _ in store.items()) == ["bob", "carol"]
+            assert store.compactions == 1 and not os.path.exists(path + ".journal.old")
+            assert os.path.getsize(path + ".journal") == 0
+        finally:
+            store.close()
+        with open(path) as f:
+            assert sorted(json.load(f)) == ["bob", "carol"]
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_sqlite_migrates_json_once_and_leaves_it_in_place():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "key_registry.json")
+        db_path = os.path.join(tmp, "key_registry.db")
+        with open(path, 'w') as f:
+            json.dump({"alice": record(1), "bob": record(2)}, f)
+        with open(path, 'rb') as f:
+            original = f.read()
+        store = registry_store.SqliteStore(db_path, json_path=path)
+        assert sorted(name for name, _ in store.items()) == ["alice", "bob"]
+        assert store.get("bob") == record(2)
+        with open(path, 'rb') as f:
+            assert f.read() == original
+        # An emptied registry stays empty: the JSON is not imported a second time
+        store.delete("alice")
+        store.delete("bob")
+        store.close()
+        store = registry_store.SqliteStore(db_path, json_path=path)
+        try:
+            assert len(store) == 0
+        finally:
+            store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_sqlite_looks_up_addresses_through_the_index():
+    tmp = tempfile.mkdtemp()
+    try:
+        store = registry_store.SqliteStore(os.path.join(tmp, "key_registry.db"))
+        try:
+            for i in range(50):
+                store.put(f"user{i}", record(i % 10))
+            assert store.find_by_address("10.0.0.3", 5003) == ["user13", "user23", "user3", "user33", "user43"]
+            assert store.find_by_address("10.0.0.3", 5004) == []
+            plan = store._db().execute("EXPLAIN QUERY PLAN " + registry_store._SELECT_ADDRESS,
+                                       ("10.0.0.3", 5003)).fetchall()
+            assert any("USING COVERING INDEX users_address" in row[-1] or "USING INDEX users_address" in row[-1]
+                       for row in plan), plan
+            # The other backends answer the same from memory
+            journal = registry_store.JournalStore(os.path.join(tmp, "key_registry.json"))
+            for username, rec in store.items():
+                journal.put(username, rec)
+            assert journal.find_by_address("10.0.0.3", 5003) == store.find_by_address("10.0.0.3", 5003)
+            journal.close()
+        finally:
+            store.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    test_json_writes_coalesce_until_close()
+    test_json_flushes_on_the_interval()
+    test_json_failed_write_leaves_the_old_file()
+    test_journal_survives_torn_write()
+    test_journal_replays_over_snapshot()
+    test_compaction_folds_journal_into_snapshot()
+    test_interrupted_compaction_is_finished_on_open()
+    test_sqlite_migrates_json_once_and_leaves_it_in_place()
+    test_sqlite_looks_up_addresses_through_the_index()
+    print("OK")
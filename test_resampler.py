@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Polyphase resampler: output length, frequency and level across rates, frame by frame"""
+
+import numpy as np
+
+from resampler import PolyphaseResampler
+
+
+def tone(rate, hz, seconds, level=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (level * np.sin(2 * np.pi * hz * t)).astype(np.int16)
+
+
+def stream(resampler, pcm, frame):
+    """Feed `pcm` in frames of `frame` samples; returns the output as int16 samples."""
+    out = b"".join(resampler.process(pcm[i:i + frame].tobytes()) for i in range(0, pcm.size, frame))
+    return np.frombuffer(out, dtype=np.int16)
+
+
+def peak_hz(pcm, rate):
+    spectrum = np.abs(np.fft.rfft(pcm * np.hanning(pcm.size)))
+    return np.argmax(spectrum) * rate / pcm.size
+
+
+def test_output_length():
+    # Whole ratios: every 20 ms frame comes out at exactly the other rate's size
+    up = PolyphaseResampler(16000, 48000)
+    down = PolyphaseResampler(48000, 16000)
+    for _ in range(5):
+        assert len(up.process(bytes(640))) == 2 * 960
+        assert len(down.process(bytes(1920))) == 2 * 320
+    # Fractional ratios: frame sizes vary, but the total never drifts by more than a sample
+    odd = PolyphaseResampler(44100, 16000)
+    total = 0
+    for frames in range(1, 101):
+        total += len(odd.process(bytes(2 * 441))) // 2
+        assert abs(total - frames * 160) <= 1
+    assert len(odd.process(b"")) == 0
+
+
+def test_rate_conversion_keeps_pitch_and_level():
+    for in_rate, out_rate in ((16000, 48000), (48000, 16000), (8000, 16000), (44100, 16000)):
+        out = stream(PolyphaseResampler(in_rate, out_rate), tone(in_rate, 1000, 1.0), in_rate // 50)
+        steady = out[out_rate // 10:]
+        assert abs(peak_hz(steady, out_rate) - 1000) < 5, (in_rate, out_rate)
+        rms = np.sqrt(np.mean(steady.astype(np.float64) ** 2))
+        assert abs(rms - 8000 / np.sqrt(2)) < 0.05 * 8000, (in_rate, out_rate, rms)
+
+
+def test_downsampling_filters_out_what_cannot_be_represented():
+    # 12 kHz is above the 8 kHz Nyquist of a 16 kHz call: what aliases back (to 4 kHz) is
+    # at least 25 dB down
+    out = stream(PolyphaseResampler(48000, 16000), tone(48000, 12000, 1.0), 960)
+    rms = np.sqrt(np.mean(out[1600:].astype(np.float64) ** 2))
+    assert rms < 8000 / np.sqrt(2) * 10 ** (-25 / 20)
+
+
+def test_frames_join_seamlessly():
+    pcm = tone(16000, 440, 0.5)
+    whole = stream(PolyphaseResampler(16000, 48000), pcm, pcm.size)
+    framed = stream(PolyphaseResampler(16000, 48000), pcm, 160)
+    assert np.array_equal(whole, framed)
+
+
+def test_same_rate_is_passthrough():
+    resampler = PolyphaseResampler(16000, 16000)
+    pcm = tone(16000, 440, 0.02).tobytes()
+    assert resampler.passthrough and resampler.process(pcm) == pcm
+
+
+if __name__ == "__main__":
+    test_output_length()
+    test_rate_conversion_keeps_pitch_and_level()
+    test_downsampling_filters_out_what_cannot_be_represented()
+    test_frames_join_seamlessly()
+    test_same_rate_is_passthrough()
+    print("OK")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""SPSC ring buffers: wrap-around, overrun and underrun"""
+
+import threading
+
+from ring_buffer import ByteRingBuffer, FrameRingBuffer
+
+
+def test_bytes_wrap_around():
+    ring = ByteRingBuffer(8)
+    assert ring.write(b"abcdef") and ring.read(4) == b"abcd"
+    # Straddles the end of the buffer on both write and read
+    assert ring.write(b"ghijkl")
+    assert ring.available() == 8 and ring.free() == 0
+    assert ring.read(8) == b"efghijkl"
+    for i in range(100):
+        chunk = bytes([i]) * 3
+        assert ring.write(chunk) and ring.read(3) == chunk
+
+
+def test_bytes_overrun_and_underrun():
+    ring = ByteRingBuffer(8)
+    assert ring.write(b"12345")
+    # All-or-nothing: a write that doesn't fit leaves the ring untouched
+    assert not ring.write(b"6789")
+    assert ring.available() == 5
+    # Reading more than is buffered returns nothing and consumes nothing
+    assert ring.read(6) is None
+    assert ring.read(5) == b"12345"
+    assert ring.read(1) is None
+    ring.write(b"xy")
+    ring.clear()
+    assert ring.available() == 0 and ring.free() == 8
+
+
+def test_frames_wrap_around():
+    ring = FrameRingBuffer(4, 3)
+    for i in range(10):
+        assert ring.write(bytes([i]) * 4, stamp=float(i))
+        frame = ring.peek(timeout=0)
+        assert bytes(frame) == bytes([i]) * 4 and ring.stamp() == float(i)
+        ring.consume()
+    assert len(ring) == 0
+    # A write longer than a slot fills consecutive slots, across the end too
+    assert ring.write(b"aaaabbbbcc")
+    frames = []
+    while len(ring):
+        frames.append(bytes(ring.peek(0)))
+        ring.consume()
+    assert frames == [b"aaaa", b"bbbb", b"cc"]
+
+
+def test_frames_overrun_drops_the_new_frame():
+    ring = FrameRingBuffer(2, 2)
+    assert ring.write(b"aa") and ring.write(b"bb")
+    assert not ring.write(b"cc")
+    assert ring.overruns == 1 and len(ring) == 2
+    assert bytes(ring.peek(0)) == b"aa"
+
+
+def test_frames_latency_cap_skips_the_oldest():
+    ring = FrameRingBuffer(2, 8, max_backlog=2)
+    for i in range(5):
+        ring.write(bytes([i]) * 2)
+    assert bytes(ring.peek(0)) == b"\x03\x03"
+    assert ring.dropped == 3 and len(ring) == 2
+
+
+def test_frames_underrun_waits_then_gives_up():
+    ring = FrameRingBuffer(2, 4)
+    assert ring.peek(timeout=0.01) is None
+    ring.consume()  # nothing to release: must not run ahead of the writer
+    assert len(ring) == 0
+    threading.Timer(0.05, ring.write, (b"zz",)).start()
+    assert bytes(ring.peek(timeout=2)) == b"zz"
+
+
+if __name__ == "__main__":
+    test_bytes_wrap_around()
+    test_bytes_overrun_and_underrun()
+    test_frames_wrap_around()
+    test_frames_overrun_drops_the_new_frame()
+    test_frames_latency_cap_skips_the_oldest()
+    test_frames_underrun_waits_then_gives_up()
+    print("OK")
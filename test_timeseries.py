@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Bounded per-call time series: downsampling, overwrite mode, and CSV / .npz dumps"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from timeseries import TimeSeries
+
+
+def test_downsampling_keeps_the_whole_call():
+    ts = TimeSeries(("t", "v"), capacity=8)
+    for i in range(8):
+        ts.append(i, 10 * i)
+    # The ring filled: pairs were averaged and new samples now go in two at a time
+    assert ts.stride == 2 and len(ts) == 4
+    assert ts.column("t").tolist() == [0.5, 2.5, 4.5, 6.5]
+    for i in range(8, 13):
+        ts.append(i, 10 * i)
+    # 8+9, 10+11 stored; 12 still pending, exported as its own (partial) row
+    assert ts.column("t").tolist() == [0.5, 2.5, 4.5, 6.5, 8.5, 10.5, 12.0]
+    assert len(ts) == 7 and ts.column("v")[-1] == 120.0
+    for i in range(13, 100):
+        ts.append(i, 10 * i)
+    data = ts.array()
+    # Memory stays bounded while the first and last samples are still covered
+    assert len(data) <= 8 + 1 and data[0, 0] < 8 and data[-1, 0] > 90
+    assert np.all(np.diff(data[:, 0]) > 0)
+
+
+def test_pending_samples_are_averaged():
+    ts = TimeSeries(("v",), capacity=4)
+    for v in (1, 3, 5, 7):
+        ts.append(v)
+    assert ts.stride == 2
+    ts.append(10)
+    ts.append(20)
+    ts.append(30)
+    assert ts.column("v").tolist() == [2.0, 6.0, 15.0, 30.0]
+    ts.clear()
+    assert len(ts) == 0 and ts.array().shape == (0, 1)
+
+
+def test_overwrite_mode_keeps_the_latest():
+    ts = TimeSeries(("v",), capacity=4, downsample=False)
+    for v in range(10):
+        ts.append(v)
+    assert ts.stride == 1 and ts.column("v").tolist() == [6, 7, 8, 9]
+
+
+def test_dump_includes_the_tail():
+    tmp = tempfile.mkdtemp()
+    try:
+        ts = TimeSeries(("elapsed", "latency_ms"), capacity=4)
+        for i in range(7):
+            ts.append(i, 20 + i)
+        csv = ts.dump(os.path.join(tmp, "latency.csv"))
+        with open(csv) as f:
+            assert f.readline().strip() == "elapsed,latency_ms"
+        rows = np.loadtxt(csv, delimiter=",", skiprows=1)
+        assert rows.tolist() == ts.array().tolist() and rows[-1].tolist() == [6.0, 26.0]
+        npz = np.load(ts.dump(os.path.join(tmp, "latency.npz")))
+        assert int(npz["stride"]) == 2
+        assert npz["elapsed"].tolist() == [0.5, 2.5, 4.5, 6.0]
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_capacity_must_be_even():
+    for capacity in (0, 1, 7):
+        try:
+            TimeSeries(("v",), capacity=capacity)
+            assert False, capacity
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_downsampling_keeps_the_whole_call()
+    test_pending_samples_are_averaged()
+    test_overwrite_mode_keeps_the_latest()
+    test_dump_includes_the_tail()
+    test_capacity_must_be_even()
+    print("OK")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Per-stage pipeline tracer: lap aggregation and exported summaries"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import tracing
+
+
+class FakeClock:
+    """Seconds that only move when told to."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms / 1000
+
+
+def traced_frames(clock, tracer, frames):
+    for i in range(frames):
+        t = tracer.clock()
+        clock.advance(2 + i % 2)       # encode: 2 or 3 ms
+        t = tracer.lap("encode", t)
+        clock.advance(0.5)             # encrypt
+        t = tracer.lap("encrypt", t)
+        clock.advance(0.1 if i % 10 else 10)   # sendto stalls on every 10th frame
+        tracer.lap("sendto", t)
+
+
+def test_laps_aggregate_per_stage():
+    clock = FakeClock()
+    tracer = tracing.StageTracer(clock)
+    traced_frames(clock, tracer, 100)
+    summary = tracer.summary()
+    # Only stages that ran are reported
+    assert sorted(summary) == ["encode", "encrypt", "sendto"]
+    assert all(s["count"] == 100 for s in summary.values())
+    assert abs(summary["encode"]["mean"] - 2.5) < 0.01
+    assert abs(summary["encode"]["p50"] - 2.0) < 0.03 and abs(summary["encode"]["max"] - 3.0) < 0.001
+    assert abs(summary["encrypt"]["p99"] - 0.5) < 0.005
+    # One stall in ten: the median is the fast path, p95 catches the stall
+    assert abs(summary["sendto"]["p50"] - 0.1) < 0.002 and abs(summary["sendto"]["p95"] - 10) < 0.1
+    # lap() returns the new time, so consecutive stages don't overlap
+    t = tracer.clock()
+    clock.advance(1)
+    assert tracer.lap("decode", t) == clock.now
+
+
+def test_exports():
+    clock = FakeClock()
+    tracer = tracing.StageTracer(clock)
+    traced_frames(clock, tracer, 20)
+    assert sorted(tracer.histograms()) == ["stage_encode_ms", "stage_encrypt_ms", "stage_sendto_ms"]
+    lines = tracer.report().splitlines()
+    assert lines[0].split() == ["stage", "count", "mean", "p50", "p95", "p99", "max"]
+    # Rows in pipeline order
+    assert [line.split()[0] for line in lines[1:]] == ["encode", "encrypt", "sendto"]
+    assert lines[1].split()[1] == "20"
+    tmp = tempfile.mkdtemp()
+    try:
+        with open(tracer.dump(os.path.join(tmp, "trace.json"))) as f:
+            assert json.load(f) == json.loads(json.dumps(tracer.summary()))
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_tracing_is_opt_in():
+    saved = os.environ.pop("PQC_TRACE", None)
+    try:
+        assert tracing.create() is tracing.NULL_TRACER
+        os.environ["PQC_TRACE"] = "1"
+        assert isinstance(tracing.create(), tracing.StageTracer)
+    finally:
+        os.environ.pop("PQC_TRACE", None)
+        if saved is not None:
+            os.environ["PQC_TRACE"] = saved
+    null = tracing.NULL_TRACER
+    assert not null.enabled and null.lap("encode", null.clock()) == 0.0 and null.histograms() == {}
+
+
+if __name__ == "__main__":
+    test_laps_aggregate_per_stage()
+    test_exports()
+    test_tracing_is_opt_in()
+    print("OK")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""/list index: pages, deltas since a version, ETags and online views"""
+
+import requests
+
+import signalling_client
+from test_registry_concurrency import register, serving, start_async_server, start_server
+from user_index import UserIndex
+
+USERS = [f"user{i:03d}" for i in range(250)]
+
+
+def record(port):
+    return {"listening_ip": "10.0.0.1", "listening_port": port, "registered_at": "2024-01-01T00:00:00"}
+
+
+def index_of(names, log_size=100):
+    return UserIndex(((name, record(5000 + i)) for i, name in enumerate(names)), log_size, clock=lambda: 1000.0)
+
+
+def test_pages_follow_the_cursor():
+    index = index_of(reversed(USERS))
+    version, entries, cursor = index.page(limit=100)
+    assert version == 1000000 and [e["username"] for e in entries] == USERS[:100] and cursor == USERS[99]
+    names = []
+    cursor = None
+    while True:
+        _, entries, cursor = index.page(cursor, 64)
+        names += [e["username"] for e in entries]
+        if cursor is None:
+            break
+    assert names == USERS
+    # The unpaged list is built once per version
+    assert index.page()[1] is index.page()[1]
+    full = index.page()[1]
+    index.put("user999", record(6000))
+    assert index.page()[1] is not full and index.page()[1][-1]["username"] == "user999"
+
+
+def test_changes_since_a_version():
+    index = index_of(USERS[:3], log_size=4)
+    start = index.version
+    assert index.changes_since(start) == (start, [])
+    index.put("user100", record(6000))
+    index.put("user000", record(6001))
+    index.remove("user001")
+    index.remove("nobody")
+    version, changes = index.changes_since(start)
+    assert version == start + 3
+    assert [c["username"] for c in changes] == ["user000", "user001", "user100"]
+    assert changes[0]["listening_address"] == "10.0.0.1:6001"
+    assert changes[1] == {"username": "user001", "removed": True}
+    assert index.changes_since(start + 2)[1] == [{"username": "user001", "removed": True}]
+    # Versions the log no longer reaches, from a previous run or from the future: reset
+    for i in range(4):
+        index.put(f"user{200 + i}", record(7000))
+    assert index.changes_since(start)[1] is None
+    assert index.changes_since(start - 1)[1] is None and index.changes_since(index.version + 1)[1] is None
+    assert index.changes_since(index.version - 4)[1] is not None
+
+
+def test_online_views():
+    index = index_of(USERS[:3])
+    assert index.page(online_only=True)[1] == [] and index.count(online_only=True) == 0
+    start = index.version
+    index.set_online("user001", True)
+    index.set_online("user001", True)  # no transition, no version
+    index.set_online("user002", True)
+    index.set_online("nobody", True)
+    assert index.version == start + 2
+    assert [e["username"] for e in index.page(online_only=True)[1]] == ["user001", "user002"]
+    index.set_online("user001", False, "2024-01-01T00:01:00")
+    assert index.changes_since(start, online_only=True)[1] == [{"username": "user001", "removed": True},
+                                                                index.page(online_only=True)[1][0]]
+    entry = index.page(cursor="user000", limit=1)[1][0]
+    assert entry["online"] is False and entry["last_seen"] == "2024-01-01T00:01:00"
+    # Re-registering keeps presence
+    index.put("user002", record(6000))
+    assert index.page(online_only=True)[1][0]["listening_address"] == "10.0.0.1:6000"
+    index.remove("user002")
+    assert index.count(online_only=True) == 0 and len(index) == 2
+
+
+def test_etags_name_the_view():
+    index = index_of(USERS[:3])
+    full = index.etag()
+    assert full == f'"{index.version}"'
+    views = {full, index.etag(limit=2), index.etag("user000", 2), index.etag(online_only=True)}
+    assert len(views) == 4
+    assert index.etag(limit=2) == index.etag(limit=2)
+    index.remove("user000")
+    assert index.etag() != full
+
+
+def check_list(url):
+    """Pages, deltas and ETags of /list all agree with the full list."""
+    contacts = signalling_client.UserList(url)
+    assert contacts.refresh() == []
+    for i, username in enumerate(USERS):
+        register(requests, url, username, 5000 + i)
+    names, cursor = [], None
+    while True:
+        page = requests.get(f"{url}/list", params={"limit": 100, "cursor": cursor}, timeout=10).json()
+        names += [u["username"] for u in page["users"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert names == USERS
+    # An ETag only vouches for the view it came with
+    first = requests.get(f"{url}/list", params={"limit": 100}, timeout=10)
+    second = requests.get(f"{url}/list", params={"limit": 100, "cursor": first.json()["next_cursor"]},
+                          headers={"If-None-Match": first.headers["ETag"]}, timeout=10)
+    assert second.status_code == 200 and second.json()["users"][0]["username"] == USERS[100]
+    full = requests.get(f"{url}/list", timeout=10)
+    online = requests.get(f"{url}/list", params={"online": 1}, headers={"If-None-Match": full.headers["ETag"]},
+                          timeout=10)
+    assert online.status_code == 200 and online.headers["ETag"] != full.headers["ETag"]
+    again = requests.get(f"{url}/list", params={"online": 1}, headers={"If-None-Match": online.headers["ETag"]},
+                         timeout=10)
+    assert again.status_code == 304
+    assert requests.get(f"{url}/list", params={"limit": -2}, timeout=10).status_code == 400
+    assert requests.get(f"{url}/list", params={"limit": 0}, timeout=10).status_code == 400
+    # A client that saw the empty list catches up from the changes alone ...
+    before = contacts.version
+    assert contacts.refresh() == USERS and contacts.version > before
+    # ... and an unchanged list costs a 304
+    resp = requests.get(f"{url}/list", params={"since": contacts.version},
+                        headers={"If-None-Match": contacts.etag}, timeout=10)
+    assert resp.status_code == 304 and not resp.content
+    requests.delete(f"{url}/unregister/{USERS[0]}", timeout=10)
+    delta = requests.get(f"{url}/list", params={"since": contacts.version}, timeout=10).json()
+    assert delta["changes"] == [{"username": USERS[0], "removed": True}]
+    assert contacts.refresh() == USERS[1:]
+    register(requests, url, USERS[0], 5000)
+    assert contacts.refresh() == USERS
+    # Versions the change log can't vouch for get the full list back
+    assert requests.get(f"{url}/list", params={"since": 1}, timeout=10).json()["reset"] is True
+
+
+def test_threaded_server_list():
+    with serving(start_server) as url:
+        check_list(url)
+
+
+def test_async_server_list():
+    with serving(start_async_server) as url:
+        check_list(url)
+
+
+if __name__ == "__main__":
+    test_pages_follow_the_cursor()
+    test_changes_since_a_version()
+    test_online_views()
+    test_etags_name_the_view()
+    test_threaded_server_list()
+    test_async_server_list()
+    print("OK")
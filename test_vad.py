@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Voice activity detection, DTX decisions, SID descriptors and comfort noise"""
+
+import numpy as np
+
+import vad
+
+RATE = 16000
+PTIME = 20
+N = RATE * PTIME // 1000
+
+
+def noise(level_dbov, seed=0):
+    """Frame of white noise at `level_dbov` RMS."""
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(N) * 32768 * 10 ** (level_dbov / 20)).astype(np.int16).tobytes()
+
+
+def tone(level_dbov, hz=300):
+    t = np.arange(N) / RATE
+    return (np.sqrt(2) * 32768 * 10 ** (level_dbov / 20) * np.sin(2 * np.pi * hz * t)).astype(np.int16).tobytes()
+
+
+def test_frame_level():
+    assert abs(vad.frame_level_dbov(tone(-20)) - -20) < 0.1
+    assert abs(vad.frame_level_dbov(noise(-40)) - -40) < 0.5
+    assert vad.frame_level_dbov(bytes(2 * N)) == vad.MIN_LEVEL_DBOV
+    assert vad.frame_level_dbov(b"") == vad.MIN_LEVEL_DBOV
+
+
+def test_speech_over_noise_with_hangover():
+    detector = vad.VoiceActivityDetector(PTIME)
+    assert not any(detector.is_speech(noise(-65, i)) for i in range(50))
+    assert abs(detector.noise_floor_db - -65) < 1
+    assert all(detector.is_speech(tone(-25)) for _ in range(10))
+    # Speech ends: HANGOVER_MS more frames still count, then silence
+    after = [detector.is_speech(noise(-65, 100 + i)) for i in range(15)]
+    hangover = vad.HANGOVER_MS // PTIME
+    assert after == [True] * hangover + [False] * (15 - hangover)
+
+
+def test_louder_room_is_learned():
+    detector = vad.VoiceActivityDetector(PTIME)
+    decisions = [detector.is_speech(noise(-45, i)) for i in range(200)]
+    # Steady fan noise starts out above the initial floor but stops counting as speech within 2 s
+    assert decisions[0] and not any(decisions[100:])
+
+
+def test_dtx_sends_sid_on_an_interval():
+    dtx = vad.DtxController(PTIME)
+    assert [dtx.process(tone(-25)) for _ in range(5)] == [vad.SPEECH] * 5
+    decisions = [dtx.process(noise(-65, i)) for i in range(40)]
+    hangover = vad.HANGOVER_MS // PTIME
+    interval = vad.SID_INTERVAL_MS // PTIME
+    silent = decisions[hangover:]
+    assert decisions[:hangover] == [vad.SPEECH] * hangover
+    assert [i for i, d in enumerate(silent) if d == vad.SID] == list(range(0, len(silent), interval))
+    assert dtx.frames_suppressed == silent.count(vad.SUPPRESS)
+    # The descriptor carries the noise level in -dBov
+    assert abs(dtx.sid_payload()[0] - 65) <= 1
+    assert dtx.process(tone(-25)) == vad.SPEECH and not dtx.in_silence
+
+
+def test_sid_payload_range():
+    dtx = vad.DtxController(PTIME)
+    dtx.process(bytes(2 * N))
+    assert dtx.sid_payload() == bytes([127])
+    # Full scale (a clipped square wave) is 0 dBov
+    dtx.process(np.full(N, -32768, dtype=np.int16).tobytes())
+    assert dtx.sid_payload() == bytes([0])
+
+
+def test_comfort_noise_matches_the_descriptor():
+    cng = vad.ComfortNoiseGenerator(N)
+    cng.rng = np.random.default_rng(7)
+    assert not cng.active and cng.generate() is None
+    cng.update(bytes([40]))
+    frames = [cng.generate() for _ in range(50)]
+    assert all(len(f) == 2 * N for f in frames)
+    assert abs(vad.frame_level_dbov(b"".join(frames)) - -40) < 0.5
+    cng.update(b"")
+    assert cng.level_dbov == -40
+    cng.reset()
+    assert cng.generate() is None
+
+
+if __name__ == "__main__":
+    test_frame_level()
+    test_speech_over_noise_with_hangover()
+    test_louder_room_is_learned()
+    test_dtx_sends_sid_on_an_interval()
+    test_sid_payload_range()
+    test_comfort_noise_matches_the_descriptor()
+    print("OK")
@@ -0,0 +1,96 @@
+"""
+Bounded-memory time series for per-call metrics history.
+
+A TimeSeries is a preallocated NumPy ring of fixed-width float rows, so a
+call's history costs the same memory after five minutes or five hours. When
+the ring fills up it either downsamples (adjacent rows are averaged in pairs
+and new samples are averaged `stride` at a time, so the whole call stays
+covered at half the resolution) or, with downsample=False, overwrites the
+oldest rows. Samples still being averaged into the next row are exported as
+a final partial row (their average), so the tail of a call is never lost.
+Histories can be dumped as CSV or as a compressed .npz for offline analysis.
+"""
+
+import numpy as np
+
+# One row per second by default: an hour at full resolution
+DEFAULT_CAPACITY = 3600
+
+
+class TimeSeries:
+    def __init__(self, columns, capacity=DEFAULT_CAPACITY, downsample=True):
+        if capacity < 2 or capacity % 2:
+            raise ValueError("capacity must be an even number >= 2")
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self.downsample = downsample
+        self._data = np.zeros((capacity, len(self.columns)))
+        self._start = 0          # ring position of the oldest row
+        self._count = 0
+        self.stride = 1          # samples averaged into each stored row
+        self._acc = np.zeros(len(self.columns))
+        self._acc_n = 0
+
+    def __len__(self):
+        return self._count + (1 if self._acc_n else 0)
+
+    def append(self, *values):
+        """Add one sample (one value per column)."""
+        self._acc += values
+        self._acc_n += 1
+        if self._acc_n < self.stride:
+            return
+        row = self._acc / self._acc_n
+        self._acc[:] = 0
+        self._acc_n = 0
+        if self._count == self.capacity:
+            # Circular mode: drop the oldest row
+            self._start = (self._start + 1) % self.capacity
+            self._count -= 1
+        self._data[(self._start + self._count) % self.capacity] = row
+        self._count += 1
+        if self._count == self.capacity and self.downsample:
+            # Compact as soon as the ring fills so later rows use the new stride
+            self._compact()
+
+    def _compact(self):
+        """Halve resolution in place: average row pairs, double the stride."""
+        ordered = self._stored()
+        half = self._count // 2
+        self._data[:half] = ordered[:2 * half].reshape(half, 2, -1).mean(axis=1)
+        self._start = 0
+        self._count = half
+        self.stride *= 2
+
+    def _stored(self):
+        idx = (self._start + np.arange(self._count)) % self.capacity
+        return self._data[idx]
+
+    def array(self):
+        """
+        Copy of the rows, oldest first, shape (len, columns); the last row is
+        the average of the pending samples if fewer than `stride` have come
+        in since the previous row.
+        """
+        rows = self._stored()
+        if self._acc_n:
+            rows = np.vstack((rows, self._acc / self._acc_n))
+        return rows
+
+    def column(self, name):
+        return self.array()[:, self.columns.index(name)]
+
+    def clear(self):
+        self._start = self._count = 0
+        self.stride = 1
+        self._acc[:] = 0
+        self._acc_n = 0
+
+    def dump(self, path):
+        """Write the series to `path`: CSV if it ends in .csv, else compressed .npz."""
+        data = self.array()
+        if path.endswith(".csv"):
+            np.savetxt(path, data, delimiter=",", header=",".join(self.columns), comments="", fmt="%.6g")
+        else:
+            np.savez_compressed(path, stride=self.stride, **{c: data[:, i] for i, c in enumerate(self.columns)})
+        return path
@@ -0,0 +1,100 @@
+"""
+Opt-in per-stage timing of the live send and receive pipelines.
+
+Call sites bracket each stage with the tracer's clock:
+
+    t = tracer.clock()
+    ...stage...
+    t = tracer.lap("encrypt", t)
+
+A StageTracer records every lap into a per-stage latency histogram for the
+call. When tracing is off (the default) the NULL_TRACER is used instead;
+its clock() and lap() are no-ops returning 0, so the disabled cost is two
+trivial calls per stage. Enable with PQC_TRACE=1.
+
+Stages, in pipeline order:
+    capture      record_chunk: wait for the next device frame + resample + AEC
+    encode       DTX, codec and FEC packing
+    obfuscate    XOR identity obfuscation
+    encrypt      AES-GCM seal
+    sendto       UDP send syscall
+    recvfrom     blocking UDP receive (includes waiting for the next packet)
+    decrypt      AES-GCM open
+    deobfuscate  XOR removal
+    decode       codec, FEC rebuild and loss concealment
+    queue        time a frame waits in the playout ring
+    playout      handing the frame to the device ring (resample + wait for space)
+capture and recvfrom include idle waiting, so they show the pacing (about
+one ptime per frame) and any stalls on top of it.
+"""
+
+import json
+import os
+import time
+
+from metrics import Histogram
+
+STAGES = ("capture", "encode", "obfuscate", "encrypt", "sendto",
+          "recvfrom", "decrypt", "deobfuscate", "decode", "queue", "playout")
+
+
+class StageTracer:
+    enabled = True
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        # ms values at microsecond resolution, up to 10 s
+        self.stages = {s: Histogram(highest=10000.0) for s in STAGES}
+
+    def clock(self):
+        return self._clock()
+
+    def lap(self, stage, start):
+        """Record `stage` as having run from `start` until now; returns now."""
+        now = self._clock()
+        self.stages[stage].record((now - start) * 1000)
+        return now
+
+    def histograms(self):
+        return {f"stage_{s}_ms": h for s, h in self.stages.items() if h.count}
+
+    def summary(self):
+        return {s: h.summary() for s, h in self.stages.items() if h.count}
+
+    def report(self):
+        """Text table of per-stage percentiles (ms)."""
+        lines = [f"{'stage':<12} {'count':>7} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"]
+        for s, h in self.stages.items():
+            if not h.count:
+                continue
+            m = h.summary()
+            lines.append(f"{s:<12} {m['count']:>7} {m['mean']:>8.3f} {m['p50']:>8.3f} "
+                         f"{m['p95']:>8.3f} {m['p99']:>8.3f} {m['max']:>8.3f}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+
+class NullTracer:
+    """Tracing disabled: every hook is a no-op."""
+    enabled = False
+
+    def clock(self):
+        return 0.0
+
+    def lap(self, stage, start):
+        return 0.0
+
+    def histograms(self):
+        return {}
+
+
+NULL_TRACER = NullTracer()
+
+
+def create():
+    """Tracer for a new call: a StageTracer if PQC_TRACE is set, else the no-op one."""
+    return StageTracer() if os.getenv("PQC_TRACE", "0") not in ("", "0") else NULL_TRACER
@@ -0,0 +1,164 @@
+"""
+Sorted, versioned index of registered users behind the registry's /list.
+
+/list used to read the whole registry, build an entry per user and sort them
+on every request, while every client polls it every few seconds to refresh
+its contact list: O(N log N) CPU and O(N) bytes per poll even when nothing
+changed. UserIndex keeps the /list entries in memory in username order,
+updated in place on register / unregister, and numbers every change:
+
+- The full list for the current version is built once and reused until the
+  next change; pages (cursor = last username of the previous page) are a
+  bisect into the sorted names.
+- The version doubles as an ETag, so a client whose copy is current gets a
+  304 with no body. The ETag also names the view (online filter, cursor and
+  limit), so a copy of one page or view never passes for another.
+- A bounded change log answers ?since=<version> with only the users that
+  changed (or were removed) after that version, O(changes). Clients whose
+  version is too old for the log, or from before a restart, get a full
+  reset instead.
+
+Entries also carry presence (online, and last_seen once offline); it changes
+only when a user comes online or goes offline, so heartbeats don't turn into
+versions. ?online=1 views (full, paged or deltas) leave offline users out; in
+a delta, a user who went offline shows as removed.
+
+Versions start at the server's start time in milliseconds, so versions from
+a previous run are always older than the log and never mistaken for current.
+"""
+
+import bisect
+import hashlib
+import threading
+import time
+from collections import deque
+
+# Changes kept for ?since= deltas; older clients get the full list
+CHANGE_LOG_SIZE = 10000
+# Largest page a client may ask for
+MAX_PAGE = 1000
+
+
+def list_entry(username, record, online=False, last_seen=None):
+    """The /list entry for a registry record."""
+    return {
+        "username": username,
+        "listening_address": f"{record.get('listening_ip', 'unknown')}:{record.get('listening_port', 0)}",
+        "registered_at": record.get("registered_at", "unknown"),
+        "online": online,
+        "last_seen": last_seen
+    }
+
+
+class UserIndex:
+    def __init__(self, items=(), log_size=CHANGE_LOG_SIZE, clock=time.time):
+        self._lock = threading.Lock()
+        self._entries = {username: list_entry(username, record) for username, record in items}
+        self._names = sorted(self._entries)
+        self._online = []  # online usernames, sorted
+        self._log = deque(maxlen=log_size)  # (version, username), oldest first
+        self.base = int(clock() * 1000)
+        self.version = self.base
+        self._full = {}  # online_only -> (version, entries in username order)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, username):
+        return username in self._entries
+
+    def etag(self, cursor=None, limit=None, online_only=False, version=None):
+        """
+        ETag of a view of the list at `version` (default current): the plain
+        version for the full list, the version plus a digest of the view
+        otherwise.
+        """
+        version = self.version if version is None else version
+        if cursor is None and limit is None and not online_only:
+            return f'"{version}"'
+        view = hashlib.sha1(repr((cursor, limit, online_only)).encode()).hexdigest()[:16]
+        return f'"{version}-{view}"'
+
+    def count(self, online_only=False):
+        return len(self._online) if online_only else len(self._entries)
+
+    def put(self, username, record):
+        with self._lock:
+            old = self._entries.get(username)
+            if old is None:
+                bisect.insort(self._names, username)
+                entry = list_entry(username, record)
+            else:
+                entry = list_entry(username, record, old["online"], old["last_seen"])
+            self._entries[username] = entry
+            self._changed(username)
+
+    def remove(self, username):
+        with self._lock:
+            entry = self._entries.pop(username, None)
+            if entry is None:
+                return
+            del self._names[bisect.bisect_left(self._names, username)]
+            if entry["online"]:
+                del self._online[bisect.bisect_left(self._online, username)]
+            self._changed(username)
+
+    def set_online(self, username, online, last_seen=None):
+        """Mark a user online, or offline as of `last_seen`."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry["online"] == online:
+                return
+            if online:
+                bisect.insort(self._online, username)
+            else:
+                del self._online[bisect.bisect_left(self._online, username)]
+            # Entries handed out earlier may still be in use: replace, don't mutate
+            self._entries[username] = dict(entry, online=online, last_seen=None if online else last_seen)
+            self._changed(username)
+
+    def _changed(self, username):
+        self.version += 1
+        self._log.append((self.version, username))
+
+    def page(self, cursor=None, limit=None, online_only=False):
+        """
+        (version, entries, next cursor): entries in username order after
+        `cursor`, at most `limit` of them (all if None); next cursor is None
+        on the last page. online_only leaves out users who are offline.
+        """
+        with self._lock:
+            names = self._online if online_only else self._names
+            if cursor is None and limit is None:
+                full = self._full.get(online_only)
+                if full is None or full[0] != self.version:
+                    full = self._full[online_only] = (self.version, [self._entries[name] for name in names])
+                return self.version, full[1], None
+            start = bisect.bisect_right(names, cursor) if cursor else 0
+            limit = min(limit or MAX_PAGE, MAX_PAGE)
+            page = names[start:start + limit]
+            more = start + limit < len(names)
+            return self.version, [self._entries[name] for name in page], page[-1] if more else None
+
+    def changes_since(self, since, online_only=False):
+        """
+        (version, changes) with the current entry of every user changed after
+        version `since`, or {"username": name, "removed": True} for users gone
+        since (or gone offline, with online_only); changes is None if the log
+        doesn't reach back that far.
+        """
+        with self._lock:
+            if since > self.version or since < self.base:
+                return self.version, None
+            if since < self.version and (not self._log or self._log[0][0] > since + 1):
+                return self.version, None
+            latest = {}
+            for version, username in reversed(self._log):
+                if version <= since:
+                    break
+                if username not in latest:
+                    entry = self._entries.get(username)
+                    if entry is None or (online_only and not entry["online"]):
+                        entry = {"username": username, "removed": True}
+                    latest[username] = entry
+            return self.version, [latest[name] for name in sorted(latest)]
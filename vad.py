@@ -0,0 +1,132 @@
+"""
+Voice activity detection and comfort noise for discontinuous transmission (DTX).
+
+The sender runs each captured frame through DtxController: speech frames are
+sent as usual, silent frames are dropped, and every SID_INTERVAL_MS of silence
+a one-byte comfort-noise descriptor (noise level in -dBov, as in RFC 3389) is
+sent instead. The receiver feeds descriptors into ComfortNoiseGenerator and
+plays generated noise whenever the playout queue runs dry during silence.
+"""
+
+import numpy as np
+
+# DtxController decisions
+SPEECH = "speech"
+SID = "sid"
+SUPPRESS = "suppress"
+
+# Send a comfort-noise descriptor this often while silent
+SID_INTERVAL_MS = 160
+# Keep sending this long after speech ends so word endings aren't clipped
+HANGOVER_MS = 200
+# Frames this far above the tracked noise floor count as speech
+SPEECH_THRESHOLD_DB = 9.0
+# Anything quieter than this is never speech, whatever the noise floor
+MIN_SPEECH_DBOV = -55.0
+# Quietest level a descriptor can carry
+MIN_LEVEL_DBOV = -127
+# Starting noise floor; a noisier room is learned within a few seconds
+INITIAL_NOISE_FLOOR_DBOV = -60.0
+# How fast the floor is allowed to rise while frames look like speech
+NOISE_FLOOR_RISE_DB_PER_S = 5.0
+
+
+def frame_level_dbov(pcm):
+    """RMS level of a 16-bit PCM frame in dB relative to full scale."""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    if samples.size == 0:
+        return float(MIN_LEVEL_DBOV)
+    rms = np.sqrt(np.mean(samples * samples))
+    if rms < 1.0:
+        return float(MIN_LEVEL_DBOV)
+    return max(float(MIN_LEVEL_DBOV), 20.0 * np.log10(rms / 32768.0))
+
+
+class VoiceActivityDetector:
+    """Energy detector with an adaptive noise floor and a hangover."""
+
+    def __init__(self, ptime_ms, threshold_db=SPEECH_THRESHOLD_DB, hangover_ms=HANGOVER_MS):
+        self.threshold_db = threshold_db
+        self.hangover_frames = max(1, hangover_ms // ptime_ms)
+        self.floor_rise_db = NOISE_FLOOR_RISE_DB_PER_S * ptime_ms / 1000
+        self.noise_floor_db = INITIAL_NOISE_FLOOR_DBOV
+        self.level_db = float(MIN_LEVEL_DBOV)
+        self._hangover = 0
+
+    def is_speech(self, pcm):
+        level = frame_level_dbov(pcm)
+        self.level_db = level
+        active = level > max(self.noise_floor_db + self.threshold_db, MIN_SPEECH_DBOV)
+        if level < self.noise_floor_db:
+            # Track drops in background noise immediately
+            self.noise_floor_db = level
+        elif not active:
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * level
+        else:
+            # Creep upwards during speech so a louder room is eventually learned
+            self.noise_floor_db += self.floor_rise_db
+
+        if active:
+            self._hangover = self.hangover_frames
+            return True
+        if self._hangover > 0:
+            self._hangover -= 1
+            return True
+        return False
+
+
+class DtxController:
+    """Decides per captured frame whether to send audio, a descriptor or nothing."""
+
+    def __init__(self, ptime_ms, sid_interval_ms=SID_INTERVAL_MS):
+        self.vad = VoiceActivityDetector(ptime_ms)
+        self.sid_interval_frames = max(1, sid_interval_ms // ptime_ms)
+        self.in_silence = False
+        self._frames_since_sid = 0
+        self.frames_suppressed = 0
+
+    def process(self, pcm):
+        if self.vad.is_speech(pcm):
+            self.in_silence = False
+            return SPEECH
+        if not self.in_silence or self._frames_since_sid >= self.sid_interval_frames:
+            # First silent frame, or time to refresh the receiver's noise level
+            self.in_silence = True
+            self._frames_since_sid = 1
+            return SID
+        self._frames_since_sid += 1
+        self.frames_suppressed += 1
+        return SUPPRESS
+
+    def sid_payload(self):
+        """Comfort-noise descriptor for the current noise level."""
+        return bytes([min(127, max(0, int(round(-self.vad.level_db))))])
+
+
+class ComfortNoiseGenerator:
+    """Synthesizes low-level noise matching the peer's last descriptor."""
+
+    def __init__(self, frames_per_packet):
+        self.frames_per_packet = frames_per_packet
+        self.level_dbov = None
+        self.rng = np.random.default_rng()
+
+    @property
+    def active(self):
+        return self.level_dbov is not None
+
+    def update(self, payload):
+        if payload:
+            self.level_dbov = -float(payload[0])
+
+    def reset(self):
+        self.level_dbov = None
+
+    def generate(self):
+        if self.level_dbov is None:
+            return None
+        n = self.frames_per_packet
+        noise = self.rng.standard_normal(n + 1).astype(np.float32)
+        # Summing neighbours takes the hiss off; sqrt(0.5) restores unit variance
+        noise = (noise[1:] + noise[:-1]) * (np.sqrt(0.5) * 32768.0 * 10 ** (self.level_dbov / 20.0))
+        return np.clip(noise, -32768, 32767).astype(np.int16).tobytes()